@@ -1,32 +1,73 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import os
+import time
+import uuid
+import hashlib
+import secrets
+import logging
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from .models import User, TokenData, UserRole
+from .models import User, TokenData, UserRole, Therapist
 from .database import get_database
+from .cache import TTLCache
+from .services.password_service import password_service, PasswordServiceBusy
+from .services.token_store import refresh_token_store
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
 
 # JWT Configuration
 SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 14))
+# A used refresh token presented again this soon gets the same successor
+# (e.g. two tabs sharing the cookie refreshing at once) instead of counting as reuse
+REFRESH_TOKEN_REUSE_GRACE_SECONDS = float(os.getenv("REFRESH_TOKEN_REUSE_GRACE_SECONDS", 10))
+
+# Authenticated-principal cache (saves a users lookup on every request)
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", 60))
+PRINCIPAL_CACHE_MAX_SIZE = int(os.getenv("PRINCIPAL_CACHE_MAX_SIZE", 10000))
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_MAX_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+
+# Therapist profile cache keyed by user id
+THERAPIST_PROFILE_CACHE_TTL_SECONDS = float(os.getenv("THERAPIST_PROFILE_CACHE_TTL_SECONDS", 30))
+therapist_profile_cache = TTLCache(maxsize=PRINCIPAL_CACHE_MAX_SIZE, ttl=THERAPIST_PROFILE_CACHE_TTL_SECONDS)
 
 # Security scheme
 security = HTTPBearer()
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+def invalidate_principal(user_id: str):
+    """Drop cached principals for a user after their account changes."""
+    principal_cache.delete_where(lambda key: key[0] == user_id)
+
+def invalidate_therapist_profile(user_id: str):
+    """Drop the cached therapist profile for a user."""
+    therapist_profile_cache.delete(user_id)
+
+def password_pool_busy_exception() -> HTTPException:
+    """Error returned when the password hashing pool is saturated."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication service is busy, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    try:
+        return await password_service.verify(plain_password, hashed_password)
+    except PasswordServiceBusy:
+        raise password_pool_busy_exception()
 
-def get_password_hash(password: str) -> str:
+async def get_password_hash(password: str) -> str:
     """Generate password hash."""
-    return pwd_context.hash(password)
+    try:
+        return await password_service.hash(password)
+    except PasswordServiceBusy:
+        raise password_pool_busy_exception()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token."""
@@ -57,7 +98,7 @@ async def get_user_by_id(db: AsyncIOMotorDatabase, user_id: str) -> Optional[Use
 async def authenticate_user(db: AsyncIOMotorDatabase, email: str, password: str) -> Optional[User]:
     """Authenticate user credentials."""
     user = await get_user_by_email(db, email)
-    if not user or not verify_password(password, user.hashed_password):
+    if not user or not await verify_password(password, user.hashed_password):
         return None
     return user
 
@@ -85,15 +126,24 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
+    cache_key = (token_data.user_id, token)
+    user = principal_cache.get(cache_key)
+    if user is not None:
+        return user
+    
     user = await get_user_by_email(db, email=token_data.email)
     if user is None:
         raise credentials_exception
+    
+    # Never keep a principal around longer than its token is valid
+    expires_in = payload.get("exp", 0) - time.time()
+    principal_cache.set(cache_key, user, ttl=expires_in)
     return user
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     """Get current active user."""
     if not current_user.is_active:
-        raise HTTPException(status_code=400, detail="Inactive user")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
     return current_user
 
 async def get_current_therapist(current_user: User = Depends(get_current_active_user)) -> User:
@@ -105,6 +155,42 @@ async def get_current_therapist(current_user: User = Depends(get_current_active_
         )
     return current_user
 
+async def get_therapist_profile(db: AsyncIOMotorDatabase, user_id: str) -> Optional[Therapist]:
+    """Get therapist profile for a user, served from cache when fresh."""
+    therapist = therapist_profile_cache.get(user_id)
+    if therapist is not None:
+        return therapist
+    
+    therapist_data = await db.therapists.find_one({"user_id": user_id})
+    if not therapist_data:
+        return None
+    
+    therapist = Therapist(**therapist_data)
+    therapist_profile_cache.set(user_id, therapist)
+    return therapist
+
+async def get_current_therapist_profile(
+    current_therapist: User = Depends(get_current_therapist),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+) -> Therapist:
+    """Resolve the current therapist's profile once per request."""
+    therapist = await get_therapist_profile(db, current_therapist.id)
+    if therapist is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Therapist profile not found"
+        )
+    return therapist
+
+async def get_optional_therapist_profile(
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+) -> Optional[Therapist]:
+    """Resolve the therapist profile when the current user is a therapist."""
+    if current_user.role != UserRole.THERAPIST:
+        return None
+    return await get_therapist_profile(db, current_user.id)
+
 async def get_current_admin(current_user: User = Depends(get_current_active_user)) -> User:
     """Ensure current user is an admin."""
     if current_user.role != UserRole.ADMIN:
@@ -125,4 +211,72 @@ def create_user_token(user: User) -> str:
         },
         expires_delta=access_token_expires
     )
-    return access_token
\ No newline at end of file
+    return access_token
+
+def hash_refresh_token(refresh_token: str) -> str:
+    """Refresh tokens are only ever stored hashed."""
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+async def create_refresh_token(
+    user: User,
+    family_id: Optional[str] = None,
+    refresh_token: Optional[str] = None
+) -> str:
+    """Issue an opaque refresh token, optionally continuing a rotation family."""
+    refresh_token = refresh_token or secrets.token_urlsafe(48)
+    now = datetime.utcnow()
+    await refresh_token_store.save({
+        "id": hash_refresh_token(refresh_token),
+        "user_id": user.id,
+        "family_id": family_id or str(uuid.uuid4()),
+        "created_at": now,
+        "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        "used_at": None,
+        "revoked": False
+    })
+    return refresh_token
+
+async def rotate_refresh_token(db: AsyncIOMotorDatabase, refresh_token: str) -> Tuple[User, str]:
+    """Exchange a refresh token for a new one without re-checking the password."""
+    invalid_token_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    token_hash = hash_refresh_token(refresh_token)
+    # The successor is chosen before consuming so a concurrent presentation
+    # of the same token can be handed the same one
+    successor = secrets.token_urlsafe(48)
+    record = await refresh_token_store.consume(token_hash, successor)
+    if record is None:
+        existing = await refresh_token_store.get(token_hash)
+        if (existing and not existing["revoked"] and existing.get("successor")
+                and datetime.utcnow() - existing["used_at"] <= timedelta(seconds=REFRESH_TOKEN_REUSE_GRACE_SECONDS)):
+            user = await get_user_by_id(db, existing["user_id"])
+            if user is not None and user.is_active:
+                return user, existing["successor"]
+        # A used or revoked token being presented again means it leaked:
+        # revoke the whole rotation family so the thief is logged out too.
+        if existing and (existing["revoked"] or existing["used_at"] is not None):
+            await refresh_token_store.revoke_family(existing["family_id"])
+            logger.warning(f"Refresh token reuse detected for user: {existing['user_id']}")
+        raise invalid_token_exception
+    
+    user = await get_user_by_id(db, record["user_id"])
+    if user is None or not user.is_active:
+        await refresh_token_store.revoke_family(record["family_id"])
+        raise invalid_token_exception
+    
+    await create_refresh_token(user, family_id=record["family_id"], refresh_token=successor)
+    return user, successor
+
+async def revoke_refresh_token(refresh_token: str):
+    """Revoke a refresh token and every token rotated from the same login."""
+    record = await refresh_token_store.get(hash_refresh_token(refresh_token))
+    if record:
+        await refresh_token_store.revoke_family(record["family_id"])
+
+async def revoke_user_refresh_tokens(user_id: str):
+    """Revoke every refresh token issued to a user."""
+    await refresh_token_store.revoke_user(user_id)
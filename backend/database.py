@@ -2,14 +2,49 @@ from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from typing import Optional
 import os
 from datetime import datetime
+import logging
+from .indexes import ensure_indexes
+from .memory_store import InMemoryClient
+from .monitoring import pool_metrics, command_metrics
+
+logger = logging.getLogger(__name__)
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
 db_name = os.environ['DB_NAME']
 
+# "mongo" or "memory" (in-process store for load tests without a mongod)
+storage_backend = os.getenv('STORAGE_BACKEND', 'mongo')
+
+def _optional_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+def get_client_options() -> dict:
+    """Connection pool, timeout and compression settings from the environment."""
+    options = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", 100)),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", 0)),
+        "maxIdleTimeMS": _optional_int("MONGO_MAX_IDLE_TIME_MS"),
+        "waitQueueTimeoutMS": _optional_int("MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 20000)),
+        "socketTimeoutMS": _optional_int("MONGO_SOCKET_TIMEOUT_MS"),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 30000)),
+    }
+    
+    compressors = os.getenv("MONGO_COMPRESSORS")
+    if compressors:
+        options["compressors"] = compressors
+        zlib_level = _optional_int("MONGO_ZLIB_COMPRESSION_LEVEL")
+        if zlib_level is not None:
+            options["zlibCompressionLevel"] = zlib_level
+    
+    return {key: value for key, value in options.items() if value is not None}
+
 class Database:
     client: Optional[AsyncIOMotorClient] = None
     database: Optional[AsyncIOMotorDatabase] = None
+    options: dict = {}
 
 db = Database()
 
@@ -17,9 +52,22 @@ async def get_database() -> AsyncIOMotorDatabase:
     """Get database instance."""
     return db.database
 
+def create_client(**overrides) -> AsyncIOMotorClient:
+    """Create a Motor client with the configured pool settings and monitoring."""
+    options = {**get_client_options(), **overrides}
+    return AsyncIOMotorClient(mongo_url, event_listeners=[pool_metrics, command_metrics], **options)
+
 async def connect_to_mongo():
     """Create database connection."""
-    db.client = AsyncIOMotorClient(mongo_url)
+    if db.client is not None:
+        return
+    
+    if storage_backend == "memory":
+        logger.warning("Using the in-memory storage backend; data is lost on restart")
+        db.client = InMemoryClient()
+    else:
+        db.options = get_client_options()
+        db.client = create_client()
     db.database = db.client[db_name]
     
     # Create indexes for better performance
@@ -29,53 +77,19 @@ async def close_mongo_connection():
     """Close database connection."""
     if db.client:
         db.client.close()
+        db.client = None
+        db.database = None
 
 async def create_indexes():
     """Create database indexes for better performance."""
-    if not db.database:
+    if db.database is None:
         return
     
-    # Users collection indexes
-    await db.database.users.create_index("email", unique=True)
-    await db.database.users.create_index("phone")
-    await db.database.users.create_index("role")
-    
-    # Therapists collection indexes
-    await db.database.therapists.create_index("user_id", unique=True)
-    await db.database.therapists.create_index("status")
-    await db.database.therapists.create_index("rating")
-    await db.database.therapists.create_index("service_areas")
-    await db.database.therapists.create_index("specialties")
-    
-    # Bookings collection indexes
-    await db.database.bookings.create_index("client_id")
-    await db.database.bookings.create_index("therapist_id")
-    await db.database.bookings.create_index("appointment_date")
-    await db.database.bookings.create_index("status")
-    await db.database.bookings.create_index([("appointment_date", 1), ("appointment_time", 1)])
-    
-    # Reviews collection indexes
-    await db.database.reviews.create_index("therapist_id")
-    await db.database.reviews.create_index("client_id")
-    await db.database.reviews.create_index("booking_id", unique=True)
-    
-    # Services collection indexes
-    await db.database.services.create_index("category")
-    await db.database.services.create_index("is_active")
-    
-    # Therapist applications collection indexes
-    await db.database.therapist_applications.create_index("email")
-    await db.database.therapist_applications.create_index("status")
-    await db.database.therapist_applications.create_index("created_at")
-    
-    # Notifications collection indexes
-    await db.database.notifications.create_index("user_id")
-    await db.database.notifications.create_index("is_read")
-    await db.database.notifications.create_index("created_at")
+    await ensure_indexes(db.database)
 
 async def init_default_data():
     """Initialize default data."""
-    if not db.database:
+    if db.database is None:
         return
     
     # Create default services
@@ -0,0 +1,192 @@
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from typing import Dict, List
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Index options that make two indexes with the same key pattern different
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+# Declarative index specification, one entry per collection. Compound indexes
+# follow the router query shapes: equality fields first, then the sort field.
+INDEX_SPECS: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("phone", ASCENDING)]),
+        # admin_router.get_all_users: role filter, newest first
+        IndexModel([("role", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+    "therapists": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING)], unique=True),
+        # therapist_router.get_therapists: approved + available, best rated first
+        IndexModel([("status", ASCENDING), ("is_available", ASCENDING), ("rating", DESCENDING)]),
+        # admin_router.get_all_therapists: status filter, newest first
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+        IndexModel([("service_areas", ASCENDING)]),
+        IndexModel([("specialties", ASCENDING)]),
+    ],
+    "bookings": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        # get_my_bookings: client (+ status), latest appointment first
+        IndexModel([("client_id", ASCENDING), ("starts_at", DESCENDING)]),
+        IndexModel([("client_id", ASCENDING), ("status", ASCENDING), ("starts_at", DESCENDING)]),
+        # Conflict checks and day/range queries on UTC start; also serves
+        # get_therapist_bookings' latest-first sort by walking it backwards
+        IndexModel([("therapist_id", ASCENDING), ("starts_at", ASCENDING)]),
+        IndexModel([("therapist_id", ASCENDING), ("status", ASCENDING), ("starts_at", ASCENDING)]),
+        # admin_router.get_all_bookings and analytics: filters, newest first
+        IndexModel([("created_at", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("payment_status", ASCENDING), ("created_at", DESCENDING)]),
+        # Admin date filters and reminder-style range scans
+        IndexModel([("starts_at", ASCENDING)]),
+        IndexModel([("stripe_payment_intent_id", ASCENDING)], sparse=True),
+    ],
+    "reviews": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("booking_id", ASCENDING)], unique=True),
+        # get_therapist_reviews: newest first
+        IndexModel([("therapist_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("client_id", ASCENDING)]),
+    ],
+    "services": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        # service_router.get_services: active services sorted by name
+        IndexModel([("is_active", ASCENDING), ("name", ASCENDING)]),
+        IndexModel([("category", ASCENDING)]),
+    ],
+    "therapist_applications": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+    "notifications": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("is_read", ASCENDING)]),
+    ],
+    "slot_reservations": [
+        # One document per therapist slot: the database rejects double bookings
+        IndexModel([("therapist_id", ASCENDING), ("date", ASCENDING), ("slot", ASCENDING)], unique=True),
+        IndexModel([("booking_id", ASCENDING)]),
+    ],
+    "therapist_calendars": [
+        # One bitmap document per therapist day; availability reads use $in on both
+        IndexModel([("therapist_id", ASCENDING), ("date", ASCENDING)], unique=True),
+        IndexModel([("date", ASCENDING)]),
+    ],
+    "outbox": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        # Worker claims: due pending messages, oldest first
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("locked_until", ASCENDING)]),
+        IndexModel([("reference_id", ASCENDING)]),
+        # Delivered messages are kept for a week
+        IndexModel([("sent_at", ASCENDING)], expireAfterSeconds=7 * 24 * 3600),
+    ],
+    "payment_events": [
+        # Stripe event id: redelivered webhooks hit the unique index
+        IndexModel([("id", ASCENDING)], unique=True),
+        # Worker claims: due events in a partition, oldest Stripe event first
+        IndexModel([("partition", ASCENDING), ("status", ASCENDING), ("stripe_created", ASCENDING)]),
+        # Replay: events per booking in Stripe order
+        IndexModel([("booking_id", ASCENDING), ("stripe_created", ASCENDING)]),
+        IndexModel([("stripe_created", ASCENDING)]),
+    ],
+    "refresh_tokens": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("family_id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING)]),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+}
+
+def _normalize(spec: dict) -> dict:
+    """Reduce an index description to the fields that matter for comparison."""
+    fields = spec["key"].items() if isinstance(spec["key"], dict) else spec["key"]
+    key = [(field, int(direction) if isinstance(direction, (int, float)) else direction)
+           for field, direction in fields]
+    options = {option: spec[option] for option in COMPARED_OPTIONS if spec.get(option)}
+    return {"key": key, **options}
+
+def _expected_indexes(collection_name: str) -> Dict[str, dict]:
+    return {
+        model.document["name"]: _normalize(model.document)
+        for model in INDEX_SPECS.get(collection_name, [])
+    }
+
+async def _existing_indexes(database: AsyncIOMotorDatabase, collection_name: str) -> Dict[str, dict]:
+    info = await database[collection_name].index_information()
+    return {
+        name: _normalize(spec)
+        for name, spec in info.items()
+        if name != "_id_"
+    }
+
+async def diff_collection_indexes(database: AsyncIOMotorDatabase, collection_name: str) -> dict:
+    """Compare one collection's indexes with its spec."""
+    expected = _expected_indexes(collection_name)
+    existing = await _existing_indexes(database, collection_name)
+
+    return {
+        "missing": sorted(name for name in expected if name not in existing),
+        "extra": sorted(name for name in existing if name not in expected),
+        "changed": sorted(
+            name for name in expected
+            if name in existing and existing[name] != expected[name]
+        )
+    }
+
+async def diff_indexes(database: AsyncIOMotorDatabase) -> Dict[str, dict]:
+    """Report missing, extra and changed indexes for every specified collection."""
+    names = list(INDEX_SPECS)
+    diffs = await asyncio.gather(*(diff_collection_indexes(database, name) for name in names))
+    return dict(zip(names, diffs))
+
+async def _create_index(database: AsyncIOMotorDatabase, collection_name: str, model: IndexModel):
+    # One command per index so a single conflict does not block the others
+    try:
+        await database[collection_name].create_indexes([model])
+    except OperationFailure as e:
+        # Usually an index with the same name but different options already
+        # exists; leave it for sync_indexes(drop_changed=True) to replace.
+        logger.error(f"Could not create index {collection_name}.{model.document['name']}: {str(e)}")
+
+async def ensure_indexes(database: AsyncIOMotorDatabase):
+    """Create every specified index concurrently."""
+    await asyncio.gather(*(
+        _create_index(database, collection_name, model)
+        for collection_name, models in INDEX_SPECS.items()
+        for model in models
+    ))
+    logger.info(f"Indexes ensured for {len(INDEX_SPECS)} collections")
+
+async def sync_indexes(
+    database: AsyncIOMotorDatabase,
+    drop_extra: bool = False,
+    drop_changed: bool = False
+) -> Dict[str, dict]:
+    """Bring indexes in line with the spec and return the diff that was applied."""
+    diffs = await diff_indexes(database)
+
+    for collection_name, diff in diffs.items():
+        collection = database[collection_name]
+        to_drop = []
+        if drop_extra:
+            to_drop += diff["extra"]
+        if drop_changed:
+            to_drop += diff["changed"]
+        for name in to_drop:
+            await collection.drop_index(name)
+            logger.info(f"Dropped index {collection_name}.{name}")
+
+    await ensure_indexes(database)
+    return diffs
@@ -0,0 +1,127 @@
+from fastapi import Depends
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from typing import Dict, Iterable, List, Optional, Set
+import asyncio
+from .database import get_database
+
+SNAPSHOT_FIELDS = ("therapist_name", "service_name", "client_name", "service_category")
+
+class BatchLoader:
+    """Request-scoped DataLoader: lookups issued in the same event-loop tick
+    are coalesced into a single `{key: {"$in": [...]}}` query and memoized."""
+
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection,
+        key: str = "id",
+        projection: Optional[dict] = None
+    ):
+        self.collection = collection
+        self.key = key
+        self.projection = projection
+        self.cache: Dict[str, asyncio.Future] = {}
+        self.batch: List[str] = []
+        # The event loop only holds weak references to tasks; keep in-flight
+        # fetches alive until they finish
+        self.tasks: Set[asyncio.Task] = set()
+        self.queries = 0
+
+    def load(self, key: str) -> "asyncio.Future[Optional[dict]]":
+        """Schedule a lookup; resolves to the document or None."""
+        future = self.cache.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self.cache[key] = future
+            if not self.batch:
+                loop.call_soon(self._schedule_dispatch)
+            self.batch.append(key)
+        return future
+
+    async def load_many(self, keys: Iterable[str]) -> Dict[str, dict]:
+        """Load several documents with one query, keyed by lookup key."""
+        unique_keys = list(dict.fromkeys(key for key in keys if key is not None))
+        docs = await asyncio.gather(*(self.load(key) for key in unique_keys))
+        return {key: doc for key, doc in zip(unique_keys, docs) if doc is not None}
+
+    def _schedule_dispatch(self):
+        # Wait one more tick so tasks started alongside the first load
+        # (e.g. by asyncio.gather) can add their keys to the batch
+        asyncio.get_running_loop().call_soon(self._dispatch)
+
+    def _dispatch(self):
+        batch, self.batch = self.batch, []
+        task = asyncio.get_running_loop().create_task(self._fetch(batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _fetch(self, batch: List[str]):
+        self.queries += 1
+        try:
+            docs = await self.collection.find(
+                {self.key: {"$in": batch}}, self.projection
+            ).to_list(length=None)
+        except Exception as e:
+            for key in batch:
+                future = self.cache.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        found = {doc[self.key]: doc for doc in docs}
+        for key in batch:
+            future = self.cache[key]
+            if not future.done():
+                future.set_result(found.get(key))
+
+class Loaders:
+    """Per-request loaders for the documents routers enrich results with."""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.users = BatchLoader(db.users, projection={"hashed_password": 0})
+        self.therapists = BatchLoader(db.therapists)
+        self.services = BatchLoader(db.services)
+
+    async def therapist_names(self, therapist_ids: Iterable[str]) -> Dict[str, str]:
+        """Map therapist ids to their users' full names (two queries at most)."""
+        therapists = await self.therapists.load_many(therapist_ids)
+        users = await self.users.load_many(t["user_id"] for t in therapists.values())
+        return {
+            therapist_id: users[therapist["user_id"]]["full_name"]
+            for therapist_id, therapist in therapists.items()
+            if therapist["user_id"] in users
+        }
+
+    async def fill_booking_snapshots(self, bookings: List[dict]):
+        """Fill display snapshots on bookings stored before snapshots existed."""
+        stale = [
+            booking for booking in bookings
+            if not all((booking.get("snapshot") or {}).get(field) for field in SNAPSHOT_FIELDS)
+        ]
+        if not stale:
+            return
+        
+        therapist_names, services, clients = await asyncio.gather(
+            self.therapist_names(booking["therapist_id"] for booking in stale),
+            self.services.load_many(booking["service_id"] for booking in stale),
+            self.users.load_many(booking["client_id"] for booking in stale)
+        )
+        for booking in stale:
+            service = services.get(booking["service_id"]) or {}
+            client = clients.get(booking["client_id"]) or {}
+            snapshot = booking.get("snapshot") or {}
+            booking["snapshot"] = {
+                "therapist_name": snapshot.get("therapist_name") or therapist_names.get(booking["therapist_id"]),
+                "service_name": snapshot.get("service_name") or service.get("name"),
+                "client_name": snapshot.get("client_name") or client.get("full_name"),
+                "service_category": snapshot.get("service_category") or service.get("category")
+            }
+
+    @property
+    def queries(self) -> int:
+        """Number of batched queries issued so far."""
+        return self.users.queries + self.therapists.queries + self.services.queries
+
+async def get_loaders(db: AsyncIOMotorDatabase = Depends(get_database)) -> Loaders:
+    """Get a fresh set of batch loaders for the current request."""
+    return Loaders(db)
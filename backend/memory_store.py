@@ -0,0 +1,938 @@
+from bson import ObjectId, Regex, decode, encode
+from pymongo import DeleteMany, DeleteOne, IndexModel, InsertOne, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from datetime import datetime
+import asyncio
+import os
+import random
+import re
+import time
+from .monitoring import command_metrics
+
+# In-process stand-in for the Motor API subset the routers, services and tools
+# use: find/sort/skip/limit, bulk_write, the common query and update operators, aggregate
+# ($match/$group/$sort/$skip/$limit/$project/$count/$unwind) and unique indexes.
+# Documents are stored as BSON round trips, so type handling matches Mongo.
+# TTL indexes are recorded but documents are never expired.
+
+# Simulated round-trip time added to every command
+MEMORY_STORE_LATENCY_MS = float(os.getenv("MEMORY_STORE_LATENCY_MS", 0))
+MEMORY_STORE_LATENCY_JITTER_MS = float(os.getenv("MEMORY_STORE_LATENCY_JITTER_MS", 0))
+
+_MISSING = object()
+
+def _copy(document: dict) -> dict:
+    return decode(encode(document))
+
+def _bracket(value) -> int:
+    """Mongo's cross-type ordering: values only compare within a bracket."""
+    if value is None:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, list):
+        return 5
+    if isinstance(value, bytes):
+        return 6
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+def _key(value) -> tuple:
+    """Hashable, totally ordered stand-in for a value (index keys, sorting)."""
+    bracket = _bracket(value)
+    if bracket in (4, 5, 10):
+        return (bracket, repr(value))
+    return (bracket, value)
+
+def _equal(a, b) -> bool:
+    return _bracket(a) == _bracket(b) and a == b
+
+def _split(path: str) -> List[str]:
+    return path.split(".")
+
+def _values(value, parts: List[str]) -> list:
+    """Every value at a dotted path, traversing arrays like Mongo does."""
+    if not parts:
+        return [value]
+    if isinstance(value, dict):
+        if parts[0] in value:
+            return _values(value[parts[0]], parts[1:])
+        return []
+    if isinstance(value, list):
+        if parts[0].isdigit():
+            index = int(parts[0])
+            return _values(value[index], parts[1:]) if index < len(value) else []
+        result = []
+        for item in value:
+            if isinstance(item, dict):
+                result += _values(item, parts)
+        return result
+    return []
+
+def _expand(values: list) -> list:
+    """Field values plus the elements of any array values."""
+    expanded = []
+    for value in values:
+        expanded.append(value)
+        if isinstance(value, list):
+            expanded.extend(value)
+    return expanded
+
+def _get(document: dict, path: str):
+    value = document
+    for part in _split(path):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return _MISSING
+    return value
+
+def _set(document: dict, path: str, value):
+    parts = _split(path)
+    target = document
+    for part in parts[:-1]:
+        if isinstance(target, list):
+            target = target[int(part)]
+        else:
+            target = target.setdefault(part, {})
+    if isinstance(target, list):
+        target[int(parts[-1])] = value
+    else:
+        target[parts[-1]] = value
+
+def _unset(document: dict, path: str):
+    parts = _split(path)
+    target = _get(document, ".".join(parts[:-1])) if len(parts) > 1 else document
+    if isinstance(target, dict):
+        target.pop(parts[-1], None)
+
+def _regex(pattern, options: str = "") -> "re.Pattern":
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    if isinstance(pattern, Regex):
+        return pattern.try_compile()
+    flags = 0
+    for option, flag in (("i", re.IGNORECASE), ("m", re.MULTILINE), ("s", re.DOTALL), ("x", re.VERBOSE)):
+        if option in options:
+            flags |= flag
+    return re.compile(pattern, flags)
+
+def _is_operator_doc(condition) -> bool:
+    return isinstance(condition, dict) and bool(condition) and all(key.startswith("$") for key in condition)
+
+def _match_equal(values: list, target) -> bool:
+    if isinstance(target, (re.Pattern, Regex)):
+        pattern = _regex(target)
+        return any(isinstance(value, str) and pattern.search(value) for value in _expand(values))
+    if target is None and not values:
+        return True
+    return any(_equal(value, target) for value in _expand(values))
+
+def _compare(values: list, target, test: Callable[[Any, Any], bool]) -> bool:
+    bracket = _bracket(target)
+    return any(
+        _bracket(value) == bracket and test(value, target)
+        for value in _expand(values)
+    )
+
+def _match_operator(values: list, operator: str, argument, options: str) -> bool:
+    if operator == "$eq":
+        return _match_equal(values, argument)
+    if operator == "$ne":
+        return not _match_equal(values, argument)
+    if operator == "$gt":
+        return _compare(values, argument, lambda a, b: a > b)
+    if operator == "$gte":
+        return _compare(values, argument, lambda a, b: a >= b)
+    if operator == "$lt":
+        return _compare(values, argument, lambda a, b: a < b)
+    if operator == "$lte":
+        return _compare(values, argument, lambda a, b: a <= b)
+    if operator == "$in":
+        return any(_match_equal(values, target) for target in argument)
+    if operator == "$nin":
+        return not any(_match_equal(values, target) for target in argument)
+    if operator == "$exists":
+        return bool(values) == bool(argument)
+    if operator == "$regex":
+        pattern = _regex(argument, options)
+        return any(isinstance(value, str) and pattern.search(value) for value in _expand(values))
+    if operator == "$not":
+        return not _match_field(values, argument)
+    if operator == "$size":
+        return any(isinstance(value, list) and len(value) == argument for value in values)
+    if operator == "$all":
+        return all(_match_equal(values, target) for target in argument)
+    if operator == "$elemMatch":
+        return any(
+            isinstance(value, list) and any(
+                _matches(item, argument) if isinstance(item, dict) and not _is_operator_doc(argument)
+                else _match_field([item], argument)
+                for item in value
+            )
+            for value in values
+        )
+    raise OperationFailure(f"unknown operator: {operator}", code=2)
+
+def _match_field(values: list, condition) -> bool:
+    if _is_operator_doc(condition):
+        options = condition.get("$options", "")
+        return all(
+            _match_operator(values, operator, argument, options)
+            for operator, argument in condition.items()
+            if operator != "$options"
+        )
+    return _match_equal(values, condition)
+
+def _matches(document: dict, query: Optional[dict]) -> bool:
+    """Evaluate a Mongo query filter against one document."""
+    for field, condition in (query or {}).items():
+        if field == "$and":
+            if not all(_matches(document, clause) for clause in condition):
+                return False
+        elif field == "$or":
+            if not any(_matches(document, clause) for clause in condition):
+                return False
+        elif field == "$nor":
+            if any(_matches(document, clause) for clause in condition):
+                return False
+        elif not _match_field(_values(document, _split(field)), condition):
+            return False
+    return True
+
+def _sort_value(document: dict, field: str, direction: int):
+    values = _expand(_values(document, _split(field)))
+    values = [value for value in values if not isinstance(value, list)] or [None]
+    keys = [_key(value) for value in values]
+    return min(keys) if direction > 0 else max(keys)
+
+def _normalize_sort(key_or_list, direction=None) -> List[Tuple[str, int]]:
+    if key_or_list is None:
+        return []
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction if direction is not None else 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return [(field, order) for field, order in key_or_list]
+
+def _sort(documents: List[dict], spec: List[Tuple[str, int]]) -> List[dict]:
+    # Stable sorts from the least to the most significant key
+    for field, direction in reversed(spec):
+        documents.sort(key=lambda doc: _sort_value(doc, field, direction), reverse=direction < 0)
+    return documents
+
+def _project(document: dict, projection) -> dict:
+    if not projection:
+        return document
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+
+    include_id = projection.get("_id", 1)
+    fields = {field: value for field, value in projection.items() if field != "_id"}
+    if fields and all(fields.values()):
+        result = {}
+        if include_id and "_id" in document:
+            result["_id"] = document["_id"]
+        for field in fields:
+            value = _get(document, field)
+            if value is not _MISSING:
+                _set(result, field, value)
+        return result
+
+    result = dict(document)
+    for field in fields:
+        _unset(result, field)
+    if not include_id:
+        result.pop("_id", None)
+    return result
+
+def _apply_update(document: dict, update: dict, is_insert: bool = False):
+    """Apply update operators in place."""
+    for operator, changes in update.items():
+        if operator == "$setOnInsert" and not is_insert:
+            continue
+        for path, argument in changes.items():
+            if path == "_id" and operator != "$setOnInsert":
+                continue
+            current = _get(document, path)
+            if operator in ("$set", "$setOnInsert"):
+                _set(document, path, argument)
+            elif operator == "$unset":
+                _unset(document, path)
+            elif operator == "$inc":
+                _set(document, path, (0 if current is _MISSING else current) + argument)
+            elif operator == "$mul":
+                _set(document, path, (0 if current is _MISSING else current) * argument)
+            elif operator == "$min":
+                if current is _MISSING or _key(argument) < _key(current):
+                    _set(document, path, argument)
+            elif operator == "$max":
+                if current is _MISSING or _key(argument) > _key(current):
+                    _set(document, path, argument)
+            elif operator == "$bit":
+                value = 0 if current is _MISSING else current
+                for operation, operand in argument.items():
+                    if operation == "and":
+                        value &= operand
+                    elif operation == "or":
+                        value |= operand
+                    elif operation == "xor":
+                        value ^= operand
+                    else:
+                        raise OperationFailure(f"Unknown $bit operation: {operation}", code=2)
+                _set(document, path, value)
+            elif operator == "$currentDate":
+                _set(document, path, datetime.utcnow())
+            elif operator in ("$push", "$addToSet"):
+                items = argument["$each"] if isinstance(argument, dict) and "$each" in argument else [argument]
+                array = [] if current is _MISSING else list(current)
+                for item in items:
+                    if operator == "$push" or not any(_equal(existing, item) for existing in array):
+                        array.append(item)
+                _set(document, path, array)
+            elif operator == "$pull":
+                if current is not _MISSING:
+                    _set(document, path, [
+                        item for item in current
+                        if not (_matches(item, argument) if isinstance(item, dict) and isinstance(argument, dict)
+                                else _match_field([item], argument))
+                    ])
+            else:
+                raise OperationFailure(f"Unknown modifier: {operator}", code=9)
+
+def _upsert_seed(query: dict) -> dict:
+    """The equality fields of a filter, used as the base of an upserted document."""
+    document = {}
+    for field, condition in (query or {}).items():
+        if field.startswith("$"):
+            continue
+        if _is_operator_doc(condition):
+            if "$eq" in condition:
+                _set(document, field, condition["$eq"])
+        else:
+            _set(document, field, condition)
+    return document
+
+def _expression(document: dict, expression):
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = _get(document, expression[1:])
+        return None if value is _MISSING else value
+    if isinstance(expression, dict):
+        return {key: _expression(document, value) for key, value in expression.items()}
+    if isinstance(expression, list):
+        return [_expression(document, value) for value in expression]
+    return expression
+
+def _group(documents: List[dict], spec: dict) -> List[dict]:
+    groups: Dict[tuple, dict] = {}
+    for document in documents:
+        group_id = _expression(document, spec["_id"])
+        group = groups.setdefault(_key(group_id), {"_id": group_id, "_docs": []})
+        group["_docs"].append(document)
+
+    results = []
+    for group in groups.values():
+        result = {"_id": group["_id"]}
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            (operator, expression), = accumulator.items()
+            values = [_expression(document, expression) for document in group["_docs"]]
+            numbers = [value for value in values if isinstance(value, (int, float)) and not isinstance(value, bool)]
+            present = [value for value in values if value is not None]
+            if operator == "$sum":
+                result[field] = sum(numbers)
+            elif operator == "$avg":
+                result[field] = sum(numbers) / len(numbers) if numbers else None
+            elif operator == "$min":
+                result[field] = min(present, key=_key) if present else None
+            elif operator == "$max":
+                result[field] = max(present, key=_key) if present else None
+            elif operator == "$first":
+                result[field] = values[0]
+            elif operator == "$last":
+                result[field] = values[-1]
+            elif operator == "$push":
+                result[field] = values
+            elif operator == "$addToSet":
+                result[field] = list({_key(value): value for value in values}.values())
+            else:
+                raise OperationFailure(f"unknown group operator: {operator}", code=15952)
+        results.append(result)
+    return results
+
+def _aggregate(documents: List[dict], pipeline: List[dict]) -> List[dict]:
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == "$match":
+            documents = [document for document in documents if _matches(document, spec)]
+        elif name == "$group":
+            documents = _group(documents, spec)
+        elif name == "$sort":
+            documents = _sort(documents, list(spec.items()))
+        elif name == "$skip":
+            documents = documents[spec:]
+        elif name == "$limit":
+            documents = documents[:spec]
+        elif name == "$count":
+            documents = [{spec: len(documents)}] if documents else []
+        elif name == "$project":
+            plain = {field: value for field, value in spec.items() if isinstance(value, (bool, int)) and value in (0, 1)}
+            computed = {field: value for field, value in spec.items() if field not in plain}
+            projected = []
+            for document in documents:
+                result = _project(document, plain) if plain else dict(document)
+                for field, expression in computed.items():
+                    _set(result, field, _expression(document, expression))
+                projected.append(result)
+            documents = projected
+        elif name == "$unwind":
+            path = (spec["path"] if isinstance(spec, dict) else spec)[1:]
+            unwound = []
+            for document in documents:
+                value = _get(document, path)
+                if isinstance(value, list):
+                    for item in value:
+                        copy = dict(document)
+                        _set(copy, path, item)
+                        unwound.append(copy)
+                elif value is not _MISSING and value is not None:
+                    unwound.append(document)
+            documents = unwound
+        else:
+            raise OperationFailure(f"Unrecognized pipeline stage name: '{name}'", code=40324)
+    return documents
+
+class InMemoryCursor:
+    """Lazy find() cursor; runs the query on the first to_list() or iteration."""
+
+    def __init__(self, collection: "InMemoryCollection", query: Optional[dict], projection=None):
+        self.collection = collection
+        self.query = query or {}
+        self.projection = projection
+        self.sort_spec: List[Tuple[str, int]] = []
+        self.skip_count = 0
+        self.limit_count = 0
+
+    def sort(self, key_or_list, direction=None) -> "InMemoryCursor":
+        self.sort_spec = _normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, skip: int) -> "InMemoryCursor":
+        self.skip_count = skip
+        return self
+
+    def limit(self, limit: int) -> "InMemoryCursor":
+        self.limit_count = limit
+        return self
+
+    def batch_size(self, batch_size: int) -> "InMemoryCursor":
+        return self
+
+    def _run(self) -> List[dict]:
+        documents = self.collection._select(self.query)
+        if self.sort_spec:
+            documents = _sort(documents, self.sort_spec)
+        documents = documents[self.skip_count:]
+        if self.limit_count:
+            documents = documents[:self.limit_count]
+        return [_copy(_project(document, self.projection)) for document in documents]
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        documents = await self.collection._command("find", self._run)
+        return documents if length is None else documents[:length]
+
+    async def __aiter__(self):
+        for document in await self.to_list(length=None):
+            yield document
+
+class InMemoryAggregateCursor:
+    """Result of aggregate(); runs the pipeline on first use."""
+
+    def __init__(self, collection: "InMemoryCollection", pipeline: List[dict]):
+        self.collection = collection
+        self.pipeline = pipeline
+
+    def _run(self) -> List[dict]:
+        return [_copy(document) for document in _aggregate(self.collection._select({}), self.pipeline)]
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        documents = await self.collection._command("aggregate", self._run)
+        return documents if length is None else documents[:length]
+
+    async def __aiter__(self):
+        for document in await self.to_list(length=None):
+            yield document
+
+class InMemoryCollection:
+    """One collection: documents by _id plus equality lookups for indexed fields."""
+
+    def __init__(self, database: "InMemoryDatabase", name: str):
+        self.database = database
+        self.name = name
+        self.documents: Dict[Any, dict] = {}
+        self.order: Dict[Any, int] = {}
+        self.sequence = 0
+        self.indexes: Dict[str, dict] = {}
+        # field -> index key -> _ids, for the first field of every index
+        self.lookups: Dict[str, Dict[tuple, set]] = {"_id": {}}
+        # unique index name -> key tuple -> _id
+        self.unique_keys: Dict[str, Dict[tuple, Any]] = {}
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.database.name}.{self.name}"
+
+    async def _command(self, name: str, operation: Callable[[], Any]):
+        started = time.perf_counter()
+        failed = False
+        try:
+            delay = self.database.client.latency()
+            if delay:
+                await asyncio.sleep(delay)
+            return operation()
+        except Exception:
+            failed = True
+            raise
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            command_metrics.record(name, self.name, duration_ms, failed=failed)
+
+    # Index bookkeeping
+
+    def _index_key(self, document: dict, fields: List[str]) -> tuple:
+        return tuple(_key(None if value is _MISSING else value) for value in (_get(document, field) for field in fields))
+
+    def _lookup_keys(self, document: dict, field: str) -> List[tuple]:
+        values = _values(document, _split(field))
+        if not values:
+            return [_key(None)]
+        return list({_key(value): None for value in _expand(values)})
+
+    def _index(self, document: dict):
+        for field, lookup in self.lookups.items():
+            for key in self._lookup_keys(document, field):
+                lookup.setdefault(key, set()).add(document["_id"])
+        for name, keys in self.unique_keys.items():
+            key = self._unique_key(document, name)
+            if key is not None:
+                keys[key] = document["_id"]
+
+    def _unindex(self, document: dict):
+        for field, lookup in self.lookups.items():
+            for key in self._lookup_keys(document, field):
+                ids = lookup.get(key)
+                if ids is not None:
+                    ids.discard(document["_id"])
+                    if not ids:
+                        del lookup[key]
+        for name, keys in self.unique_keys.items():
+            key = self._unique_key(document, name)
+            if key is not None and keys.get(key) == document["_id"]:
+                del keys[key]
+
+    def _unique_key(self, document: dict, name: str) -> Optional[tuple]:
+        index = self.indexes[name]
+        fields = [field for field, _ in index["key"]]
+        if index.get("sparse") and all(_get(document, field) is _MISSING for field in fields):
+            return None
+        return self._index_key(document, fields)
+
+    def _check_unique(self, document: dict):
+        for name, keys in self.unique_keys.items():
+            key = self._unique_key(document, name)
+            if key is not None and keys.get(key, document["_id"]) != document["_id"]:
+                fields = [field for field, _ in self.indexes[name]["key"]]
+                key_value = {field: _get(document, field) for field in fields}
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.full_name} index: {name} dup key: {key_value}",
+                    11000,
+                    {"index": name, "keyPattern": dict(self.indexes[name]["key"]), "keyValue": key_value}
+                )
+
+    def _candidates(self, query: dict) -> Optional[set]:
+        """Narrow a query to the _ids an equality/$in lookup allows, if any."""
+        best = None
+        for field, condition in query.items():
+            lookup = self.lookups.get(field)
+            if lookup is None:
+                continue
+            if _is_operator_doc(condition):
+                if set(condition) == {"$eq"}:
+                    targets = [condition["$eq"]]
+                elif set(condition) == {"$in"}:
+                    targets = condition["$in"]
+                else:
+                    continue
+            else:
+                targets = [condition]
+            if any(isinstance(target, (dict, list, re.Pattern, Regex)) for target in targets):
+                continue
+            ids = set()
+            for target in targets:
+                ids |= lookup.get(_key(target), set())
+            if best is None or len(ids) < len(best):
+                best = ids
+        return best
+
+    def _select(self, query: Optional[dict]) -> List[dict]:
+        query = query or {}
+        ids = self._candidates(query)
+        if ids is None:
+            documents = self.documents.values()
+        else:
+            documents = (self.documents[_id] for _id in sorted(ids, key=self.order.__getitem__))
+        return [document for document in documents if _matches(document, query)]
+
+    # Writes
+
+    def _insert(self, document: dict) -> Any:
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        stored = _copy(document)
+        if stored["_id"] in self.documents:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.full_name} index: _id_ dup key: {{_id: {stored['_id']!r}}}",
+                11000,
+                {"index": "_id_", "keyPattern": {"_id": 1}, "keyValue": {"_id": stored["_id"]}}
+            )
+        self._check_unique(stored)
+        self.sequence += 1
+        self.order[stored["_id"]] = self.sequence
+        self.documents[stored["_id"]] = stored
+        self._index(stored)
+        return stored["_id"]
+
+    def _replace(self, old: dict, new: dict) -> bool:
+        if encode(old) == encode(new):
+            return False
+        self._check_unique(new)
+        self._unindex(old)
+        self.documents[new["_id"]] = new
+        self._index(new)
+        return True
+
+    def _update(self, document: dict, update: dict) -> Tuple[dict, bool]:
+        new = _copy(document)
+        if any(key.startswith("$") for key in update):
+            _apply_update(new, update)
+        else:
+            new = {"_id": document["_id"], **_copy(update)}
+        return new, self._replace(document, new)
+
+    def _upsert(self, query: dict, update: dict) -> dict:
+        document = _upsert_seed(query)
+        if any(key.startswith("$") for key in update):
+            _apply_update(document, update, is_insert=True)
+        else:
+            document.update(update)
+        self._insert(document)
+        return self.documents[document["_id"]]
+
+    def _update_documents(self, query: dict, update: dict, upsert: bool, multi: bool) -> UpdateResult:
+        documents = self._select(query)
+        if not multi:
+            documents = documents[:1]
+        if not documents and upsert:
+            upserted = self._upsert(query, update)
+            return UpdateResult({"n": 1, "nModified": 0, "upserted": upserted["_id"]}, True)
+
+        modified = sum(self._update(document, update)[1] for document in documents)
+        return UpdateResult({"n": len(documents), "nModified": modified, "updatedExisting": bool(documents)}, True)
+
+    def _delete_documents(self, query: dict, multi: bool) -> DeleteResult:
+        documents = self._select(query)
+        if not multi:
+            documents = documents[:1]
+        for document in documents:
+            self._unindex(document)
+            del self.documents[document["_id"]]
+            del self.order[document["_id"]]
+        return DeleteResult({"n": len(documents)}, True)
+
+    # Motor API
+
+    def find(self, filter: Optional[dict] = None, projection=None, sort=None, skip: int = 0, limit: int = 0) -> InMemoryCursor:
+        cursor = InMemoryCursor(self, filter, projection)
+        if sort:
+            cursor.sort(sort)
+        return cursor.skip(skip).limit(limit)
+
+    async def find_one(self, filter: Optional[dict] = None, projection=None, sort=None) -> Optional[dict]:
+        documents = await self.find(filter, projection, sort=sort, limit=1).to_list(length=1)
+        return documents[0] if documents else None
+
+    async def insert_one(self, document: dict) -> InsertOneResult:
+        return InsertOneResult(await self._command("insert", lambda: self._insert(document)), True)
+
+    async def insert_many(self, documents: Iterable[dict], ordered: bool = True) -> InsertManyResult:
+        documents = list(documents)
+
+        def insert():
+            inserted_ids = []
+            errors = []
+            for index, document in enumerate(documents):
+                try:
+                    inserted_ids.append(self._insert(document))
+                except DuplicateKeyError as e:
+                    errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": document})
+                    if ordered:
+                        break
+            if errors:
+                raise BulkWriteError({
+                    "writeErrors": errors, "writeConcernErrors": [], "nInserted": len(inserted_ids),
+                    "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []
+                })
+            return inserted_ids
+
+        return InsertManyResult(await self._command("insert", insert), True)
+
+    async def bulk_write(self, requests: Iterable[Any], ordered: bool = True) -> BulkWriteResult:
+        requests = list(requests)
+
+        def write():
+            totals = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0}
+            upserted = []
+            errors = []
+            for index, request in enumerate(requests):
+                try:
+                    if isinstance(request, InsertOne):
+                        self._insert(request._doc)
+                        totals["nInserted"] += 1
+                        continue
+                    if isinstance(request, (DeleteOne, DeleteMany)):
+                        result = self._delete_documents(request._filter, multi=isinstance(request, DeleteMany))
+                        totals["nRemoved"] += result.deleted_count
+                        continue
+                    if not isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                        raise TypeError(f"{request!r} is not a valid request")
+                    result = self._update_documents(
+                        request._filter, request._doc, bool(request._upsert), multi=isinstance(request, UpdateMany)
+                    )
+                    if result.upserted_id is not None:
+                        totals["nUpserted"] += 1
+                        upserted.append({"index": index, "_id": result.upserted_id})
+                    else:
+                        totals["nMatched"] += result.matched_count
+                        totals["nModified"] += result.modified_count
+                except DuplicateKeyError as e:
+                    errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": request._doc})
+                    if ordered:
+                        break
+            details = {**totals, "upserted": upserted, "writeErrors": errors, "writeConcernErrors": []}
+            if errors:
+                raise BulkWriteError(details)
+            return BulkWriteResult(details, True)
+
+        return await self._command("bulkWrite", write)
+
+    async def update_one(self, filter: dict, update: dict, upsert: bool = False) -> UpdateResult:
+        return await self._command("update", lambda: self._update_documents(filter, update, upsert, multi=False))
+
+    async def update_many(self, filter: dict, update: dict, upsert: bool = False) -> UpdateResult:
+        return await self._command("update", lambda: self._update_documents(filter, update, upsert, multi=True))
+
+    async def replace_one(self, filter: dict, replacement: dict, upsert: bool = False) -> UpdateResult:
+        return await self._command("update", lambda: self._update_documents(filter, replacement, upsert, multi=False))
+
+    async def delete_one(self, filter: dict) -> DeleteResult:
+        return await self._command("delete", lambda: self._delete_documents(filter, multi=False))
+
+    async def delete_many(self, filter: dict) -> DeleteResult:
+        return await self._command("delete", lambda: self._delete_documents(filter, multi=True))
+
+    async def find_one_and_update(
+        self,
+        filter: dict,
+        update: dict,
+        projection=None,
+        sort=None,
+        upsert: bool = False,
+        return_document: bool = ReturnDocument.BEFORE
+    ) -> Optional[dict]:
+        def find_and_modify():
+            documents = _sort(self._select(filter), _normalize_sort(sort)) if sort else self._select(filter)
+            if not documents:
+                if not upsert:
+                    return None
+                upserted = self._upsert(filter, update)
+                return _copy(_project(upserted, projection)) if return_document else None
+
+            before = documents[0]
+            after, _ = self._update(before, update)
+            return _copy(_project(after if return_document else before, projection))
+
+        return await self._command("findAndModify", find_and_modify)
+
+    async def find_one_and_delete(self, filter: dict, projection=None, sort=None) -> Optional[dict]:
+        def find_and_delete():
+            documents = _sort(self._select(filter), _normalize_sort(sort)) if sort else self._select(filter)
+            if not documents:
+                return None
+            self._delete_documents({"_id": documents[0]["_id"]}, multi=False)
+            return _copy(_project(documents[0], projection))
+
+        return await self._command("findAndModify", find_and_delete)
+
+    async def count_documents(self, filter: dict, skip: int = 0, limit: int = 0) -> int:
+        def count():
+            total = max(len(self._select(filter)) - skip, 0)
+            return min(total, limit) if limit else total
+
+        return await self._command("count", count)
+
+    async def estimated_document_count(self) -> int:
+        return await self._command("count", lambda: len(self.documents))
+
+    async def distinct(self, key: str, filter: Optional[dict] = None) -> list:
+        def distinct():
+            values = {}
+            for document in self._select(filter):
+                for value in _expand(_values(document, _split(key))):
+                    if not isinstance(value, list):
+                        values.setdefault(_key(value), value)
+            return [_copy({"v": value})["v"] for value in values.values()]
+
+        return await self._command("distinct", distinct)
+
+    def aggregate(self, pipeline: List[dict]) -> InMemoryAggregateCursor:
+        return InMemoryAggregateCursor(self, pipeline)
+
+    async def create_indexes(self, indexes: List[IndexModel]) -> List[str]:
+        def create():
+            names = []
+            for model in indexes:
+                document = dict(model.document)
+                name = document.pop("name")
+                key = list(document.pop("key").items())
+                spec = {"key": key, **document}
+                existing = self.indexes.get(name)
+                if existing is not None and existing != spec:
+                    raise OperationFailure(
+                        f"An existing index has the same name as the requested index: {name}", code=86
+                    )
+
+                if existing is None:
+                    self.indexes[name] = spec
+                    if spec.get("unique"):
+                        self.unique_keys[name] = {}
+                        try:
+                            for document in self.documents.values():
+                                self._check_unique(document)
+                                unique_key = self._unique_key(document, name)
+                                if unique_key is not None:
+                                    self.unique_keys[name][unique_key] = document["_id"]
+                        except DuplicateKeyError:
+                            del self.indexes[name]
+                            del self.unique_keys[name]
+                            raise
+                    field = key[0][0]
+                    if field not in self.lookups:
+                        self.lookups[field] = {}
+                        for document in self.documents.values():
+                            for lookup_key in self._lookup_keys(document, field):
+                                self.lookups[field].setdefault(lookup_key, set()).add(document["_id"])
+                names.append(name)
+            return names
+
+        return await self._command("createIndexes", create)
+
+    async def create_index(self, keys, **kwargs) -> str:
+        return (await self.create_indexes([IndexModel(keys, **kwargs)]))[0]
+
+    async def index_information(self) -> dict:
+        def information():
+            info = {"_id_": {"key": [("_id", 1)], "v": 2}}
+            for name, spec in self.indexes.items():
+                info[name] = {**spec, "v": 2}
+            return info
+
+        return await self._command("listIndexes", information)
+
+    async def drop_index(self, name: str):
+        def drop():
+            if name not in self.indexes:
+                raise OperationFailure(f"index not found with name [{name}]", code=27)
+            field = self.indexes.pop(name)["key"][0][0]
+            self.unique_keys.pop(name, None)
+            if field != "_id" and not any(spec["key"][0][0] == field for spec in self.indexes.values()):
+                del self.lookups[field]
+
+        await self._command("dropIndexes", drop)
+
+    async def drop(self):
+        await self.database.drop_collection(self.name)
+
+class InMemoryDatabase:
+    """Collections are created on first access, like Mongo's."""
+
+    def __init__(self, client: "InMemoryClient", name: str):
+        self.client = client
+        self.name = name
+        self.collections: Dict[str, InMemoryCollection] = {}
+
+    def get_collection(self, name: str) -> InMemoryCollection:
+        collection = self.collections.get(name)
+        if collection is None:
+            collection = self.collections[name] = InMemoryCollection(self, name)
+        return collection
+
+    def __getitem__(self, name: str) -> InMemoryCollection:
+        return self.get_collection(name)
+
+    def __getattr__(self, name: str) -> InMemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.get_collection(name)
+
+    async def list_collection_names(self) -> List[str]:
+        return list(self.collections)
+
+    async def drop_collection(self, name: str):
+        self.collections.pop(name, None)
+
+    async def command(self, command, **kwargs) -> dict:
+        name = command if isinstance(command, str) else next(iter(command))
+        if name == "ping":
+            return {"ok": 1.0}
+        raise OperationFailure(f"command {name} is not supported by the in-memory store", code=59)
+
+class InMemoryClient:
+    """Drop-in replacement for AsyncIOMotorClient backed by process memory."""
+
+    def __init__(self, latency_ms: Optional[float] = None, jitter_ms: Optional[float] = None):
+        self.latency_ms = MEMORY_STORE_LATENCY_MS if latency_ms is None else latency_ms
+        self.jitter_ms = MEMORY_STORE_LATENCY_JITTER_MS if jitter_ms is None else jitter_ms
+        self.databases: Dict[str, InMemoryDatabase] = {}
+
+    def latency(self) -> float:
+        """Seconds to wait before the next command completes."""
+        delay_ms = self.latency_ms
+        if self.jitter_ms:
+            delay_ms += random.uniform(0, self.jitter_ms)
+        return delay_ms / 1000
+
+    def get_database(self, name: str) -> InMemoryDatabase:
+        database = self.databases.get(name)
+        if database is None:
+            database = self.databases[name] = InMemoryDatabase(self, name)
+        return database
+
+    def __getitem__(self, name: str) -> InMemoryDatabase:
+        return self.get_database(name)
+
+    def close(self):
+        pass
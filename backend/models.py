@@ -81,6 +81,16 @@ class Service(BaseDocument, ServiceBase):
     image_url: Optional[str] = None
 
 # Therapist Models
+class WorkingWindow(BaseModel):
+    start: str = Field(..., pattern=r"^\d{2}:\d{2}$")  # HH:MM
+    end: str = Field(..., pattern=r"^\d{2}:\d{2}$")  # HH:MM, 24:00 for midnight
+
+class WorkingHours(BaseModel):
+    # monday..sunday -> windows; days left out are days off
+    weekly: Dict[str, List[WorkingWindow]] = {}
+    # YYYY-MM-DD -> windows replacing that day's template; [] for a day off
+    exceptions: Dict[str, List[WorkingWindow]] = {}
+
 class TherapistBase(BaseModel):
     user_id: str
     specialties: List[str]
@@ -146,6 +156,12 @@ class Therapist(BaseDocument, TherapistBase):
     profile_image: Optional[str] = None
     gallery_images: List[str] = []
     reviews_count: int = 0
+    # Running totals behind rating: sum of stars and review count per star
+    rating_sum: int = 0
+    rating_histogram: Dict[str, int] = {}
+    # None means the default hours; the version invalidates compiled calendars
+    working_hours: Optional[WorkingHours] = None
+    working_hours_version: int = 0
     is_available: bool = True
     last_active: Optional[datetime] = None
 
@@ -160,6 +176,8 @@ class TherapistPublic(BaseModel):
     hourly_rate: float
     rating: float
     reviews_count: int
+    rating_histogram: Dict[str, int] = {}
+    working_hours: Optional[WorkingHours] = None
     profile_image: Optional[str] = None
     gallery_images: List[str]
     is_available: bool
@@ -182,6 +200,13 @@ class BookingBase(BaseModel):
 class BookingCreate(BookingBase):
     pass
 
+# Display names stored on the booking at creation time
+class BookingSnapshot(BaseModel):
+    therapist_name: Optional[str] = None
+    service_name: Optional[str] = None
+    client_name: Optional[str] = None
+    service_category: Optional[str] = None
+
 class Booking(BaseDocument, BookingBase):
     status: BookingStatus = BookingStatus.PENDING
     total_amount: float
@@ -191,6 +216,12 @@ class Booking(BaseDocument, BookingBase):
     completed_at: Optional[datetime] = None
     therapist_notes: Optional[str] = None
     client_notes: Optional[str] = None
+    snapshot: Optional[BookingSnapshot] = None
+    # Stored and indexed in UTC; appointment_date/time are their local values
+    # in timezone (see scheduling.booking_document)
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+    timezone: Optional[str] = None
 
 class BookingResponse(BaseDocument, BookingBase):
     status: BookingStatus
@@ -198,6 +229,9 @@ class BookingResponse(BaseDocument, BookingBase):
     payment_status: PaymentStatus
     therapist_name: Optional[str] = None
     service_name: Optional[str] = None
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+    timezone: Optional[str] = None
 
 # Review Models
 class ReviewBase(BaseModel):
@@ -228,6 +262,27 @@ class PaymentResponse(BaseModel):
     client_secret: str
     payment_intent_id: str
 
+class BulkRefundRequest(BaseModel):
+    reason: str
+    # Either explicit bookings or a therapist and date range
+    booking_ids: Optional[List[str]] = None
+    therapist_id: Optional[str] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+
+class BulkRefundResult(BaseModel):
+    booking_id: str
+    status: str  # refunded, skipped or failed
+    refund_id: Optional[str] = None
+    amount: Optional[float] = None
+    detail: Optional[str] = None
+
+class BulkRefundResponse(BaseModel):
+    refunded: int
+    skipped: int
+    failed: int
+    results: List[BulkRefundResult]
+
 # Admin Models
 class AdminStats(BaseModel):
     total_users: int
@@ -269,6 +324,11 @@ class FileUpload(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     email: Optional[str] = None
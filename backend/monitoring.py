@@ -0,0 +1,263 @@
+from collections import deque
+from contextvars import ContextVar
+from typing import Optional
+from pymongo import monitoring
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Commands slower than this are logged and kept for the admin endpoint
+DB_SLOW_COMMAND_MS = float(os.getenv("DB_SLOW_COMMAND_MS", 100))
+# Requests issuing more round trips than this are logged as likely N+1
+DB_ROUND_TRIPS_WARN = int(os.getenv("DB_ROUND_TRIPS_WARN", 25))
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Collects connection pool (CMAP) metrics: checkout wait time and usage."""
+
+    def __init__(self, sample_size: int = 1000):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.wait_samples = deque(maxlen=sample_size)
+        self.pools = 0
+        self.pool_clears = 0
+        self.open_connections = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.checkouts = 0
+        self.checkout_failures = {}
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def _finish_wait(self) -> float:
+        started = getattr(self.local, "checkout_started", None)
+        self.local.checkout_started = None
+        if started is None:
+            return 0.0
+        return (time.perf_counter() - started) * 1000
+
+    def pool_created(self, event):
+        with self.lock:
+            self.pools += 1
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self.lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        with self.lock:
+            self.pools -= 1
+
+    def connection_created(self, event):
+        with self.lock:
+            self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self.lock:
+            self.open_connections -= 1
+
+    def connection_check_out_started(self, event):
+        # Checkout events for one operation fire on the same thread
+        self.local.checkout_started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self._finish_wait()
+        with self.lock:
+            reason = str(event.reason)
+            self.checkout_failures[reason] = self.checkout_failures.get(reason, 0) + 1
+
+    def connection_checked_out(self, event):
+        wait_ms = self._finish_wait()
+        with self.lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            self.wait_samples.append(wait_ms)
+
+    def connection_checked_in(self, event):
+        with self.lock:
+            self.in_use -= 1
+
+    def snapshot(self) -> dict:
+        """Point-in-time view of the pool counters."""
+        with self.lock:
+            samples = sorted(self.wait_samples)
+            p99 = samples[int(len(samples) * 0.99) - 1] if samples else 0.0
+            return {
+                "pools": self.pools,
+                "pool_clears": self.pool_clears,
+                "open_connections": self.open_connections,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "checkouts": self.checkouts,
+                "checkout_failures": dict(self.checkout_failures),
+                "checkout_wait_ms": {
+                    "avg": self.total_wait_ms / self.checkouts if self.checkouts else 0.0,
+                    "p99_recent": p99,
+                    "max": self.max_wait_ms
+                }
+            }
+
+class RequestDbStats:
+    """Database usage of a single HTTP request."""
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.commands = 0
+        self.db_time_ms = 0.0
+        self.slow_commands = 0
+
+    @property
+    def route(self) -> str:
+        # The router stores the matched endpoint in the (shared) ASGI scope
+        endpoint = self.scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        return f"{endpoint.__module__.rsplit('.', 1)[-1]}.{endpoint.__name__}"
+
+# Set per request by DbMetricsMiddleware. Motor copies the context into its
+# executor threads, so command events see the request that issued them.
+current_request_stats: ContextVar[Optional[RequestDbStats]] = ContextVar(
+    "current_request_stats", default=None
+)
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Attributes every Mongo command to the FastAPI route that issued it."""
+
+    def __init__(self, slow_ms: float = DB_SLOW_COMMAND_MS, slow_sample_size: int = 200):
+        self.slow_ms = slow_ms
+        self.lock = threading.Lock()
+        self.collections = {}
+        self.routes = {}
+        self.background = {"commands": 0, "db_time_ms": 0.0}
+        self.slow_commands = deque(maxlen=slow_sample_size)
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        self.collections[event.request_id] = collection if isinstance(collection, str) else None
+
+    def succeeded(self, event):
+        collection = self.collections.pop(event.request_id, None)
+        self.record(event.command_name, collection, event.duration_micros / 1000)
+
+    def failed(self, event):
+        collection = self.collections.pop(event.request_id, None)
+        self.record(event.command_name, collection, event.duration_micros / 1000, failed=True)
+
+    def record(self, command_name: str, collection: Optional[str], duration_ms: float, failed: bool = False):
+        """Attribute one finished command to the current request (or background)."""
+        stats = current_request_stats.get()
+        slow = duration_ms >= self.slow_ms
+
+        with self.lock:
+            if stats is None:
+                self.background["commands"] += 1
+                self.background["db_time_ms"] += duration_ms
+            else:
+                stats.commands += 1
+                stats.db_time_ms += duration_ms
+                stats.slow_commands += slow
+
+        if slow:
+            route = stats.route if stats is not None else "background"
+            self.slow_commands.append({
+                "route": route,
+                "command": command_name,
+                "collection": collection,
+                "duration_ms": round(duration_ms, 2),
+                "failed": failed,
+                "at": time.time()
+            })
+            logger.warning(
+                f"slow_db_command route={route} command={command_name} "
+                f"collection={collection} duration_ms={duration_ms:.1f} failed={failed}"
+            )
+
+    def finish_request(self, stats: RequestDbStats):
+        """Fold a finished request into the per-route totals."""
+        if stats.commands == 0:
+            return
+
+        route = stats.route
+        with self.lock:
+            totals = self.routes.setdefault(route, {
+                "requests": 0,
+                "commands": 0,
+                "max_commands": 0,
+                "db_time_ms": 0.0,
+                "max_db_time_ms": 0.0,
+                "slow_commands": 0
+            })
+            totals["requests"] += 1
+            totals["commands"] += stats.commands
+            totals["max_commands"] = max(totals["max_commands"], stats.commands)
+            totals["db_time_ms"] += stats.db_time_ms
+            totals["max_db_time_ms"] = max(totals["max_db_time_ms"], stats.db_time_ms)
+            totals["slow_commands"] += stats.slow_commands
+
+        message = (
+            f"db_request route={route} commands={stats.commands} "
+            f"db_time_ms={stats.db_time_ms:.1f} slow_commands={stats.slow_commands}"
+        )
+        if stats.commands > DB_ROUND_TRIPS_WARN:
+            logger.warning(message)
+        else:
+            logger.debug(message)
+
+    def snapshot(self) -> dict:
+        """Per-route round trips and DB time, plus recent slow commands."""
+        with self.lock:
+            routes = {}
+            for route, totals in sorted(self.routes.items()):
+                routes[route] = {
+                    **totals,
+                    "avg_commands": totals["commands"] / totals["requests"],
+                    "avg_db_time_ms": totals["db_time_ms"] / totals["requests"]
+                }
+            return {
+                "slow_command_threshold_ms": self.slow_ms,
+                "routes": routes,
+                "background": dict(self.background),
+                "slow_commands": list(self.slow_commands)
+            }
+
+    def reset(self):
+        """Clear the collected totals."""
+        with self.lock:
+            self.routes.clear()
+            self.background = {"commands": 0, "db_time_ms": 0.0}
+            self.slow_commands.clear()
+
+class DbMetricsMiddleware:
+    """ASGI middleware that scopes command metrics to the current request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestDbStats(scope)
+        token = current_request_stats.set(stats)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request_stats.reset(token)
+            command_metrics.finish_request(stats)
+
+pool_metrics = PoolMetricsListener()
+command_metrics = CommandMetricsListener()
@@ -2,12 +2,21 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
-from ..database import get_database
+import asyncio
+from ..database import get_database, db as database
+from ..monitoring import pool_metrics, command_metrics
+from ..loaders import Loaders, get_loaders
+from ..services.outbox import notification_outbox
+from ..services.payment_events import payment_event_processor
+from ..services.scheduling import booking_output, day_bounds
 from ..models import (
     AdminStats, User, Booking, BookingStatus, PaymentStatus,
     TherapistApplication, Therapist, TherapistStatus
 )
-from ..auth import get_current_admin
+from ..auth import (
+    get_current_admin, invalidate_principal, invalidate_therapist_profile,
+    principal_cache, revoke_user_refresh_tokens
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -83,6 +92,7 @@ async def get_all_bookings(
     limit: int = Query(50, le=200),
     skip: int = Query(0),
     current_admin: User = Depends(get_current_admin),
+    loaders: Loaders = Depends(get_loaders),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get all bookings (Admin only)."""
@@ -99,7 +109,7 @@ async def get_all_bookings(
         if date_from:
             try:
                 from_date = datetime.strptime(date_from, "%Y-%m-%d").date()
-                date_query["$gte"] = from_date
+                date_query["$gte"] = day_bounds(from_date)[0]
             except ValueError:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -109,39 +119,36 @@ async def get_all_bookings(
         if date_to:
             try:
                 to_date = datetime.strptime(date_to, "%Y-%m-%d").date()
-                date_query["$lte"] = to_date
+                date_query["$lt"] = day_bounds(to_date)[1]
             except ValueError:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Invalid date_to format. Use YYYY-MM-DD"
                 )
         
-        query["appointment_date"] = date_query
+        query["starts_at"] = date_query
     
-    bookings_cursor = db.bookings.find(query).skip(skip).limit(limit).sort("created_at", -1)
+    bookings_cursor = db.bookings.find(query, {"_id": 0}).skip(skip).limit(limit).sort("created_at", -1)
     bookings = await bookings_cursor.to_list(length=limit)
     
-    # Enrich with user and therapist details
+    # Names come from the stored snapshot (legacy bookings are filled in);
+    # client emails can change, so they are batch-loaded
+    clients, _ = await asyncio.gather(
+        loaders.users.load_many(booking["client_id"] for booking in bookings),
+        loaders.fill_booking_snapshots(bookings)
+    )
+    
     enriched_bookings = []
     for booking in bookings:
-        # Get client details
-        client = await db.users.find_one({"id": booking["client_id"]})
-        
-        # Get therapist details
-        therapist_data = await db.therapists.find_one({"id": booking["therapist_id"]})
-        therapist_user = None
-        if therapist_data:
-            therapist_user = await db.users.find_one({"id": therapist_data["user_id"]})
-        
-        # Get service details
-        service = await db.services.find_one({"id": booking["service_id"]})
+        client = clients.get(booking["client_id"])
+        snapshot = booking["snapshot"]
         
         enriched_booking = {
-            **booking,
-            "client_name": client["full_name"] if client else "Unknown",
+            **booking_output(booking),
+            "client_name": snapshot["client_name"] or "Unknown",
             "client_email": client["email"] if client else "Unknown",
-            "therapist_name": therapist_user["full_name"] if therapist_user else "Unknown",
-            "service_name": service["name"] if service else "Unknown"
+            "therapist_name": snapshot["therapist_name"] or "Unknown",
+            "service_name": snapshot["service_name"] or "Unknown"
         }
         
         enriched_bookings.append(enriched_booking)
@@ -154,6 +161,7 @@ async def get_all_therapists(
     limit: int = Query(50, le=200),
     skip: int = Query(0),
     current_admin: User = Depends(get_current_admin),
+    loaders: Loaders = Depends(get_loaders),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get all therapists (Admin only)."""
@@ -164,10 +172,12 @@ async def get_all_therapists(
     therapists_cursor = db.therapists.find(query).skip(skip).limit(limit).sort("created_at", -1)
     therapists = await therapists_cursor.to_list(length=limit)
     
-    # Enrich with user details
+    # Enrich with user details in one batch
+    users = await loaders.users.load_many(therapist["user_id"] for therapist in therapists)
+    
     enriched_therapists = []
     for therapist in therapists:
-        user = await db.users.find_one({"id": therapist["user_id"]})
+        user = users.get(therapist["user_id"])
         if user:
             enriched_therapist = {
                 **therapist,
@@ -198,6 +208,8 @@ async def activate_user(
         {"$set": {"is_active": True, "updated_at": datetime.utcnow()}}
     )
     
+    invalidate_principal(user_id)
+    
     logger.info(f"User activated: {user_id}")
     return {"message": "User activated successfully"}
 
@@ -220,9 +232,89 @@ async def deactivate_user(
         {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
     )
     
+    invalidate_principal(user_id)
+    await revoke_user_refresh_tokens(user_id)
+    
     logger.info(f"User deactivated: {user_id}")
     return {"message": "User deactivated successfully"}
 
+@router.get("/metrics/principal-cache")
+async def get_principal_cache_metrics(
+    current_admin: User = Depends(get_current_admin)
+):
+    """Get authenticated-principal cache hit/miss counters (Admin only)."""
+    return principal_cache.stats()
+
+@router.get("/metrics/db-pool")
+async def get_db_pool_metrics(
+    current_admin: User = Depends(get_current_admin)
+):
+    """Get MongoDB connection pool settings and usage (Admin only)."""
+    return {
+        "settings": database.options,
+        "pool": pool_metrics.snapshot()
+    }
+
+@router.get("/metrics/db")
+async def get_db_metrics(
+    reset: bool = Query(False),
+    current_admin: User = Depends(get_current_admin)
+):
+    """Get per-route database round trips, DB time and slow commands (Admin only)."""
+    snapshot = command_metrics.snapshot()
+    if reset:
+        command_metrics.reset()
+    return snapshot
+
+@router.get("/outbox")
+async def get_outbox(
+    status: Optional[str] = Query("dead"),
+    limit: int = Query(50, le=200),
+    current_admin: User = Depends(get_current_admin),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Get notification outbox counters and messages by status (Admin only)."""
+    messages = await db.outbox.find(
+        {"status": status}, {"_id": 0}
+    ).sort("updated_at", -1).limit(limit).to_list(length=limit)
+    
+    return {
+        **await notification_outbox.stats(db),
+        "messages": messages
+    }
+
+@router.post("/outbox/{message_id}/retry")
+async def retry_outbox_message(
+    message_id: str,
+    current_admin: User = Depends(get_current_admin),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Requeue a dead-lettered or skipped notification (Admin only)."""
+    if not await notification_outbox.retry(db, message_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No dead or skipped message with this id"
+        )
+    
+    return {"message": "Notification requeued"}
+
+@router.get("/payment-events")
+async def get_payment_events(
+    status: Optional[str] = Query("dead"),
+    limit: int = Query(50, le=200),
+    current_admin: User = Depends(get_current_admin),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Get Stripe event log counters and events by status (Admin only)."""
+    events = await db.payment_events.find(
+        {"status": status}, {"_id": 0, "object": 0}
+    ).sort("received_at", -1).limit(limit).to_list(length=limit)
+    
+    return {
+        **await payment_event_processor.stats(db),
+        "events": events
+    }
+
 @router.put("/therapists/{therapist_id}/status")
 async def update_therapist_status(
     therapist_id: str,
@@ -251,6 +343,7 @@ async def update_therapist_status(
         {"id": therapist_id},
         {"$set": update_data}
     )
+    invalidate_therapist_profile(therapist["user_id"])
     
     logger.info(f"Therapist status updated: {therapist_id} -> {new_status}")
     return {"message": "Therapist status updated successfully"}
@@ -306,6 +399,7 @@ async def get_revenue_analytics(
 async def get_popular_services(
     limit: int = Query(10, le=50),
     current_admin: User = Depends(get_current_admin),
+    loaders: Loaders = Depends(get_loaders),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get popular services analytics (Admin only)."""
@@ -323,10 +417,12 @@ async def get_popular_services(
     
     service_stats = await db.bookings.aggregate(pipeline).to_list(length=limit)
     
-    # Enrich with service details
+    # Enrich with service details in one batch
+    services = await loaders.services.load_many(stat["_id"] for stat in service_stats)
+    
     enriched_stats = []
     for stat in service_stats:
-        service = await db.services.find_one({"id": stat["_id"]})
+        service = services.get(stat["_id"])
         if service:
             enriched_stat = {
                 "service_id": stat["_id"],
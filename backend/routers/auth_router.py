@@ -3,11 +3,13 @@ from fastapi.security import HTTPBearer
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import timedelta, datetime
 from ..database import get_database
-from ..models import UserCreate, UserLogin, Token, User, UserResponse
+from ..models import UserCreate, UserLogin, Token, User, UserResponse, RefreshTokenRequest
 from ..auth import (
     authenticate_user, create_user_token, get_password_hash, 
-    ACCESS_TOKEN_EXPIRE_MINUTES, get_current_active_user
+    ACCESS_TOKEN_EXPIRE_MINUTES, get_current_active_user, invalidate_principal,
+    create_refresh_token, rotate_refresh_token, revoke_refresh_token
 )
+from ..services.snapshot_reconciler import snapshot_reconciler
 import logging
 
 logger = logging.getLogger(__name__)
@@ -36,7 +38,7 @@ async def register(
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash(user_data.password)
     user_dict = user_data.dict()
     del user_dict["password"]
     user_dict["hashed_password"] = hashed_password
@@ -68,9 +70,37 @@ async def login(
         )
     
     access_token = create_user_token(user)
+    refresh_token = await create_refresh_token(user)
     logger.info(f"User logged in: {user.email}")
     
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(
+    token_request: RefreshTokenRequest,
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Rotate a refresh token and issue a new access token."""
+    user, refresh_token = await rotate_refresh_token(db, token_request.refresh_token)
+    access_token = create_user_token(user)
+    
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+
+@router.post("/logout")
+async def logout(token_request: RefreshTokenRequest):
+    """Revoke the refresh token for this session."""
+    await revoke_refresh_token(token_request.refresh_token)
+    return {"message": "Logged out successfully"}
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(
@@ -96,11 +126,15 @@ async def update_current_user(
             {"id": current_user.id},
             {"$set": update_data}
         )
+        invalidate_principal(current_user.id)
         
         # Get updated user
         updated_user_data = await db.users.find_one({"id": current_user.id})
         updated_user = User(**updated_user_data)
         
+        if updated_user.full_name != current_user.full_name:
+            snapshot_reconciler.user_renamed(updated_user.id, updated_user.full_name)
+        
         logger.info(f"User updated: {current_user.email}")
         return UserResponse(**updated_user.dict())
     
@@ -1,15 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
 from typing import List, Optional
 from datetime import datetime, date, time
 from ..database import get_database
 from ..models import (
-    BookingCreate, Booking, BookingResponse, User, BookingStatus,
-    PaymentStatus, Review, ReviewCreate
+    BookingCreate, Booking, BookingResponse, BookingSnapshot, User, BookingStatus,
+    PaymentStatus, Review, ReviewCreate, Therapist
 )
-from ..auth import get_current_active_user, get_current_therapist
-from ..services.email_service import email_service
-from ..services.sms_service import sms_service
+from ..auth import (
+    get_current_active_user, get_current_therapist,
+    get_current_therapist_profile, get_optional_therapist_profile
+)
+from ..loaders import Loaders, get_loaders
+from ..services.scheduling import schedule_index, booking_document, booking_interval, booking_output
+from ..services.slot_reservations import slot_reservations, SlotUnavailable
+from ..services.calendars import calendar_service, within_working_hours
+from ..services.outbox import notification_outbox
+from ..services.booking_state import booking_state, BookingNotFound, TransitionConflict
+from ..services.ratings import rating_aggregator
 import logging
 
 logger = logging.getLogger(__name__)
@@ -42,14 +51,27 @@ async def create_booking(
             detail="Service not found"
         )
     
-    # Check for time conflicts
-    existing_booking = await db.bookings.find_one({
-        "therapist_id": booking_data.therapist_id,
-        "appointment_date": booking_data.appointment_date,
+    # Quick check against the cached schedule; the slot reservation below is
+    # what actually guarantees there is no overlap
+    schedule = await schedule_index.get_day(
+        db, booking_data.therapist_id, booking_data.appointment_date
+    )
+    start, end, _ = booking_interval({
+        "id": None,
         "appointment_time": booking_data.appointment_time,
-        "status": {"$in": ["confirmed", "in_progress"]}
+        "duration_minutes": booking_data.duration_minutes
     })
-    if existing_booking:
+    if not within_working_hours(therapist.get("working_hours"), booking_data.appointment_date, start, end):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Therapist is not working at this time"
+        )
+    if not schedule.is_free(start, end):
+        # The cached day may predate a cancellation on another worker
+        schedule = await schedule_index.get_day(
+            db, booking_data.therapist_id, booking_data.appointment_date, fresh=True
+        )
+    if not schedule.is_free(start, end):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Time slot already booked"
@@ -58,55 +80,84 @@ async def create_booking(
     # Calculate total amount
     total_amount = service["base_price"] * (booking_data.duration_minutes / 60)
     
-    # Create booking
-    booking = Booking(
-        **booking_data.dict(),
-        client_id=current_user.id,
-        total_amount=total_amount
-    )
-    
-    await db.bookings.insert_one(booking.dict())
-    
     # Get therapist user details
     therapist_user = await db.users.find_one({"id": therapist["user_id"]})
     
-    # Send notifications
-    await email_service.send_booking_confirmation(
-        current_user.email,
-        current_user.full_name,
-        therapist_user["full_name"],
-        service["name"],
-        str(booking_data.appointment_date),
-        str(booking_data.appointment_time),
-        booking_data.location_address,
-        total_amount
+    # Create booking with a display snapshot so reads need no joins
+    booking = Booking(
+        **{**booking_data.dict(), "client_id": current_user.id},
+        total_amount=total_amount,
+        snapshot=BookingSnapshot(
+            therapist_name=therapist_user["full_name"],
+            service_name=service["name"],
+            client_name=current_user.full_name,
+            service_category=service["category"]
+        )
     )
     
-    await email_service.send_therapist_notification(
-        therapist_user["email"],
-        therapist_user["full_name"],
-        current_user.full_name,
-        service["name"],
-        str(booking_data.appointment_date),
-        str(booking_data.appointment_time),
-        booking_data.location_address
-    )
+    booking_doc = booking_document(booking)
+    try:
+        await slot_reservations.reserve(db, booking_doc)
+    except SlotUnavailable:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Time slot already booked"
+        )
     
-    # Send SMS confirmation
-    await sms_service.send_booking_confirmation_sms(
-        current_user.phone,
-        current_user.full_name,
-        service["name"],
-        str(booking_data.appointment_date),
-        str(booking_data.appointment_time)
-    )
+    try:
+        await db.bookings.insert_one(booking_doc)
+    except Exception:
+        await slot_reservations.release(db, booking.id)
+        raise
+    schedule_index.booking_added(booking_doc)
+    await calendar_service.booking_reserved(db, booking_doc)
+    
+    # Queue notifications; the outbox workers deliver them after we respond
+    try:
+        await notification_outbox.enqueue(db, [
+            notification_outbox.message(
+                "email.booking_confirmation",
+                booking.id,
+                client_email=current_user.email,
+                client_name=current_user.full_name,
+                therapist_name=therapist_user["full_name"],
+                service_name=service["name"],
+                appointment_date=str(booking_data.appointment_date),
+                appointment_time=str(booking_data.appointment_time),
+                location=booking_data.location_address,
+                total_amount=total_amount
+            ),
+            notification_outbox.message(
+                "email.therapist_notification",
+                booking.id,
+                therapist_email=therapist_user["email"],
+                therapist_name=therapist_user["full_name"],
+                client_name=current_user.full_name,
+                service_name=service["name"],
+                appointment_date=str(booking_data.appointment_date),
+                appointment_time=str(booking_data.appointment_time),
+                location=booking_data.location_address
+            ),
+            notification_outbox.message(
+                "sms.booking_confirmation",
+                booking.id,
+                client_phone=current_user.phone,
+                client_name=current_user.full_name,
+                service_name=service["name"],
+                appointment_date=str(booking_data.appointment_date),
+                appointment_time=str(booking_data.appointment_time)
+            )
+        ])
+    except Exception as e:
+        # The booking is stored; a lost notification must not fail it
+        logger.error(f"Failed to queue notifications for booking {booking.id}: {str(e)}")
     
     logger.info(f"New booking created: {booking.id}")
     
     return BookingResponse(
-        **booking.dict(),
-        therapist_name=therapist_user["full_name"],
-        service_name=service["name"]
+        **booking_output(booking_doc),
+        therapist_name=booking.snapshot.therapist_name,
+        service_name=booking.snapshot.service_name
     )
 
 @router.get("/my-bookings", response_model=List[BookingResponse])
@@ -115,6 +166,7 @@ async def get_my_bookings(
     limit: int = Query(20, le=100),
     skip: int = Query(0),
     current_user: User = Depends(get_current_active_user),
+    loaders: Loaders = Depends(get_loaders),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get current user's bookings."""
@@ -122,28 +174,20 @@ async def get_my_bookings(
     if status:
         query["status"] = status
     
-    bookings_cursor = db.bookings.find(query).skip(skip).limit(limit).sort("appointment_date", -1)
+    bookings_cursor = db.bookings.find(query).skip(skip).limit(limit).sort("starts_at", -1)
     bookings = await bookings_cursor.to_list(length=limit)
     
-    result = []
-    for booking in bookings:
-        # Get therapist and service details
-        therapist = await db.therapists.find_one({"id": booking["therapist_id"]})
-        service = await db.services.find_one({"id": booking["service_id"]})
-        
-        therapist_name = None
-        if therapist:
-            therapist_user = await db.users.find_one({"id": therapist["user_id"]})
-            if therapist_user:
-                therapist_name = therapist_user["full_name"]
-        
-        result.append(BookingResponse(
-            **booking,
-            therapist_name=therapist_name,
-            service_name=service["name"] if service else None
-        ))
-    
-    return result
+    # Names come from the stored snapshot; only legacy bookings need lookups
+    await loaders.fill_booking_snapshots(bookings)
+    
+    return [
+        BookingResponse(
+            **booking_output(booking),
+            therapist_name=booking["snapshot"]["therapist_name"],
+            service_name=booking["snapshot"]["service_name"]
+        )
+        for booking in bookings
+    ]
 
 @router.get("/therapist-bookings", response_model=List[BookingResponse])
 async def get_therapist_bookings(
@@ -151,42 +195,36 @@ async def get_therapist_bookings(
     limit: int = Query(20, le=100),
     skip: int = Query(0),
     current_therapist: User = Depends(get_current_therapist),
+    therapist: Therapist = Depends(get_current_therapist_profile),
+    loaders: Loaders = Depends(get_loaders),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get therapist's bookings."""
-    # Get therapist profile
-    therapist = await db.therapists.find_one({"user_id": current_therapist.id})
-    if not therapist:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Therapist profile not found"
-        )
-    
-    query = {"therapist_id": therapist["id"]}
+    query = {"therapist_id": therapist.id}
     if status:
         query["status"] = status
     
-    bookings_cursor = db.bookings.find(query).skip(skip).limit(limit).sort("appointment_date", -1)
+    bookings_cursor = db.bookings.find(query).skip(skip).limit(limit).sort("starts_at", -1)
     bookings = await bookings_cursor.to_list(length=limit)
     
-    result = []
-    for booking in bookings:
-        # Get client and service details
-        client = await db.users.find_one({"id": booking["client_id"]})
-        service = await db.services.find_one({"id": booking["service_id"]})
-        
-        result.append(BookingResponse(
-            **booking,
-            therapist_name=current_therapist.full_name,
-            service_name=service["name"] if service else None
-        ))
-    
-    return result
+    # Names come from the stored snapshot; only legacy bookings need lookups
+    await loaders.fill_booking_snapshots(bookings)
+    
+    return [
+        BookingResponse(
+            **booking_output(booking),
+            therapist_name=booking["snapshot"]["therapist_name"],
+            service_name=booking["snapshot"]["service_name"]
+        )
+        for booking in bookings
+    ]
 
 @router.get("/{booking_id}", response_model=BookingResponse)
 async def get_booking(
     booking_id: str,
     current_user: User = Depends(get_current_active_user),
+    therapist: Optional[Therapist] = Depends(get_optional_therapist_profile),
+    loaders: Loaders = Depends(get_loaders),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get booking details."""
@@ -198,189 +236,148 @@ async def get_booking(
         )
     
     # Check if user has access to this booking
-    therapist = None
-    if current_user.role == "therapist":
-        therapist = await db.therapists.find_one({"user_id": current_user.id})
-    
     if (booking["client_id"] != current_user.id and 
-        (not therapist or booking["therapist_id"] != therapist["id"]) and
+        (not therapist or booking["therapist_id"] != therapist.id) and
         current_user.role != "admin"):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to view this booking"
         )
     
-    # Get additional details
-    therapist_data = await db.therapists.find_one({"id": booking["therapist_id"]})
-    service = await db.services.find_one({"id": booking["service_id"]})
-    
-    therapist_name = None
-    if therapist_data:
-        therapist_user = await db.users.find_one({"id": therapist_data["user_id"]})
-        if therapist_user:
-            therapist_name = therapist_user["full_name"]
+    # Names come from the stored snapshot; only legacy bookings need lookups
+    await loaders.fill_booking_snapshots([booking])
     
     return BookingResponse(
-        **booking,
-        therapist_name=therapist_name,
-        service_name=service["name"] if service else None
+        **booking_output(booking),
+        therapist_name=booking["snapshot"]["therapist_name"],
+        service_name=booking["snapshot"]["service_name"]
+    )
+
+def _transition_error(e: Exception) -> HTTPException:
+    if isinstance(e, BookingNotFound):
+        return HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Booking not found"
+        )
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=str(e)
+    )
+
+async def _booking_response(booking: dict, loaders: Loaders) -> BookingResponse:
+    await loaders.fill_booking_snapshots([booking])
+    return BookingResponse(
+        **booking_output(booking),
+        therapist_name=booking["snapshot"]["therapist_name"],
+        service_name=booking["snapshot"]["service_name"]
     )
 
 @router.put("/{booking_id}/confirm")
 async def confirm_booking(
     booking_id: str,
     current_therapist: User = Depends(get_current_therapist),
+    therapist: Therapist = Depends(get_current_therapist_profile),
+    loaders: Loaders = Depends(get_loaders),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Confirm booking (Therapist only)."""
-    # Get therapist profile
-    therapist = await db.therapists.find_one({"user_id": current_therapist.id})
-    if not therapist:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Therapist profile not found"
-        )
-    
-    # Get booking
-    booking = await db.bookings.find_one({
-        "id": booking_id,
-        "therapist_id": therapist["id"]
-    })
-    if not booking:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Booking not found"
-        )
-    
-    if booking["status"] != BookingStatus.PENDING:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Booking cannot be confirmed"
+    try:
+        booking = await booking_state.transition(
+            db, booking_id, BookingStatus.CONFIRMED,
+            scope={"therapist_id": therapist.id}
         )
-    
-    # Update booking status
-    await db.bookings.update_one(
-        {"id": booking_id},
-        {
-            "$set": {
-                "status": BookingStatus.CONFIRMED,
-                "updated_at": datetime.utcnow()
-            }
-        }
-    )
+    except (BookingNotFound, TransitionConflict) as e:
+        raise _transition_error(e)
     
     logger.info(f"Booking confirmed: {booking_id}")
-    return {"message": "Booking confirmed successfully"}
+    return {
+        "message": "Booking confirmed successfully",
+        "booking": await _booking_response(booking, loaders)
+    }
 
 @router.put("/{booking_id}/cancel")
 async def cancel_booking(
     booking_id: str,
     reason: str,
     current_user: User = Depends(get_current_active_user),
+    therapist: Optional[Therapist] = Depends(get_optional_therapist_profile),
+    loaders: Loaders = Depends(get_loaders),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Cancel booking."""
-    booking = await db.bookings.find_one({"id": booking_id})
-    if not booking:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Booking not found"
-        )
-    
-    # Check if user can cancel this booking
-    can_cancel = False
-    if booking["client_id"] == current_user.id:
-        can_cancel = True
-    elif current_user.role == "therapist":
-        therapist = await db.therapists.find_one({"user_id": current_user.id})
-        if therapist and booking["therapist_id"] == therapist["id"]:
-            can_cancel = True
-    elif current_user.role == "admin":
-        can_cancel = True
-    
-    if not can_cancel:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized to cancel this booking"
-        )
-    
-    if booking["status"] in [BookingStatus.COMPLETED, BookingStatus.CANCELLED]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Booking cannot be cancelled"
+    # Clients, the booking's therapist and admins may cancel
+    scope = None
+    if current_user.role != "admin":
+        owners = [{"client_id": current_user.id}]
+        if therapist:
+            owners.append({"therapist_id": therapist.id})
+        scope = {"$or": owners}
+    
+    try:
+        booking = await booking_state.transition(
+            db, booking_id, BookingStatus.CANCELLED,
+            scope=scope,
+            fields={"cancellation_reason": reason}
         )
-    
-    # Update booking status
-    await db.bookings.update_one(
-        {"id": booking_id},
-        {
-            "$set": {
-                "status": BookingStatus.CANCELLED,
-                "cancellation_reason": reason,
-                "updated_at": datetime.utcnow()
-            }
-        }
-    )
+    except BookingNotFound as e:
+        # Out of scope is "forbidden" when the booking exists at all
+        if scope and await db.bookings.find_one({"id": booking_id}, {"_id": 1}):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not authorized to cancel this booking"
+            )
+        raise _transition_error(e)
+    except TransitionConflict as e:
+        raise _transition_error(e)
+    
+    await slot_reservations.release(db, booking_id)
+    schedule_index.booking_released(booking)
+    await calendar_service.booking_released(db, booking)
     
     logger.info(f"Booking cancelled: {booking_id}")
-    return {"message": "Booking cancelled successfully"}
+    return {
+        "message": "Booking cancelled successfully",
+        "booking": await _booking_response(booking, loaders)
+    }
 
 @router.put("/{booking_id}/complete")
 async def complete_booking(
     booking_id: str,
     notes: Optional[str] = None,
     current_therapist: User = Depends(get_current_therapist),
+    therapist: Therapist = Depends(get_current_therapist_profile),
+    loaders: Loaders = Depends(get_loaders),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Mark booking as completed (Therapist only)."""
-    # Get therapist profile
-    therapist = await db.therapists.find_one({"user_id": current_therapist.id})
-    if not therapist:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Therapist profile not found"
-        )
-    
-    # Get booking
-    booking = await db.bookings.find_one({
-        "id": booking_id,
-        "therapist_id": therapist["id"]
-    })
-    if not booking:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Booking not found"
-        )
-    
-    if booking["status"] != BookingStatus.CONFIRMED:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Booking must be confirmed before completion"
-        )
-    
-    # Update booking status
-    update_data = {
-        "status": BookingStatus.COMPLETED,
-        "completed_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow()
-    }
-    
+    update_data = {"completed_at": datetime.utcnow()}
     if notes:
         update_data["therapist_notes"] = notes
     
-    await db.bookings.update_one(
-        {"id": booking_id},
-        {"$set": update_data}
-    )
+    try:
+        booking = await booking_state.transition(
+            db, booking_id, BookingStatus.COMPLETED,
+            scope={"therapist_id": therapist.id},
+            fields=update_data
+        )
+    except (BookingNotFound, TransitionConflict) as e:
+        raise _transition_error(e)
+    
+    await slot_reservations.release(db, booking_id)
+    schedule_index.booking_released(booking)
+    await calendar_service.booking_released(db, booking)
     
     # Update therapist stats
     await db.therapists.update_one(
-        {"id": therapist["id"]},
+        {"id": therapist.id},
         {"$inc": {"total_bookings": 1}}
     )
     
     logger.info(f"Booking completed: {booking_id}")
-    return {"message": "Booking marked as completed"}
+    return {
+        "message": "Booking marked as completed",
+        "booking": await _booking_response(booking, loaders)
+    }
 
 @router.post("/{booking_id}/review", response_model=Review)
 async def create_review(
@@ -415,29 +412,27 @@ async def create_review(
             detail="Review already exists for this booking"
         )
     
-    # Create review
+    # Create review; who reviews whom comes from the booking, not the body
     review = Review(
-        **review_data.dict(),
-        booking_id=booking_id,
-        client_id=current_user.id,
+        **{
+            **review_data.dict(),
+            "booking_id": booking_id,
+            "client_id": current_user.id,
+            "therapist_id": booking["therapist_id"]
+        },
         is_verified=True
     )
     
-    await db.reviews.insert_one(review.dict())
-    
-    # Update therapist rating
-    therapist_reviews = await db.reviews.find({"therapist_id": review_data.therapist_id}).to_list(length=None)
-    if therapist_reviews:
-        avg_rating = sum(r["rating"] for r in therapist_reviews) / len(therapist_reviews)
-        await db.therapists.update_one(
-            {"id": review_data.therapist_id},
-            {
-                "$set": {
-                    "rating": round(avg_rating, 1),
-                    "reviews_count": len(therapist_reviews)
-                }
-            }
+    try:
+        await db.reviews.insert_one(review.dict())
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Review already exists for this booking"
         )
     
+    # Update therapist rating from running totals
+    await rating_aggregator.add_review(db, review.therapist_id, review.rating)
+    
     logger.info(f"Review created for booking: {booking_id}")
     return review
\ No newline at end of file
@@ -1,19 +1,28 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
 import stripe
+import asyncio
 import os
 from datetime import datetime
 from ..database import get_database
-from ..models import PaymentIntent, PaymentResponse, User, BookingStatus, PaymentStatus
-from ..auth import get_current_active_user
+from ..models import (
+    PaymentIntent, PaymentResponse, User, BookingStatus, PaymentStatus,
+    BulkRefundRequest, BulkRefundResult, BulkRefundResponse
+)
+from ..auth import get_current_active_user, get_current_admin
+from ..services.scheduling import day_bounds
+from ..services.booking_state import booking_state, ALLOWED_TRANSITIONS, BookingNotFound, TransitionConflict
+from ..services.payment_service import payment_service, PaymentInProgress
+from ..services.payment_events import payment_event_processor
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/payments", tags=["payments"])
 
-# Configure Stripe
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
-webhook_secret = os.getenv("STRIPE_WEBHOOK_SECRET")
+# Stripe refunds in flight per bulk request, and bookings per request
+BULK_REFUND_CONCURRENCY = int(os.getenv('BULK_REFUND_CONCURRENCY', 8))
+BULK_REFUND_MAX_BOOKINGS = int(os.getenv('BULK_REFUND_MAX_BOOKINGS', 500))
 
 @router.post("/create-payment-intent", response_model=PaymentResponse)
 async def create_payment_intent(
@@ -40,11 +49,12 @@ async def create_payment_intent(
         )
     
     try:
-        # Create payment intent with Stripe
-        intent = stripe.PaymentIntent.create(
-            amount=int(payment_data.amount * 100),  # Convert to cents
-            currency=payment_data.currency,
-            automatic_payment_methods={"enabled": True},
+        # Reuse the booking's open payment intent; create one only if needed
+        intent_id, client_secret = await payment_service.checkout_intent(
+            payment_data.booking_id,
+            booking.get("stripe_payment_intent_id"),
+            int(round(payment_data.amount * 100)),  # Convert to cents
+            payment_data.currency,
             metadata={
                 "booking_id": payment_data.booking_id,
                 "client_id": current_user.id,
@@ -53,23 +63,28 @@ async def create_payment_intent(
         )
         
         # Update booking with payment intent ID
-        await db.bookings.update_one(
-            {"id": payment_data.booking_id},
-            {
-                "$set": {
-                    "stripe_payment_intent_id": intent.id,
-                    "updated_at": datetime.utcnow()
+        if intent_id != booking.get("stripe_payment_intent_id"):
+            await db.bookings.update_one(
+                {"id": payment_data.booking_id},
+                {
+                    "$set": {
+                        "stripe_payment_intent_id": intent_id,
+                        "updated_at": datetime.utcnow()
+                    }
                 }
-            }
-        )
-        
-        logger.info(f"Payment intent created for booking: {payment_data.booking_id}")
+            )
+            logger.info(f"Payment intent created for booking: {payment_data.booking_id}")
         
         return PaymentResponse(
-            client_secret=intent.client_secret,
-            payment_intent_id=intent.id
+            client_secret=client_secret,
+            payment_intent_id=intent_id
         )
         
+    except PaymentInProgress:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Payment for this booking is already being processed"
+        )
     except stripe.error.StripeError as e:
         logger.error(f"Stripe error: {str(e)}")
         raise HTTPException(
@@ -87,9 +102,7 @@ async def stripe_webhook(
     sig_header = request.headers.get("stripe-signature")
     
     try:
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, webhook_secret
-        )
+        event = payment_service.construct_webhook_event(payload, sig_header)
     except ValueError:
         logger.error("Invalid payload in Stripe webhook")
         raise HTTPException(status_code=400, detail="Invalid payload")
@@ -97,41 +110,8 @@ async def stripe_webhook(
         logger.error("Invalid signature in Stripe webhook")
         raise HTTPException(status_code=400, detail="Invalid signature")
     
-    # Handle the event
-    if event["type"] == "payment_intent.succeeded":
-        payment_intent = event["data"]["object"]
-        booking_id = payment_intent["metadata"]["booking_id"]
-        
-        # Update booking payment status
-        await db.bookings.update_one(
-            {"id": booking_id},
-            {
-                "$set": {
-                    "payment_status": PaymentStatus.PAID,
-                    "status": BookingStatus.CONFIRMED,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-        
-        logger.info(f"Payment succeeded for booking: {booking_id}")
-        
-    elif event["type"] == "payment_intent.payment_failed":
-        payment_intent = event["data"]["object"]
-        booking_id = payment_intent["metadata"]["booking_id"]
-        
-        # Update booking payment status
-        await db.bookings.update_one(
-            {"id": booking_id},
-            {
-                "$set": {
-                    "payment_status": PaymentStatus.FAILED,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-        
-        logger.info(f"Payment failed for booking: {booking_id}")
+    # Acknowledge as soon as the event is logged; workers apply it to the booking
+    await payment_event_processor.record(db, event)
     
     return {"status": "success"}
 
@@ -201,27 +181,29 @@ async def process_refund(
     
     try:
         # Process refund with Stripe
-        refund = stripe.Refund.create(
-            payment_intent=booking["stripe_payment_intent_id"],
-            reason="requested_by_customer",
+        refund = await payment_service.create_refund(
+            booking_id,
+            booking["stripe_payment_intent_id"],
             metadata={
                 "booking_id": booking_id,
                 "reason": reason
             }
         )
+        payment_service.forget_intent(booking["stripe_payment_intent_id"])
         
-        # Update booking status
-        await db.bookings.update_one(
-            {"id": booking_id},
-            {
-                "$set": {
-                    "payment_status": PaymentStatus.REFUNDED,
-                    "status": BookingStatus.CANCELLED,
-                    "cancellation_reason": reason,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
+        # Cancel the booking if it is still upcoming; one completed (or
+        # cancelled) meanwhile keeps its status and is only marked refunded
+        try:
+            await booking_state.transition(
+                db, booking_id, BookingStatus.CANCELLED,
+                fields={"payment_status": PaymentStatus.REFUNDED, "cancellation_reason": reason}
+            )
+        except (BookingNotFound, TransitionConflict):
+            await db.bookings.update_one(
+                {"id": booking_id, "payment_status": PaymentStatus.PAID},
+                {"$set": {"payment_status": PaymentStatus.REFUNDED, "updated_at": datetime.utcnow()}}
+            )
+        await booking_state.release_cancelled(db, [booking_id])
         
         logger.info(f"Refund processed for booking: {booking_id}")
         
@@ -236,4 +218,105 @@ async def process_refund(
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Refund processing error: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.post("/refunds/bulk", response_model=BulkRefundResponse)
+async def process_bulk_refund(
+    refund_data: BulkRefundRequest,
+    current_admin: User = Depends(get_current_admin),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Refund many bookings, e.g. a therapist's cancelled day (Admin only)."""
+    if refund_data.booking_ids:
+        query = {"id": {"$in": refund_data.booking_ids}}
+    elif refund_data.therapist_id and refund_data.date_from:
+        date_to = refund_data.date_to or refund_data.date_from
+        query = {
+            "therapist_id": refund_data.therapist_id,
+            "starts_at": {
+                "$gte": day_bounds(refund_data.date_from)[0],
+                "$lt": day_bounds(date_to)[1]
+            }
+        }
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide booking_ids, or therapist_id with date_from"
+        )
+    
+    bookings = await db.bookings.find(query).to_list(length=BULK_REFUND_MAX_BOOKINGS + 1)
+    if len(bookings) > BULK_REFUND_MAX_BOOKINGS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {BULK_REFUND_MAX_BOOKINGS} bookings can be refunded at once"
+        )
+    
+    results = {}
+    found = {booking["id"] for booking in bookings}
+    for booking_id in refund_data.booking_ids or []:
+        if booking_id not in found:
+            results[booking_id] = BulkRefundResult(booking_id=booking_id, status="skipped", detail="Booking not found")
+    
+    semaphore = asyncio.Semaphore(BULK_REFUND_CONCURRENCY)
+    
+    async def refund_booking(booking: dict) -> BulkRefundResult:
+        if booking["payment_status"] != PaymentStatus.PAID:
+            return BulkRefundResult(booking_id=booking["id"], status="skipped", detail="Booking is not paid")
+        if not booking.get("stripe_payment_intent_id"):
+            return BulkRefundResult(
+                booking_id=booking["id"], status="skipped", detail="No payment intent found for this booking"
+            )
+        try:
+            # Same idempotency key as the single refund endpoint: a retried
+            # or overlapping request never refunds a booking twice
+            async with semaphore:
+                refund = await payment_service.create_refund(
+                    booking["id"],
+                    booking["stripe_payment_intent_id"],
+                    metadata={"booking_id": booking["id"], "reason": refund_data.reason}
+                )
+        except stripe.error.StripeError as e:
+            logger.error(f"Stripe refund error for booking {booking['id']}: {str(e)}")
+            return BulkRefundResult(booking_id=booking["id"], status="failed", detail=str(e))
+        return BulkRefundResult(
+            booking_id=booking["id"], status="refunded", refund_id=refund.id, amount=refund.amount / 100
+        )
+    
+    for result in await asyncio.gather(*(refund_booking(booking) for booking in bookings)):
+        results[result.booking_id] = result
+    
+    refunded = [booking for booking in bookings if results[booking["id"]].status == "refunded"]
+    if refunded:
+        now = datetime.utcnow()
+        # Per booking, in order: cancel it if its status still allows that,
+        # otherwise only mark the payment refunded
+        operations = []
+        for booking in refunded:
+            operations += [
+                UpdateOne(
+                    {"id": booking["id"], "status": {"$in": ALLOWED_TRANSITIONS[BookingStatus.CANCELLED]}},
+                    {"$set": {
+                        "payment_status": PaymentStatus.REFUNDED,
+                        "status": BookingStatus.CANCELLED,
+                        "cancellation_reason": refund_data.reason,
+                        "updated_at": now
+                    }}
+                ),
+                UpdateOne(
+                    {"id": booking["id"], "payment_status": PaymentStatus.PAID},
+                    {"$set": {"payment_status": PaymentStatus.REFUNDED, "updated_at": now}}
+                )
+            ]
+            payment_service.forget_intent(booking["stripe_payment_intent_id"])
+        await db.bookings.bulk_write(operations, ordered=True)
+        await booking_state.release_cancelled(db, [booking["id"] for booking in refunded])
+    
+    counts = {"refunded": 0, "skipped": 0, "failed": 0}
+    for result in results.values():
+        counts[result.status] += 1
+    logger.info(
+        f"Bulk refund by {current_admin.id}: {counts['refunded']} refunded, "
+        f"{counts['skipped']} skipped, {counts['failed']} failed"
+    )
+    
+    return BulkRefundResponse(**counts, results=list(results.values()))
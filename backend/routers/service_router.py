@@ -4,6 +4,7 @@ from typing import List, Optional
 from ..database import get_database
 from ..models import Service, ServiceCreate, User
 from ..auth import get_current_admin
+from ..services.snapshot_reconciler import snapshot_reconciler
 import logging
 
 logger = logging.getLogger(__name__)
@@ -85,6 +86,11 @@ async def update_service(
         
         # Get updated service
         updated_service = await db.services.find_one({"id": service_id})
+        if (updated_service["name"] != service["name"] or
+                updated_service["category"] != service["category"]):
+            snapshot_reconciler.service_changed(
+                service_id, updated_service["name"], updated_service["category"]
+            )
         logger.info(f"Service updated: {service_id}")
         return Service(**updated_service)
     
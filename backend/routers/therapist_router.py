@@ -5,10 +5,20 @@ from datetime import datetime, timedelta
 from ..database import get_database
 from ..models import (
     TherapistApplication, TherapistPublic, TherapistSearch,
-    User, UserRole, Therapist, TherapistCreate
+    User, UserRole, Therapist, TherapistCreate, WorkingHours
 )
-from ..auth import get_current_active_user, get_current_admin
-from ..services.email_service import email_service
+from ..auth import (
+    get_current_active_user, get_current_admin, get_current_therapist,
+    get_current_therapist_profile, invalidate_therapist_profile
+)
+from ..loaders import Loaders, get_loaders
+from ..services.availability import (
+    availability_search, bit_matrix, bookable_starts, working_starts, THERAPIST_PROJECTION
+)
+from ..services.calendars import calendar_service, validate_working_hours
+from ..services.scheduling import storage_date
+from ..services.slot_reservations import BOOKING_SLOT_MINUTES
+from ..services.outbox import notification_outbox
 import logging
 
 logger = logging.getLogger(__name__)
@@ -31,11 +41,18 @@ async def submit_therapist_application(
     # Save application
     await db.therapist_applications.insert_one(application.dict())
     
-    # Send confirmation email
-    await email_service.send_application_received(
-        application.email,
-        application.full_name
-    )
+    # Queue confirmation email
+    try:
+        await notification_outbox.enqueue(db, [
+            notification_outbox.message(
+                "email.application_received",
+                application.id,
+                applicant_email=application.email,
+                applicant_name=application.full_name
+            )
+        ])
+    except Exception as e:
+        logger.error(f"Failed to queue application email for {application.email}: {str(e)}")
     
     logger.info(f"New therapist application submitted: {application.email}")
     return {"message": "Application submitted successfully", "application_id": application.id}
@@ -48,6 +65,7 @@ async def get_therapists(
     max_price: Optional[float] = Query(None),
     limit: int = Query(20, le=100),
     skip: int = Query(0),
+    loaders: Loaders = Depends(get_loaders),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get list of active therapists with filtering."""
@@ -70,10 +88,12 @@ async def get_therapists(
     therapists_cursor = db.therapists.find(query).skip(skip).limit(limit).sort("rating", -1)
     therapists = await therapists_cursor.to_list(length=limit)
     
-    # Get user details for each therapist
+    # Get user details for all therapists in one batch
+    users = await loaders.users.load_many(therapist["user_id"] for therapist in therapists)
+    
     result = []
     for therapist in therapists:
-        user_data = await db.users.find_one({"id": therapist["user_id"]})
+        user_data = users.get(therapist["user_id"])
         if user_data:
             therapist_public = TherapistPublic(
                 **therapist,
@@ -83,6 +103,101 @@ async def get_therapists(
     
     return result
 
+@router.get("/availability/search")
+async def search_availability(
+    date: str,  # YYYY-MM-DD format, first day searched
+    days: int = Query(1, ge=1, le=14),
+    time: Optional[str] = Query(None),  # HH:MM; omit for every bookable start
+    duration_minutes: int = Query(60, ge=15, le=480),
+    step_minutes: int = Query(60, ge=15, le=240),
+    city: Optional[str] = Query(None),
+    specialty: Optional[str] = Query(None),
+    min_rating: Optional[float] = Query(None),
+    max_price: Optional[float] = Query(None),
+    limit: int = Query(20, le=100),
+    loaders: Loaders = Depends(get_loaders),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Find therapists free for a session on one or more days, best rated first."""
+    try:
+        start_date = datetime.strptime(date, "%Y-%m-%d").date()
+        at = None
+        if time:
+            parsed = datetime.strptime(time, "%H:%M")
+            at = parsed.hour * 60 + parsed.minute
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid date or time format. Use YYYY-MM-DD and HH:MM"
+        )
+    
+    # Bookings start on the slot grid; other times could never match
+    if (at is not None and at % BOOKING_SLOT_MINUTES) or step_minutes % BOOKING_SLOT_MINUTES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"time and step_minutes must be multiples of {BOOKING_SLOT_MINUTES} minutes"
+        )
+    
+    # Same filters as the therapist list
+    query = {"status": "approved", "is_available": True}
+    if city:
+        query["service_areas"] = {"$regex": city, "$options": "i"}
+    if specialty:
+        query["specialties"] = {"$regex": specialty, "$options": "i"}
+    if min_rating:
+        query["rating"] = {"$gte": min_rating}
+    if max_price:
+        query["hourly_rate"] = {"$lte": max_price}
+    
+    result = await availability_search.search(
+        db, query, start_date, days, duration_minutes,
+        at=at, step_minutes=step_minutes, limit=limit
+    )
+    
+    # Names for the returned page only
+    users = await loaders.users.load_many(match["therapist"]["user_id"] for match in result["matches"])
+    for match in result["matches"]:
+        user_data = users.get(match["therapist"]["user_id"])
+        match["therapist"]["full_name"] = user_data["full_name"] if user_data else None
+    
+    return {
+        "date": date,
+        "days": days,
+        "time": time,
+        "duration_minutes": duration_minutes,
+        **result
+    }
+
+@router.put("/me/working-hours")
+async def update_working_hours(
+    working_hours: WorkingHours,
+    current_therapist: User = Depends(get_current_therapist),
+    therapist: Therapist = Depends(get_current_therapist_profile),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Replace the current therapist's weekly working hours and date exceptions."""
+    document = working_hours.dict()
+    try:
+        validate_working_hours(document)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    await db.therapists.update_one(
+        {"id": therapist.id},
+        {
+            "$set": {"working_hours": document, "updated_at": datetime.utcnow()},
+            "$inc": {"working_hours_version": 1}
+        }
+    )
+    # Existing bookings stay; calendars compile the new version's open slots
+    # on their next read
+    invalidate_therapist_profile(current_therapist.id)
+    
+    return {"message": "Working hours updated", "working_hours": document}
+
 @router.get("/{therapist_id}", response_model=TherapistPublic)
 async def get_therapist(
     therapist_id: str,
@@ -114,6 +229,7 @@ async def get_therapist_reviews(
     therapist_id: str,
     limit: int = Query(10, le=50),
     skip: int = Query(0),
+    loaders: Loaders = Depends(get_loaders),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get therapist reviews."""
@@ -123,10 +239,12 @@ async def get_therapist_reviews(
     
     reviews = await reviews_cursor.to_list(length=limit)
     
-    # Get client names for reviews
+    # Get client names for all reviews in one batch
+    clients = await loaders.users.load_many(review["client_id"] for review in reviews)
+    
     result = []
     for review in reviews:
-        client_data = await db.users.find_one({"id": review["client_id"]})
+        client_data = clients.get(review["client_id"])
         if client_data:
             review["client_name"] = client_data["full_name"]
             result.append(review)
@@ -137,11 +255,10 @@ async def get_therapist_reviews(
 async def get_therapist_availability(
     therapist_id: str,
     date: str,  # YYYY-MM-DD format
+    duration_minutes: int = Query(60, ge=15, le=480),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Get therapist availability for a specific date."""
-    from datetime import datetime, time
-    
     # Parse date
     try:
         target_date = datetime.strptime(date, "%Y-%m-%d").date()
@@ -152,46 +269,34 @@ async def get_therapist_availability(
         )
     
     # Check if therapist exists
-    therapist = await db.therapists.find_one({"id": therapist_id})
+    therapist = await db.therapists.find_one({"id": therapist_id}, THERAPIST_PROJECTION)
     if not therapist:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Therapist not found"
         )
     
-    # Get existing bookings for the date
-    bookings = await db.bookings.find({
-        "therapist_id": therapist_id,
-        "appointment_date": target_date,
-        "status": {"$in": ["confirmed", "in_progress"]}
-    }).to_list(length=None)
+    # Working hours and booked slots for the date, from the therapist's calendar
+    calendars = await calendar_service.get_days(db, [therapist], [target_date])
+    open_bits, busy_bits = calendars[(therapist_id, storage_date(target_date))]
+    open_row = bit_matrix([open_bits])
+    working = working_starts(open_row, duration_minutes)[0]
+    free = bookable_starts(open_row, bit_matrix([busy_bits]), duration_minutes)[0]
     
-    # Standard working hours (9 AM to 8 PM)
+    # Hourly starts whose session fits in working hours
     available_slots = []
-    for hour in range(9, 20):  # 9 AM to 7 PM (last slot)
-        slot_time = time(hour, 0)
-        
-        # Check if slot is available
-        is_available = True
-        for booking in bookings:
-            booking_time = booking["appointment_time"]
-            duration = booking["duration_minutes"]
-            
-            # Check for time conflicts
-            if (booking_time <= slot_time < 
-                datetime.combine(target_date, booking_time) + 
-                timedelta(minutes=duration)).time():
-                is_available = False
-                break
-        
-        available_slots.append({
-            "time": slot_time.strftime("%H:%M"),
-            "available": is_available
-        })
+    for hour in range(24):
+        slot = hour * 60 // BOOKING_SLOT_MINUTES
+        if working[slot]:
+            available_slots.append({
+                "time": f"{hour:02d}:00",
+                "available": bool(free[slot])
+            })
     
     return {
         "date": date,
         "therapist_id": therapist_id,
+        "duration_minutes": duration_minutes,
         "available_slots": available_slots
     }
 
@@ -234,7 +339,7 @@ async def approve_therapist_application(
     import secrets
     
     temp_password = secrets.token_urlsafe(12)
-    hashed_password = get_password_hash(temp_password)
+    hashed_password = await get_password_hash(temp_password)
     
     user = User(
         email=application["email"],
@@ -1,7 +1,7 @@
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, Depends
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorDatabase
 import os
 import logging
 from pathlib import Path
@@ -10,8 +10,20 @@ from typing import List
 import uuid
 from datetime import datetime
 
+# Load settings before the modules below read them at import time
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
 # Import database functions
-from .database import startup_db_client, shutdown_db_client
+from .database import startup_db_client, shutdown_db_client, get_database
+from .monitoring import DbMetricsMiddleware
+from .services.password_service import password_service
+from .services.snapshot_reconciler import snapshot_reconciler
+from .services.outbox import notification_outbox
+from .services.email_service import email_service
+from .services.sms_service import sms_service
+from .services.payment_service import payment_service
+from .services.payment_events import payment_event_processor
 
 # Import routers
 from .routers.auth_router import router as auth_router
@@ -22,14 +34,6 @@ from .routers.service_router import router as service_router
 from .routers.admin_router import router as admin_router
 
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
-
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 # Create the main app without a prefix
 app = FastAPI(
     title="Ecstasy Retreat API",
@@ -65,14 +69,17 @@ async def health_check():
     }
 
 @api_router.post("/status", response_model=StatusCheck)
-async def create_status_check(input: StatusCheckCreate):
+async def create_status_check(
+    input: StatusCheckCreate,
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
     status_dict = input.dict()
     status_obj = StatusCheck(**status_dict)
     _ = await db.status_checks.insert_one(status_obj.dict())
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
+async def get_status_checks(db: AsyncIOMotorDatabase = Depends(get_database)):
     status_checks = await db.status_checks.find().to_list(1000)
     return [StatusCheck(**status_check) for status_check in status_checks]
 
@@ -87,6 +94,8 @@ api_router.include_router(admin_router)
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(DbMetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -107,10 +116,20 @@ logger = logging.getLogger(__name__)
 async def startup_event():
     """Initialize the database connection and default data."""
     await startup_db_client()
+    snapshot_reconciler.start()
+    notification_outbox.start()
+    payment_event_processor.start()
     logger.info("Ecstasy Retreat API started successfully")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Close database connection."""
+    await notification_outbox.stop()
+    await payment_event_processor.stop()
+    await email_service.close()
+    await sms_service.close()
+    await payment_service.close()
+    await snapshot_reconciler.stop()
     await shutdown_db_client()
+    password_service.shutdown()
     logger.info("Ecstasy Retreat API shutdown completed")
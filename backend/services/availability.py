@@ -0,0 +1,129 @@
+import os
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from .calendars import calendar_service, SLOTS_PER_DAY, WORD_BITS, WORD_COUNT, WORD_MASK
+from .scheduling import BOOKING_TRAVEL_BUFFER_MINUTES, storage_date
+from .slot_reservations import BOOKING_SLOT_MINUTES
+
+# Therapists considered per search, best rated first
+AVAILABILITY_SEARCH_MAX_THERAPISTS = int(os.getenv("AVAILABILITY_SEARCH_MAX_THERAPISTS", 5000))
+
+THERAPIST_PROJECTION = {
+    "_id": 0, "id": 1, "user_id": 1, "rating": 1, "reviews_count": 1,
+    "hourly_rate": 1, "specialties": 1, "service_areas": 1, "profile_image": 1,
+    "working_hours": 1, "working_hours_version": 1
+}
+
+def bit_matrix(masks: List[int]) -> np.ndarray:
+    """Boolean (row, slot) matrix from per-row slot bitmaps."""
+    words = np.array(
+        [[(mask >> (index * WORD_BITS)) & WORD_MASK for index in range(WORD_COUNT)] for mask in masks],
+        dtype=np.int64
+    ).reshape(len(masks), WORD_COUNT)
+    bits = (words[:, :, None] >> np.arange(WORD_BITS, dtype=np.int64)) & 1
+    return bits.reshape(len(masks), WORD_COUNT * WORD_BITS)[:, :SLOTS_PER_DAY].astype(bool)
+
+def free_starts(blocked: np.ndarray, slots: int) -> np.ndarray:
+    """Boolean (row, slot) matrix: is [k, k + slots) clear of blocked slots?"""
+    counts = np.zeros((blocked.shape[0], SLOTS_PER_DAY + 1), dtype=np.int32)
+    np.cumsum(blocked, axis=1, out=counts[:, 1:])
+    free = np.zeros_like(blocked)
+    # Blocked slots in [k, k + slots) is counts[k + slots] - counts[k]
+    free[:, :SLOTS_PER_DAY - slots + 1] = (counts[:, slots:] - counts[:, :-slots]) == 0
+    return free
+
+def working_starts(open_bits: np.ndarray, duration_minutes: int) -> np.ndarray:
+    """Start slots where a session lies entirely inside working hours."""
+    return free_starts(~open_bits, -(-duration_minutes // BOOKING_SLOT_MINUTES))
+
+def bookable_starts(open_bits: np.ndarray, busy_bits: np.ndarray, duration_minutes: int,
+                    buffer: int = BOOKING_TRAVEL_BUFFER_MINUTES) -> np.ndarray:
+    """Start slots where a session fits in working hours and its reservation is free.
+
+    A booking reserves its session plus travel buffer (see
+    SlotReservationService), so that whole span must be clear of busy slots;
+    only the session itself must be inside working hours.
+    """
+    reserved = -(-(duration_minutes + buffer) // BOOKING_SLOT_MINUTES)
+    return working_starts(open_bits, duration_minutes) & free_starts(busy_bits, reserved)
+
+def slot_time(slot: int) -> str:
+    minutes = int(slot) * BOOKING_SLOT_MINUTES
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+class AvailabilitySearch:
+    """Finds therapists free for a session across many therapists and days."""
+
+    # One query loads the candidate therapists and one loads their calendar
+    # days (see CalendarService), so no bookings are scanned. Each
+    # (therapist, day) becomes a row of a slot matrix, and sliding-window sums
+    # over it answer "can a session start here?" for every row at once.
+
+    async def search(
+        self,
+        db: AsyncIOMotorDatabase,
+        therapist_query: dict,
+        start_date: date,
+        days: int,
+        duration_minutes: int,
+        at: Optional[int] = None,
+        step_minutes: int = 60,
+        limit: int = 20
+    ) -> dict:
+        """Ranked therapists with their free start times per day.
+
+        at restricts results to one start time (minutes after midnight).
+        at and step_minutes must be multiples of BOOKING_SLOT_MINUTES.
+        """
+        therapists = await db.therapists.find(therapist_query, THERAPIST_PROJECTION).sort(
+            [("rating", -1), ("reviews_count", -1)]
+        ).limit(AVAILABILITY_SEARCH_MAX_THERAPISTS).to_list(length=AVAILABILITY_SEARCH_MAX_THERAPISTS)
+        if not therapists:
+            return {"searched": 0, "truncated": False, "total_matches": 0, "matches": []}
+
+        dates = [start_date + timedelta(days=offset) for offset in range(days)]
+        calendars = await calendar_service.get_days(db, therapists, dates)
+        keys = [(therapist["id"], storage_date(day)) for therapist in therapists for day in dates]
+        open_bits = bit_matrix([calendars[key][0] for key in keys])
+        busy_bits = bit_matrix([calendars[key][1] for key in keys])
+        free = bookable_starts(open_bits, busy_bits, duration_minutes)
+
+        # Keep only the requested start time, or starts on the step grid
+        candidates = np.zeros(SLOTS_PER_DAY, dtype=bool)
+        if at is not None:
+            candidates[at // BOOKING_SLOT_MINUTES] = True
+        else:
+            candidates[0:SLOTS_PER_DAY:step_minutes // BOOKING_SLOT_MINUTES] = True
+        free &= candidates
+
+        # (therapist, day, slot) view; therapists with any free start, best
+        # rated first, earliest availability breaking ties
+        free = free.reshape(len(therapists), days, SLOTS_PER_DAY)
+        has_free = free.any(axis=(1, 2))
+        earliest = np.argmax(free.reshape(len(therapists), -1), axis=1)
+        ratings = np.array([therapist.get("rating", 0.0) for therapist in therapists])
+        reviews = np.array([therapist.get("reviews_count", 0) for therapist in therapists])
+        order = np.lexsort((earliest, -reviews, -ratings))
+        matched = [index for index in order if has_free[index]]
+
+        matches = []
+        for index in matched[:limit]:
+            available: List[Dict] = []
+            for offset, day in enumerate(dates):
+                slots = np.flatnonzero(free[index, offset])
+                if slots.size:
+                    available.append({"date": day.isoformat(), "times": [slot_time(slot) for slot in slots]})
+            therapist = {key: value for key, value in therapists[index].items() if key != "working_hours_version"}
+            matches.append({"therapist": therapist, "available": available})
+
+        return {
+            "searched": len(therapists),
+            "truncated": len(therapists) == AVAILABILITY_SEARCH_MAX_THERAPISTS,
+            "total_matches": len(matched),
+            "matches": matches
+        }
+
+# Global availability search instance
+availability_search = AvailabilitySearch()
@@ -0,0 +1,93 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from ..models import BookingStatus
+from .calendars import calendar_service
+from .scheduling import schedule_index
+
+# Statuses each target status may be reached from
+ALLOWED_TRANSITIONS: Dict[BookingStatus, List[BookingStatus]] = {
+    BookingStatus.CONFIRMED: [BookingStatus.PENDING],
+    BookingStatus.IN_PROGRESS: [BookingStatus.CONFIRMED],
+    BookingStatus.COMPLETED: [BookingStatus.CONFIRMED, BookingStatus.IN_PROGRESS],
+    BookingStatus.CANCELLED: [BookingStatus.PENDING, BookingStatus.CONFIRMED, BookingStatus.IN_PROGRESS],
+}
+
+class BookingNotFound(Exception):
+    """No booking with this id is visible to the caller."""
+
+class TransitionConflict(Exception):
+    """The booking's current status does not allow the requested transition."""
+
+    def __init__(self, booking_id: str, current: str, target: BookingStatus):
+        self.booking_id = booking_id
+        self.current = current
+        self.target = target
+        allowed = ", ".join(status.value for status in ALLOWED_TRANSITIONS[target])
+        super().__init__(
+            f"Booking is {current} and cannot become {target.value} (allowed from: {allowed})"
+        )
+
+class BookingStateMachine:
+    """Applies booking status changes as single conditional writes."""
+
+    # The allowed source statuses are part of the update filter, so checking
+    # and writing is one round trip and concurrent transitions cannot both
+    # win: the loser matches nothing. Only then is the booking read again to
+    # tell a missing booking from a conflicting status.
+
+    async def transition(
+        self,
+        db: AsyncIOMotorDatabase,
+        booking_id: str,
+        target: BookingStatus,
+        scope: Optional[dict] = None,
+        fields: Optional[dict] = None
+    ) -> dict:
+        """Move a booking to target and return the updated document.
+
+        scope narrows which bookings the caller may change (e.g. by
+        therapist_id); fields are set alongside the new status.
+        """
+        query = {"id": booking_id, **(scope or {})}
+        now = datetime.utcnow()
+        booking = await db.bookings.find_one_and_update(
+            {**query, "status": {"$in": ALLOWED_TRANSITIONS[target]}},
+            {"$set": {**(fields or {}), "status": target, "updated_at": now}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if booking is not None:
+            return booking
+
+        current = await db.bookings.find_one(query, {"_id": 0, "status": 1})
+        if current is None:
+            raise BookingNotFound(booking_id)
+        raise TransitionConflict(booking_id, current["status"], target)
+
+    async def release_cancelled(self, db: AsyncIOMotorDatabase, booking_ids: List[str]) -> List[dict]:
+        """Free the slots, cached schedules and calendar bits of cancelled bookings.
+
+        For writers that cancel with their own conditional update (refunds,
+        payment events). Only bookings still holding slot reservations are
+        released, so a repeated call never frees time another booking has
+        taken since.
+        """
+        if not booking_ids:
+            return []
+        holding = await db.slot_reservations.distinct("booking_id", {"booking_id": {"$in": booking_ids}})
+        if not holding:
+            return []
+        bookings = await db.bookings.find(
+            {"id": {"$in": holding}, "status": BookingStatus.CANCELLED}, {"_id": 0}
+        ).to_list(length=None)
+        if bookings:
+            await db.slot_reservations.delete_many({"booking_id": {"$in": [booking["id"] for booking in bookings]}})
+            for booking in bookings:
+                schedule_index.booking_released(booking)
+                await calendar_service.booking_released(db, booking)
+        return bookings
+
+# Global booking state machine instance
+booking_state = BookingStateMachine()
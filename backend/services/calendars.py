@@ -0,0 +1,235 @@
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from ..cache import TTLCache
+from .scheduling import BLOCKING_STATUSES, day_bounds, storage_date
+from .slot_reservations import BOOKING_SLOT_MINUTES, slot_reservations
+import logging
+
+logger = logging.getLogger(__name__)
+
+SLOTS_PER_DAY = 24 * 60 // BOOKING_SLOT_MINUTES
+# Bitmaps are stored as 48-bit words: well inside a signed 64-bit BSON long
+WORD_BITS = 48
+WORD_MASK = (1 << WORD_BITS) - 1
+WORD_COUNT = -(-SLOTS_PER_DAY // WORD_BITS)
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# Hours used for therapists without a template, as "HH:MM-HH:MM[,HH:MM-HH:MM]"
+DEFAULT_WORKING_HOURS = os.getenv("DEFAULT_WORKING_HOURS", "09:00-20:00")
+
+def _minutes(value: str) -> int:
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+def window_mask(start: str, end: str) -> int:
+    """Bits of the slots fully inside [start, end)."""
+    first = -(-_minutes(start) // BOOKING_SLOT_MINUTES)
+    last = min(_minutes(end) // BOOKING_SLOT_MINUTES, SLOTS_PER_DAY)
+    if last <= first:
+        raise ValueError(f"Working window {start}-{end} is empty")
+    return ((1 << (last - first)) - 1) << first
+
+def split_words(mask: int) -> Dict[str, int]:
+    return {f"w{index}": (mask >> (index * WORD_BITS)) & WORD_MASK for index in range(WORD_COUNT)}
+
+def join_words(words: Optional[dict]) -> int:
+    if not words:
+        return 0
+    return sum(words.get(f"w{index}", 0) << (index * WORD_BITS) for index in range(WORD_COUNT))
+
+DEFAULT_WINDOWS = [
+    {"start": window.split("-")[0], "end": window.split("-")[1]}
+    for window in DEFAULT_WORKING_HOURS.split(",")
+]
+
+def windows_mask(windows: List[dict]) -> int:
+    mask = 0
+    for window in windows:
+        mask |= window_mask(window["start"], window["end"])
+    return mask
+
+def open_mask(working_hours: Optional[dict], day: date) -> int:
+    """Bits of the slots a therapist works on a day, from template and exceptions."""
+    if working_hours is None:
+        return windows_mask(DEFAULT_WINDOWS)
+    exceptions = working_hours.get("exceptions") or {}
+    if day.isoformat() in exceptions:
+        return windows_mask(exceptions[day.isoformat()])
+    return windows_mask((working_hours.get("weekly") or {}).get(WEEKDAYS[day.weekday()], []))
+
+def within_working_hours(working_hours: Optional[dict], day: date, start: int, end: int) -> bool:
+    """Does [start, end) (minutes) fall inside the day's working hours?"""
+    first = start // BOOKING_SLOT_MINUTES
+    last = -(-end // BOOKING_SLOT_MINUTES)
+    needed = ((1 << (last - first)) - 1) << first
+    return open_mask(working_hours, day) & needed == needed
+
+def validate_working_hours(working_hours: dict):
+    """Raise ValueError for unknown weekdays, bad dates or empty windows."""
+    for weekday, windows in (working_hours.get("weekly") or {}).items():
+        if weekday not in WEEKDAYS:
+            raise ValueError(f"Unknown weekday: {weekday}")
+        for window in windows:
+            window_mask(window["start"], window["end"])
+    for day, windows in (working_hours.get("exceptions") or {}).items():
+        date.fromisoformat(day)
+        for window in windows:
+            window_mask(window["start"], window["end"])
+
+BOOKING_PROJECTION = {"_id": 0, "id": 1, "therapist_id": 1, "starts_at": 1, "timezone": 1, "duration_minutes": 1}
+
+class CalendarService:
+    """Per-therapist, per-day slot bitmaps in the therapist_calendars collection."""
+
+    # busy mirrors slot_reservations: bit n is set while a booking holds slot
+    # n (its session plus travel buffer). Reserved slots never overlap, so a
+    # booking's bits are set and cleared with $bit or/and without touching
+    # any other booking's. open is not stored: reads compile it from the
+    # therapist's working hours, whose per-weekday masks are cached in process
+    # by (therapist id, working_hours_version), so an edit is seen on the
+    # next read without any calendar writes.
+
+    def __init__(self):
+        self.templates = TTLCache(
+            maxsize=int(os.getenv("CALENDAR_TEMPLATE_CACHE_SIZE", 10000)),
+            ttl=float(os.getenv("CALENDAR_TEMPLATE_CACHE_TTL_SECONDS", 600))
+        )
+
+    def open_bits(self, therapist: dict, day: date) -> int:
+        """Open slots of a therapist on a day; therapist needs working_hours(_version)."""
+        key = (therapist["id"], therapist.get("working_hours_version", 0))
+        template = self.templates.get(key)
+        if template is None:
+            working_hours = therapist.get("working_hours")
+            if working_hours is None:
+                template = ([windows_mask(DEFAULT_WINDOWS)] * len(WEEKDAYS), {})
+            else:
+                weekly = working_hours.get("weekly") or {}
+                template = (
+                    [windows_mask(weekly.get(weekday, [])) for weekday in WEEKDAYS],
+                    {day: windows_mask(windows) for day, windows in (working_hours.get("exceptions") or {}).items()}
+                )
+            self.templates.set(key, template)
+        weekly_masks, exceptions = template
+        return exceptions.get(day.isoformat(), weekly_masks[day.weekday()])
+
+    def _booking_masks(self, booking: dict) -> Dict[datetime, int]:
+        masks: Dict[datetime, int] = {}
+        for slot in slot_reservations.slots_for(booking):
+            masks[slot["date"]] = masks.get(slot["date"], 0) | (1 << slot["slot"])
+        return masks
+
+    async def _apply(self, db: AsyncIOMotorDatabase, booking: dict, reserve: bool):
+        operations = []
+        for day, mask in self._booking_masks(booking).items():
+            words = split_words(mask)
+            bits = {
+                f"busy.{word}": {"or": value} if reserve else {"and": WORD_MASK & ~value}
+                for word, value in words.items() if value
+            }
+            operations.append(UpdateOne(
+                {"therapist_id": booking["therapist_id"], "date": day},
+                {"$bit": bits, "$set": {"updated_at": datetime.utcnow()}},
+                upsert=True
+            ))
+        error = None
+        for _ in range(2):
+            try:
+                await db.therapist_calendars.bulk_write(operations, ordered=False)
+                return
+            except BulkWriteError as e:
+                # Two upserts created the same day at once; the retry updates it
+                error = e
+            except Exception as e:
+                error = e
+                break
+        # tools/rebuild_calendars.py repairs drift from the bookings
+        logger.error(f"Failed to update calendar for booking {booking['id']}: {str(error)}")
+
+    async def booking_reserved(self, db: AsyncIOMotorDatabase, booking: dict):
+        """Mark a new booking's slots busy."""
+        await self._apply(db, booking, reserve=True)
+
+    async def booking_released(self, db: AsyncIOMotorDatabase, booking: dict):
+        """Free the slots of a cancelled, completed or refunded booking."""
+        await self._apply(db, booking, reserve=False)
+
+    async def get_days(
+        self,
+        db: AsyncIOMotorDatabase,
+        therapists: List[dict],
+        days: List[date]
+    ) -> Dict[Tuple[str, datetime], Tuple[int, int]]:
+        """(open, busy) bitmaps per (therapist_id, day), in one indexed fetch.
+
+        therapists need id, working_hours and working_hours_version. Nothing
+        is written: days without a calendar document have no busy slots.
+        """
+        by_id = {therapist["id"]: therapist for therapist in therapists}
+        storage_days = [storage_date(day) for day in days]
+        busy = {}
+        async for calendar in db.therapist_calendars.find(
+            {"therapist_id": {"$in": list(by_id)}, "date": {"$in": storage_days}},
+            {"_id": 0, "therapist_id": 1, "date": 1, "busy": 1}
+        ):
+            busy[(calendar["therapist_id"], calendar["date"])] = join_words(calendar.get("busy"))
+
+        return {
+            (therapist_id, storage_day): (self.open_bits(therapist, day), busy.get((therapist_id, storage_day), 0))
+            for therapist_id, therapist in by_id.items()
+            for day, storage_day in zip(days, storage_days)
+        }
+
+    async def rebuild(
+        self,
+        db: AsyncIOMotorDatabase,
+        since: date,
+        therapist_ids: Optional[Iterable[str]] = None
+    ) -> dict:
+        """Recompute busy bitmaps from blocking bookings from a day on.
+
+        Pending, confirmed and in-progress bookings are streamed once and
+        their reserved slots (see SlotReservationService.slots_for) folded
+        into per-day masks, so slot_reservations need not be complete.
+        Calendars in the range are replaced with one bulk_write.
+        """
+        first_day = storage_date(since)
+        therapist_ids = list(therapist_ids or [])
+        # A booking late the evening before can hold slots past midnight
+        query = {"status": {"$in": BLOCKING_STATUSES}, "starts_at": {"$gte": day_bounds(since)[0] - timedelta(days=1)}}
+        if therapist_ids:
+            query["therapist_id"] = {"$in": therapist_ids}
+
+        masks: Dict[Tuple[str, datetime], int] = {}
+        bookings = 0
+        async for booking in db.bookings.find(query, BOOKING_PROJECTION):
+            bookings += 1
+            for day, mask in self._booking_masks(booking).items():
+                if day >= first_day:
+                    key = (booking["therapist_id"], day)
+                    masks[key] = masks.get(key, 0) | mask
+
+        match = {"date": {"$gte": first_day}}
+        if therapist_ids:
+            match["therapist_id"] = {"$in": therapist_ids}
+        cleared = await db.therapist_calendars.delete_many(match)
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {"therapist_id": therapist_id, "date": day},
+                {"$set": {"busy": split_words(mask), "updated_at": now}},
+                upsert=True
+            )
+            for (therapist_id, day), mask in masks.items()
+        ]
+        if operations:
+            await db.therapist_calendars.bulk_write(operations, ordered=False)
+        return {"bookings": bookings, "calendars_cleared": cleared.deleted_count, "calendars_written": len(operations)}
+
+# Global calendar service instance
+calendar_service = CalendarService()
@@ -1,16 +1,43 @@
 import os
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+import asyncio
 from typing import List, Optional
+import httpx
+from .http_client import create_http_client
 import logging
 
 logger = logging.getLogger(__name__)
 
 class EmailService:
-    def __init__(self):
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
         self.api_key = os.getenv('SENDGRID_API_KEY')
         self.from_email = os.getenv('FROM_EMAIL', 'noreply@ecstasyretreat.com')
-        self.sg = SendGridAPIClient(api_key=self.api_key) if self.api_key else None
+        # Point at a local stub (see tools/notification_stub.py) to run without network
+        self.base_url = os.getenv('SENDGRID_API_BASE_URL', 'https://api.sendgrid.com')
+        self.max_concurrency = int(os.getenv('EMAIL_MAX_CONCURRENCY', 10))
+        self.transport = transport
+        self.client: Optional[httpx.AsyncClient] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+    
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        if self.client is None:
+            self.client = create_http_client(
+                self.base_url,
+                "SENDGRID",
+                transport=self.transport,
+                headers={"Authorization": f"Bearer {self.api_key}"}
+            )
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.client
+    
+    async def close(self):
+        """Close pooled connections."""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
         
     async def send_email(
         self,
@@ -19,26 +46,36 @@ class EmailService:
         html_content: str,
         plain_content: Optional[str] = None
     ) -> bool:
-        """Send email using SendGrid."""
-        if not self.sg:
+        """Send email using the SendGrid v3 API."""
+        if not self.configured:
             logger.warning("SendGrid API key not configured, email not sent")
             return False
+        
+        content = [{"type": "text/html", "value": html_content}]
+        if plain_content:
+            # SendGrid requires text/plain to come first
+            content.insert(0, {"type": "text/plain", "value": plain_content})
+        message = {
+            "personalizations": [{"to": [{"email": email} for email in to_emails]}],
+            "from": {"email": self.from_email},
+            "subject": subject,
+            "content": content
+        }
             
         try:
-            message = Mail(
-                from_email=self.from_email,
-                to_emails=to_emails,
-                subject=subject,
-                html_content=html_content,
-                plain_text_content=plain_content
-            )
+            client = self._get_client()
+            async with self.semaphore:
+                response = await client.post("/v3/mail/send", json=message)
+            
+            if response.status_code >= 400:
+                logger.error(f"Failed to send email: SendGrid returned {response.status_code}: {response.text[:200]}")
+                return False
             
-            response = self.sg.send(message)
             logger.info(f"Email sent successfully. Status code: {response.status_code}")
             return True
             
-        except Exception as e:
-            logger.error(f"Failed to send email: {str(e)}")
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to send email: {e.__class__.__name__}: {str(e)}")
             return False
     
     async def send_booking_confirmation(
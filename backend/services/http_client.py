@@ -0,0 +1,28 @@
+import os
+from typing import Optional
+import httpx
+
+def create_http_client(
+    base_url: str,
+    env_prefix: str,
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+    **kwargs
+) -> httpx.AsyncClient:
+    """Pooled keep-alive client for an external provider.
+
+    Timeouts and pool sizes come from <env_prefix>_HTTP_TIMEOUT_SECONDS,
+    <env_prefix>_HTTP_MAX_CONNECTIONS and <env_prefix>_HTTP_MAX_KEEPALIVE.
+    """
+    timeout = float(os.getenv(f"{env_prefix}_HTTP_TIMEOUT_SECONDS", 10))
+    limits = httpx.Limits(
+        max_connections=int(os.getenv(f"{env_prefix}_HTTP_MAX_CONNECTIONS", 20)),
+        max_keepalive_connections=int(os.getenv(f"{env_prefix}_HTTP_MAX_KEEPALIVE", 10)),
+        keepalive_expiry=float(os.getenv(f"{env_prefix}_HTTP_KEEPALIVE_EXPIRY_SECONDS", 30))
+    )
+    return httpx.AsyncClient(
+        base_url=base_url,
+        timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)),
+        limits=limits,
+        transport=transport,
+        **kwargs
+    )
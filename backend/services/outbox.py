@@ -0,0 +1,211 @@
+import asyncio
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from pymongo import ReturnDocument
+from ..database import db
+from .email_service import email_service
+from .sms_service import sms_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+class NotificationOutbox:
+    """Durable notification queue drained by a pool of async workers."""
+
+    # Messages are written to the outbox collection next to the record that
+    # triggered them. Workers claim one message at a time with
+    # find_one_and_update, so any number of workers and processes can share
+    # the queue. Failures are retried with exponential backoff; messages that
+    # exhaust OUTBOX_MAX_ATTEMPTS are dead-lettered (status "dead").
+
+    def __init__(self):
+        self.workers = int(os.getenv("OUTBOX_WORKERS", 4))
+        self.poll_interval = float(os.getenv("OUTBOX_POLL_SECONDS", 2))
+        self.lease_seconds = float(os.getenv("OUTBOX_LEASE_SECONDS", 60))
+        self.max_attempts = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 6))
+        self.retry_base_seconds = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", 5))
+        self.retry_max_seconds = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", 3600))
+        self.provider_limits = {
+            "email": int(os.getenv("OUTBOX_EMAIL_CONCURRENCY", 4)),
+            "sms": int(os.getenv("OUTBOX_SMS_CONCURRENCY", 2))
+        }
+        self.providers = {"email": email_service, "sms": sms_service}
+        self.handlers: Dict[str, tuple] = {
+            "email.booking_confirmation": ("email", email_service.send_booking_confirmation),
+            "email.therapist_notification": ("email", email_service.send_therapist_notification),
+            "email.application_received": ("email", email_service.send_application_received),
+            "sms.booking_confirmation": ("sms", sms_service.send_booking_confirmation_sms),
+            "sms.booking_reminder": ("sms", sms_service.send_booking_reminder),
+        }
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.wakeup: Optional[asyncio.Event] = None
+        self.tasks: List[asyncio.Task] = []
+
+    def message(self, kind: str, reference_id: Optional[str] = None, **payload) -> dict:
+        """Build an outbox document for a registered notification kind."""
+        provider, _ = self.handlers[kind]
+        now = datetime.utcnow()
+        return {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "provider": provider,
+            "reference_id": reference_id,
+            "payload": payload,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "locked_until": None,
+            "last_error": None,
+            "created_at": now,
+            "updated_at": now
+        }
+
+    async def enqueue(self, database, messages: List[dict]):
+        """Store messages in one round trip and wake the local workers."""
+        if not messages:
+            return
+        await database.outbox.insert_many(messages)
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    async def _claim(self, database) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await database.outbox.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "pending", "next_attempt_at": {"$lte": now}},
+                    # A worker died mid-delivery: its lease has run out
+                    {"status": "processing", "locked_until": {"$lte": now}}
+                ]
+            },
+            {
+                "$set": {
+                    "status": "processing",
+                    "locked_until": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.retry_base_seconds * 2 ** (attempts - 1), self.retry_max_seconds)
+        return delay * random.uniform(0.8, 1.2)
+
+    async def _deliver(self, database, message: dict):
+        provider, handler = self.handlers.get(message["kind"], (message["provider"], None))
+        now = datetime.utcnow()
+
+        if handler is None:
+            error = f"Unknown notification kind: {message['kind']}"
+            sent = False
+        elif not self.providers[provider].configured:
+            # Nothing will change between retries; record it and move on
+            await database.outbox.update_one(
+                {"id": message["id"]},
+                {"$set": {"status": "skipped", "last_error": f"{provider} not configured", "updated_at": now}}
+            )
+            return
+        else:
+            error = None
+            try:
+                async with self.semaphores[provider]:
+                    sent = await handler(**message["payload"])
+                if not sent:
+                    error = f"{provider} provider rejected the message"
+            except Exception as e:
+                sent = False
+                error = str(e)
+
+        now = datetime.utcnow()
+        if sent:
+            update = {"status": "sent", "sent_at": now, "locked_until": None, "last_error": None}
+        elif handler is None or message["attempts"] >= self.max_attempts:
+            update = {"status": "dead", "dead_at": now, "locked_until": None, "last_error": error}
+            logger.error(f"Outbox message {message['id']} ({message['kind']}) dead-lettered: {error}")
+        else:
+            retry_at = now + timedelta(seconds=self._backoff(message["attempts"]))
+            update = {"status": "pending", "next_attempt_at": retry_at, "locked_until": None, "last_error": error}
+            logger.warning(
+                f"Outbox message {message['id']} ({message['kind']}) failed "
+                f"attempt {message['attempts']}, retrying at {retry_at.isoformat()}: {error}"
+            )
+        update["updated_at"] = now
+        await database.outbox.update_one({"id": message["id"]}, {"$set": update})
+
+    async def _worker(self, number: int):
+        while True:
+            try:
+                message = await self._claim(db.database)
+                if message is not None:
+                    await self._deliver(db.database, message)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox worker {number} failed: {str(e)}")
+
+            # Idle: wait for a local enqueue or the next poll
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def retry(self, database, message_id: str) -> bool:
+        """Requeue a dead or skipped message for immediate delivery."""
+        result = await database.outbox.update_one(
+            {"id": message_id, "status": {"$in": ["dead", "skipped"]}},
+            {"$set": {
+                "status": "pending",
+                "attempts": 0,
+                "next_attempt_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow()
+            }}
+        )
+        if result.modified_count and self.wakeup is not None:
+            self.wakeup.set()
+        return bool(result.modified_count)
+
+    async def stats(self, database) -> dict:
+        """Message counts by status and the oldest pending message's age."""
+        counts = await database.outbox.aggregate([
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ]).to_list(length=None)
+        oldest = await database.outbox.find_one(
+            {"status": "pending"}, {"created_at": 1}, sort=[("next_attempt_at", 1)]
+        )
+        return {
+            "workers": len(self.tasks),
+            "provider_limits": self.provider_limits,
+            "by_status": {count["_id"]: count["count"] for count in counts},
+            "oldest_pending_seconds": (
+                (datetime.utcnow() - oldest["created_at"]).total_seconds() if oldest else 0
+            )
+        }
+
+    def start(self):
+        """Start the worker pool."""
+        if self.tasks:
+            return
+        self.wakeup = asyncio.Event()
+        self.semaphores = {
+            provider: asyncio.Semaphore(limit) for provider, limit in self.provider_limits.items()
+        }
+        self.tasks = [asyncio.create_task(self._worker(number)) for number in range(self.workers)]
+        logger.info(f"Notification outbox started with {self.workers} workers")
+
+    async def stop(self):
+        """Stop the worker pool; claimed messages are retried after their lease."""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+# Global notification outbox instance
+notification_outbox = NotificationOutbox()
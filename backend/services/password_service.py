@@ -0,0 +1,85 @@
+import os
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional
+from passlib.context import CryptContext
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Password hashing
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def _hash_password(password: str) -> str:
+    """Hash a password (runs inside the worker pool)."""
+    return pwd_context.hash(password)
+
+def _verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password (runs inside the worker pool)."""
+    return pwd_context.verify(plain_password, hashed_password)
+
+class PasswordServiceBusy(Exception):
+    """Raised when the hashing pool already has too many queued jobs."""
+
+class PasswordService:
+    def __init__(self):
+        self.executor_type = os.getenv('PASSWORD_HASH_EXECUTOR', 'thread').lower()
+        self.max_workers = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+        self.max_pending = int(os.getenv('PASSWORD_HASH_MAX_PENDING', self.max_workers * 8))
+        self.executor: Optional[Executor] = None
+        self.pending = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> Executor:
+        if self.executor is None:
+            if self.executor_type == 'process':
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="password-hash"
+                )
+        return self.executor
+
+    async def _run(self, fn, *args):
+        """Run a hashing job in the pool, rejecting it when the queue is full."""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordServiceBusy(
+                f"Password hashing queue is full ({self.pending} pending)"
+            )
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """Generate password hash without blocking the event loop."""
+        return await self._run(_hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify a password against its hash without blocking the event loop."""
+        return await self._run(_verify_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        """Current pool usage."""
+        return {
+            "executor": self.executor_type,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "rejected": self.rejected
+        }
+
+    def shutdown(self):
+        """Stop the worker pool."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+            logger.info("Password hashing pool shut down")
+
+# Global password service instance
+password_service = PasswordService()
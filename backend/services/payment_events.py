@@ -0,0 +1,288 @@
+import asyncio
+import os
+import random
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from ..database import db
+from ..models import BookingStatus, PaymentStatus
+from .booking_state import ALLOWED_TRANSITIONS, booking_state
+from .payment_service import payment_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Per handled event type: the payment_status it sets, the payment statuses
+# it may replace (a refund is final, and a failure never undoes a payment),
+# and the booking status it moves to, only from the statuses
+# ALLOWED_TRANSITIONS permits
+EVENT_UPDATES: Dict[str, dict] = {
+    "payment_intent.succeeded": {
+        "payment_status": PaymentStatus.PAID,
+        "replaces": [PaymentStatus.PENDING, PaymentStatus.FAILED, PaymentStatus.PAID],
+        "status": BookingStatus.CONFIRMED
+    },
+    "payment_intent.payment_failed": {
+        "payment_status": PaymentStatus.FAILED,
+        "replaces": [PaymentStatus.PENDING, PaymentStatus.FAILED],
+        "status": None
+    },
+    "charge.refunded": {
+        "payment_status": PaymentStatus.REFUNDED,
+        "replaces": list(PaymentStatus),
+        "status": BookingStatus.CANCELLED
+    },
+}
+
+class PaymentEventProcessor:
+    """Stripe webhook event log, applied to bookings by partitioned workers."""
+
+    # The webhook only verifies and inserts the event; the unique index on
+    # event id turns Stripe's redeliveries into no-ops. Each worker owns the
+    # partitions crc32(booking_id) % PAYMENT_EVENT_PARTITIONS assigned to it
+    # and applies their events oldest first, so one booking's events never
+    # race each other. Updates are also guarded by the booking's
+    # payment_event_at and current payment_status, so a late or replayed
+    # event can neither undo a newer one nor revive a refunded booking.
+
+    def __init__(self):
+        self.partitions = int(os.getenv("PAYMENT_EVENT_PARTITIONS", 4))
+        self.workers = min(int(os.getenv("PAYMENT_EVENT_WORKERS", 2)), self.partitions)
+        self.poll_interval = float(os.getenv("PAYMENT_EVENT_POLL_SECONDS", 2))
+        self.lease_seconds = float(os.getenv("PAYMENT_EVENT_LEASE_SECONDS", 60))
+        self.max_attempts = int(os.getenv("PAYMENT_EVENT_MAX_ATTEMPTS", 8))
+        self.retry_base_seconds = float(os.getenv("PAYMENT_EVENT_RETRY_BASE_SECONDS", 2))
+        self.retry_max_seconds = float(os.getenv("PAYMENT_EVENT_RETRY_MAX_SECONDS", 600))
+        self.replay_batch_size = int(os.getenv("PAYMENT_EVENT_REPLAY_BATCH_SIZE", 1000))
+        self.wakeups: List[asyncio.Event] = []
+        self.tasks: List[asyncio.Task] = []
+
+    def partition_of(self, booking_id: Optional[str]) -> int:
+        return zlib.crc32((booking_id or "").encode()) % self.partitions
+
+    def document(self, event) -> dict:
+        """Build the event log entry for a verified Stripe event."""
+        data_object = event["data"]["object"]
+        if hasattr(data_object, "to_dict"):
+            data_object = data_object.to_dict()
+        booking_id = (data_object.get("metadata") or {}).get("booking_id")
+        handled = booking_id is not None and event["type"] in EVENT_UPDATES
+        if event["type"] == "charge.refunded" and not data_object.get("refunded"):
+            # Partial refund; the booking stays paid
+            handled = False
+        now = datetime.utcnow()
+        return {
+            "id": event["id"],
+            "type": event["type"],
+            "booking_id": booking_id,
+            "object_id": data_object.get("id"),
+            "object": data_object,
+            "stripe_created": datetime.utcfromtimestamp(event["created"]),
+            "partition": self.partition_of(booking_id),
+            "status": "pending" if handled else "ignored",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "locked_until": None,
+            "last_error": None,
+            "received_at": now,
+            "updated_at": now
+        }
+
+    async def record(self, database, event) -> bool:
+        """Store an event once; False if it was already received."""
+        document = self.document(event)
+        try:
+            await database.payment_events.insert_one(document)
+        except DuplicateKeyError:
+            logger.info(f"Duplicate Stripe event ignored: {event['id']}")
+            return False
+        if document["status"] == "pending" and self.wakeups:
+            self.wakeups[document["partition"] % len(self.wakeups)].set()
+        return True
+
+    def _guard(self, event: dict) -> dict:
+        # Only move forward in Stripe time, and only from payment statuses the
+        # event may replace, so equal timestamps re-apply harmlessly
+        return {
+            "id": event["booking_id"],
+            "payment_status": {"$in": EVENT_UPDATES[event["type"]]["replaces"]},
+            "$or": [
+                {"payment_event_at": {"$exists": False}},
+                {"payment_event_at": {"$lte": event["stripe_created"]}}
+            ]
+        }
+
+    def _payment_update(self, event: dict) -> tuple:
+        return (
+            self._guard(event),
+            {"$set": {
+                "payment_status": EVENT_UPDATES[event["type"]]["payment_status"],
+                "payment_event_at": event["stripe_created"],
+                "updated_at": datetime.utcnow()
+            }}
+        )
+
+    def _status_update(self, event: dict) -> Optional[tuple]:
+        target = EVENT_UPDATES[event["type"]]["status"]
+        if target is None:
+            return None
+        return (
+            {**self._guard(event), "status": {"$in": ALLOWED_TRANSITIONS[target]}},
+            {"$set": {"status": target, "updated_at": datetime.utcnow()}}
+        )
+
+    async def apply(self, database, event: dict):
+        """Apply one logged event to its booking."""
+        result = await database.bookings.update_one(*self._payment_update(event))
+        status_update = self._status_update(event)
+        if result.matched_count and status_update is not None:
+            await database.bookings.update_one(*status_update)
+        if EVENT_UPDATES[event["type"]]["status"] == BookingStatus.CANCELLED:
+            await booking_state.release_cancelled(database, [event["booking_id"]])
+        if event["type"].startswith("payment_intent."):
+            payment_service.forget_intent(event["object_id"])
+        logger.info(f"Stripe event {event['id']} ({event['type']}) applied to booking: {event['booking_id']}")
+
+    async def _claim(self, database, partitions: List[int]) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await database.payment_events.find_one_and_update(
+            {
+                "partition": {"$in": partitions},
+                "$or": [
+                    {"status": "pending", "next_attempt_at": {"$lte": now}},
+                    {"status": "processing", "locked_until": {"$lte": now}}
+                ]
+            },
+            {
+                "$set": {
+                    "status": "processing",
+                    "locked_until": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("stripe_created", 1), ("received_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _process(self, database, event: dict):
+        try:
+            await self.apply(database, event)
+            update = {"status": "applied", "applied_at": datetime.utcnow(), "locked_until": None, "last_error": None}
+        except Exception as e:
+            if event["attempts"] >= self.max_attempts:
+                update = {"status": "dead", "locked_until": None, "last_error": str(e)}
+                logger.error(f"Stripe event {event['id']} dead-lettered: {str(e)}")
+            else:
+                delay = min(self.retry_base_seconds * 2 ** (event["attempts"] - 1), self.retry_max_seconds)
+                retry_at = datetime.utcnow() + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+                update = {"status": "pending", "next_attempt_at": retry_at, "locked_until": None, "last_error": str(e)}
+                logger.warning(f"Stripe event {event['id']} failed attempt {event['attempts']}: {str(e)}")
+        update["updated_at"] = datetime.utcnow()
+        await database.payment_events.update_one({"id": event["id"]}, {"$set": update})
+
+    async def _worker(self, number: int):
+        partitions = list(range(number, self.partitions, len(self.wakeups)))
+        wakeup = self.wakeups[number]
+        while True:
+            try:
+                event = await self._claim(db.database, partitions)
+                if event is not None:
+                    await self._process(db.database, event)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Payment event worker {number} failed: {str(e)}")
+
+            wakeup.clear()
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def replay(
+        self,
+        database,
+        since: Optional[datetime] = None,
+        booking_ids: Optional[List[str]] = None,
+        dry_run: bool = False
+    ) -> dict:
+        """Rebuild booking payment state from the event log.
+
+        Only the newest handled event per booking is kept in memory; the
+        updates are written with one bulk_write per batch. Bookings a replayed
+        refund cancels release their slots.
+        """
+        # Ignored events (partial refunds, unknown bookings) never changed a
+        # booking live, so replay leaves them out too
+        query = {
+            "type": {"$in": list(EVENT_UPDATES)},
+            "booking_id": {"$ne": None},
+            "status": {"$in": ["pending", "processing", "applied"]}
+        }
+        if since is not None:
+            query["stripe_created"] = {"$gte": since}
+        if booking_ids:
+            query["booking_id"] = {"$in": booking_ids}
+
+        latest: Dict[str, dict] = {}
+        scanned = 0
+        projection = {"_id": 0, "id": 1, "type": 1, "booking_id": 1, "object_id": 1, "stripe_created": 1}
+        cursor = database.payment_events.find(query, projection).sort("stripe_created", 1)
+        async for event in cursor.batch_size(self.replay_batch_size):
+            scanned += 1
+            latest[event["booking_id"]] = event
+
+        matched = modified = 0
+        if not dry_run:
+            events = list(latest.values())
+            for start in range(0, len(events), self.replay_batch_size):
+                batch = events[start:start + self.replay_batch_size]
+                # Payment updates before status updates: both carry the same
+                # guard, so a status only moves where the payment update may
+                operations = [UpdateOne(*self._payment_update(event)) for event in batch]
+                operations += [
+                    UpdateOne(*update) for update in map(self._status_update, batch) if update is not None
+                ]
+                result = await database.bookings.bulk_write(operations, ordered=True)
+                matched += result.matched_count
+                modified += result.modified_count
+
+                await booking_state.release_cancelled(
+                    database, [event["booking_id"] for event in batch if event["type"] == "charge.refunded"]
+                )
+
+        return {"events_scanned": scanned, "bookings": len(latest), "matched": matched, "modified": modified}
+
+    async def stats(self, database) -> dict:
+        """Event counts by status."""
+        counts = await database.payment_events.aggregate([
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ]).to_list(length=None)
+        return {
+            "workers": len(self.tasks),
+            "partitions": self.partitions,
+            "by_status": {count["_id"]: count["count"] for count in counts}
+        }
+
+    def start(self):
+        """Start one worker per partition group."""
+        if self.tasks:
+            return
+        self.wakeups = [asyncio.Event() for _ in range(self.workers)]
+        self.tasks = [asyncio.create_task(self._worker(number)) for number in range(self.workers)]
+        logger.info(f"Payment event processor started with {self.workers} workers over {self.partitions} partitions")
+
+    async def stop(self):
+        """Stop the workers; claimed events are retried after their lease."""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.wakeups = []
+
+# Global payment event processor instance
+payment_event_processor = PaymentEventProcessor()
@@ -0,0 +1,159 @@
+import os
+from datetime import datetime
+from typing import AsyncIterator, Dict, Optional
+from pymongo import UpdateOne
+from ..models import BookingStatus, PaymentStatus
+from .booking_state import ALLOWED_TRANSITIONS, booking_state
+from .payment_service import payment_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+BOOKING_PROJECTION = {"_id": 0, "id": 1, "status": 1, "payment_status": 1, "stripe_payment_intent_id": 1}
+
+class PaymentReconciler:
+    """Repairs booking payment state from Stripe's own records."""
+
+    # Stripe is paged over a created-date window, PAYMENT_RECONCILE_PAGE_SIZE
+    # objects at a time; each page is matched to bookings with one $in query.
+    # Only corrections are kept in memory, and they are written with a single
+    # bulk_write whose filters include the payment status and booking status
+    # that were read, so a webhook or status change that lands mid-run is
+    # never overwritten. Booking status only moves as ALLOWED_TRANSITIONS
+    # permits: a refund cancels an upcoming booking but leaves a completed
+    # one completed.
+
+    def __init__(self):
+        self.page_size = min(int(os.getenv("PAYMENT_RECONCILE_PAGE_SIZE", 100)), 100)
+
+    async def _pages(self, resource, params: dict) -> AsyncIterator[list]:
+        client = payment_service._get_client()
+        service = getattr(client.v1, resource)
+        starting_after = None
+        while True:
+            page_params = {**params, "limit": self.page_size}
+            if starting_after:
+                page_params["starting_after"] = starting_after
+            async with payment_service.semaphore:
+                page = await service.list_async(params=page_params)
+            if page.data:
+                yield page.data
+            if not page.has_more or not page.data:
+                return
+            starting_after = page.data[-1].id
+
+    async def _bookings_for(self, database, objects: list, intent_field: str) -> Dict[str, dict]:
+        """Bookings keyed by intent id, matched by stored intent id or metadata booking_id."""
+        by_intent = {}
+        async for booking in database.bookings.find(
+            {"stripe_payment_intent_id": {"$in": [getattr(item, intent_field) for item in objects]}},
+            BOOKING_PROJECTION
+        ):
+            by_intent[booking["stripe_payment_intent_id"]] = booking
+
+        # Intents whose id never reached the booking (e.g. a lost response)
+        unmatched = {}
+        for item in objects:
+            metadata = item.metadata.to_dict() if item.metadata else {}
+            if getattr(item, intent_field) not in by_intent and metadata.get("booking_id"):
+                unmatched[metadata["booking_id"]] = getattr(item, intent_field)
+        if unmatched:
+            async for booking in database.bookings.find({"id": {"$in": list(unmatched)}}, BOOKING_PROJECTION):
+                by_intent[unmatched[booking["id"]]] = booking
+        return by_intent
+
+    def _correction(self, booking: dict, expected: dict, source: str) -> Optional[dict]:
+        changes = {
+            field: value for field, value in expected.items()
+            if booking.get(field) != value
+        }
+        if not changes:
+            return None
+        return {
+            "booking_id": booking["id"],
+            "source": source,
+            "filter": {"id": booking["id"], "payment_status": booking["payment_status"], "status": booking["status"]},
+            "from": {field: booking.get(field) for field in changes},
+            "to": changes
+        }
+
+    async def reconcile(
+        self,
+        database,
+        since: datetime,
+        until: Optional[datetime] = None,
+        dry_run: bool = False
+    ) -> dict:
+        """Compare intents and refunds created in [since, until) with bookings."""
+        created = {"gte": int(since.timestamp())}
+        if until is not None:
+            created["lt"] = int(until.timestamp())
+
+        corrections: Dict[str, dict] = {}
+        counts = {"intents": 0, "refunds": 0, "unmatched": 0}
+
+        async for intents in self._pages("payment_intents", {"created": created}):
+            counts["intents"] += len(intents)
+            bookings = await self._bookings_for(database, intents, "id")
+            for intent in intents:
+                booking = bookings.get(intent.id)
+                if booking is None:
+                    counts["unmatched"] += 1
+                    continue
+                if intent.status != "succeeded" or booking["payment_status"] == PaymentStatus.REFUNDED:
+                    continue
+                expected = {"payment_status": PaymentStatus.PAID, "stripe_payment_intent_id": intent.id}
+                if booking["status"] in ALLOWED_TRANSITIONS[BookingStatus.CONFIRMED]:
+                    expected["status"] = BookingStatus.CONFIRMED
+                correction = self._correction(booking, expected, f"payment_intent:{intent.id}")
+                if correction:
+                    corrections[booking["id"]] = correction
+
+        async for refunds in self._pages("refunds", {"created": created}):
+            counts["refunds"] += len(refunds)
+            succeeded = [refund for refund in refunds if refund.status == "succeeded"]
+            bookings = await self._bookings_for(database, succeeded, "payment_intent")
+            for refund in succeeded:
+                booking = bookings.get(refund.payment_intent)
+                if booking is None:
+                    counts["unmatched"] += 1
+                    continue
+                expected = {
+                    "payment_status": PaymentStatus.REFUNDED,
+                    "stripe_payment_intent_id": refund.payment_intent
+                }
+                if booking["status"] in ALLOWED_TRANSITIONS[BookingStatus.CANCELLED]:
+                    expected["status"] = BookingStatus.CANCELLED
+                correction = self._correction(booking, expected, f"refund:{refund.id}")
+                if correction:
+                    # A refund outranks the success of the same payment
+                    corrections[booking["id"]] = correction
+
+        modified = 0
+        if corrections and not dry_run:
+            now = datetime.utcnow()
+            result = await database.bookings.bulk_write([
+                UpdateOne(correction["filter"], {"$set": {**correction["to"], "updated_at": now}})
+                for correction in corrections.values()
+            ], ordered=False)
+            modified = result.modified_count
+
+            await booking_state.release_cancelled(database, [
+                booking_id for booking_id, correction in corrections.items()
+                if correction["to"].get("status") == BookingStatus.CANCELLED
+            ])
+            logger.info(f"Payment reconciliation corrected {modified} of {len(corrections)} bookings")
+
+        return {
+            **counts,
+            "corrections": len(corrections),
+            "modified": modified,
+            "dry_run": dry_run,
+            "diff": [
+                {key: correction[key] for key in ("booking_id", "source", "from", "to")}
+                for correction in corrections.values()
+            ]
+        }
+
+# Global payment reconciler instance
+payment_reconciler = PaymentReconciler()
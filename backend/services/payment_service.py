@@ -0,0 +1,158 @@
+import os
+import asyncio
+from typing import Optional, Tuple
+import stripe
+from ..cache import TTLCache
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Intents in these states can still be confirmed by the client, and updated
+REUSABLE_INTENT_STATUSES = {"requires_payment_method", "requires_confirmation", "requires_action"}
+
+class PaymentInProgress(Exception):
+    """The booking's intent is already paid or processing; a new one could charge twice."""
+
+class PaymentService:
+    def __init__(self):
+        self.api_key = os.getenv('STRIPE_SECRET_KEY')
+        self.webhook_secret = os.getenv('STRIPE_WEBHOOK_SECRET')
+        # Point at stripe-mock or tools/stripe_stub.py to run without network
+        self.api_base_url = os.getenv('STRIPE_API_BASE_URL', 'https://api.stripe.com')
+        self.timeout = float(os.getenv('STRIPE_HTTP_TIMEOUT_SECONDS', 20))
+        self.max_network_retries = int(os.getenv('STRIPE_MAX_NETWORK_RETRIES', 2))
+        self.max_concurrency = int(os.getenv('STRIPE_MAX_CONCURRENCY', 20))
+        self.http_client: Optional[stripe.HTTPXClient] = None
+        self.client: Optional[stripe.StripeClient] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        # intent id -> (client_secret, amount, currency) of reusable intents
+        self.intent_cache = TTLCache(
+            maxsize=int(os.getenv('STRIPE_INTENT_CACHE_SIZE', 10000)),
+            ttl=float(os.getenv('STRIPE_INTENT_CACHE_TTL_SECONDS', 900))
+        )
+
+    def _get_client(self) -> stripe.StripeClient:
+        if self.client is None:
+            # One pooled async HTTP session per worker; the SDK retries
+            # network errors, 409s, 429s and 5xxs with the same idempotency key
+            self.http_client = stripe.HTTPXClient(timeout=self.timeout)
+            self.client = stripe.StripeClient(
+                self.api_key,
+                base_addresses={"api": self.api_base_url},
+                http_client=self.http_client,
+                max_network_retries=self.max_network_retries
+            )
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.client
+
+    async def close(self):
+        """Close pooled connections."""
+        if self.http_client is not None:
+            await self.http_client.close_async()
+            self.http_client = None
+            self.client = None
+
+    async def create_payment_intent(
+        self,
+        booking_id: str,
+        amount_cents: int,
+        currency: str,
+        metadata: dict,
+        replaces: Optional[str] = None
+    ) -> stripe.PaymentIntent:
+        """Create a payment intent; repeating the same request returns the same intent.
+
+        replaces is the canceled or failed intent this one supersedes. It is
+        part of the idempotency key, otherwise Stripe would answer with the
+        intent being replaced.
+        """
+        idempotency_key = f"booking-{booking_id}-intent-{amount_cents}-{currency}"
+        if replaces:
+            idempotency_key += f"-replaces-{replaces}"
+        client = self._get_client()
+        async with self.semaphore:
+            return await client.v1.payment_intents.create_async(
+                params={
+                    "amount": amount_cents,
+                    "currency": currency,
+                    "automatic_payment_methods": {"enabled": True},
+                    "metadata": metadata
+                },
+                options={"idempotency_key": idempotency_key}
+            )
+
+    async def checkout_intent(
+        self,
+        booking_id: str,
+        existing_intent_id: Optional[str],
+        amount_cents: int,
+        currency: str,
+        metadata: dict
+    ) -> Tuple[str, str]:
+        """(intent id, client secret) for a booking checkout.
+
+        Reuses the booking's open intent (updating its amount if it changed)
+        and only creates a new one when there is none or it can no longer be
+        paid. Repeat checkouts for an unchanged amount are served from cache.
+        """
+        if existing_intent_id:
+            cached = self.intent_cache.get(existing_intent_id)
+            if cached is not None and cached[1:] == (amount_cents, currency):
+                return existing_intent_id, cached[0]
+
+            client = self._get_client()
+            async with self.semaphore:
+                intent = await client.v1.payment_intents.retrieve_async(existing_intent_id)
+
+            if intent.status in REUSABLE_INTENT_STATUSES and intent.currency == currency:
+                if intent.amount != amount_cents:
+                    async with self.semaphore:
+                        intent = await client.v1.payment_intents.update_async(
+                            intent.id,
+                            params={"amount": amount_cents},
+                            options={"idempotency_key": f"booking-{booking_id}-intent-{intent.id}-amount-{amount_cents}"}
+                        )
+                    logger.info(f"Payment intent {intent.id} updated to {amount_cents} for booking: {booking_id}")
+                self.intent_cache.set(intent.id, (intent.client_secret, amount_cents, currency))
+                return intent.id, intent.client_secret
+
+            self.intent_cache.delete(existing_intent_id)
+            if intent.status in ("succeeded", "processing"):
+                raise PaymentInProgress(f"Payment intent {intent.id} is {intent.status}")
+            logger.info(f"Payment intent {existing_intent_id} is {intent.status}; creating a new one for booking: {booking_id}")
+
+        intent = await self.create_payment_intent(
+            booking_id, amount_cents, currency, metadata, replaces=existing_intent_id
+        )
+        self.intent_cache.set(intent.id, (intent.client_secret, amount_cents, currency))
+        return intent.id, intent.client_secret
+
+    def forget_intent(self, intent_id: Optional[str]):
+        """Drop a cached client secret once its intent is paid, failed or refunded."""
+        if intent_id:
+            self.intent_cache.delete(intent_id)
+
+    async def create_refund(
+        self,
+        booking_id: str,
+        payment_intent_id: str,
+        metadata: dict
+    ) -> stripe.Refund:
+        """Refund a payment intent in full; retries never refund twice."""
+        client = self._get_client()
+        async with self.semaphore:
+            return await client.v1.refunds.create_async(
+                params={
+                    "payment_intent": payment_intent_id,
+                    "reason": "requested_by_customer",
+                    "metadata": metadata
+                },
+                options={"idempotency_key": f"booking-{booking_id}-refund-{payment_intent_id}"}
+            )
+
+    def construct_webhook_event(self, payload: bytes, sig_header: Optional[str]) -> stripe.Event:
+        """Verify a webhook signature and parse the event."""
+        return stripe.Webhook.construct_event(payload, sig_header, self.webhook_secret)
+
+# Global payment service instance
+payment_service = PaymentService()
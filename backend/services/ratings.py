@@ -0,0 +1,96 @@
+from typing import Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateOne
+import logging
+
+logger = logging.getLogger(__name__)
+
+STARS = ("1", "2", "3", "4", "5")
+
+def average_rating(rating_sum: int, reviews_count: int) -> float:
+    return round(rating_sum / reviews_count, 1) if reviews_count else 0.0
+
+class RatingAggregator:
+    """Running rating totals on therapist documents."""
+
+    # Each review adds to rating_sum, reviews_count and rating_histogram with
+    # one $inc; the rounded average in "rating" (used for filtering and
+    # sorting) is then set only if no other review has landed since, so the
+    # last writer always leaves it consistent with the counters.
+
+    async def add_review(self, db: AsyncIOMotorDatabase, therapist_id: str, rating: int) -> Optional[dict]:
+        """Count a new review and refresh the therapist's average."""
+        therapist = await db.therapists.find_one_and_update(
+            {"id": therapist_id},
+            {"$inc": {
+                "rating_sum": rating,
+                "reviews_count": 1,
+                f"rating_histogram.{rating}": 1
+            }},
+            projection={"_id": 0, "rating_sum": 1, "reviews_count": 1, "rating_histogram": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if therapist is None:
+            return None
+
+        # Counters from before the running totals existed; rebuilding here
+        # would race other reviews' $inc, so keep the old average until
+        # tools/rebuild_ratings.py has been run
+        if sum(therapist["rating_histogram"].values()) != therapist["reviews_count"]:
+            logger.warning(f"Rating counters out of step for therapist {therapist_id}; run tools/rebuild_ratings.py")
+            return None
+
+        rating_average = average_rating(therapist["rating_sum"], therapist["reviews_count"])
+        await db.therapists.update_one(
+            {"id": therapist_id, "reviews_count": therapist["reviews_count"]},
+            {"$set": {"rating": rating_average}}
+        )
+        return {"rating": rating_average, "reviews_count": therapist["reviews_count"]}
+
+    async def rebuild(self, db: AsyncIOMotorDatabase, therapist_ids: Optional[List[str]] = None) -> int:
+        """Recompute counters from the reviews collection; returns therapists modified.
+
+        One aggregation counts reviews per therapist and star; the results are
+        written with a single bulk_write. Offline only: the counters are $set,
+        so a review added between the aggregation and the write would be lost
+        or counted twice. Run it while review writes are stopped.
+        """
+        pipeline = []
+        if therapist_ids:
+            pipeline.append({"$match": {"therapist_id": {"$in": therapist_ids}}})
+        pipeline.append({"$group": {
+            "_id": {"therapist_id": "$therapist_id", "rating": "$rating"},
+            "count": {"$sum": 1}
+        }})
+
+        histograms: Dict[str, Dict[str, int]] = {}
+        async for group in db.reviews.aggregate(pipeline):
+            histogram = histograms.setdefault(group["_id"]["therapist_id"], dict.fromkeys(STARS, 0))
+            histogram[str(group["_id"]["rating"])] = group["count"]
+
+        if therapist_ids:
+            targets = therapist_ids
+        else:
+            targets = await db.therapists.distinct("id")
+
+        operations = []
+        for therapist_id in targets:
+            histogram = histograms.get(therapist_id, dict.fromkeys(STARS, 0))
+            reviews_count = sum(histogram.values())
+            rating_sum = sum(int(star) * count for star, count in histogram.items())
+            operations.append(UpdateOne(
+                {"id": therapist_id},
+                {"$set": {
+                    "rating_sum": rating_sum,
+                    "reviews_count": reviews_count,
+                    "rating_histogram": histogram,
+                    "rating": average_rating(rating_sum, reviews_count)
+                }}
+            ))
+        if not operations:
+            return 0
+        result = await db.therapists.bulk_write(operations, ordered=False)
+        return result.modified_count
+
+# Global rating aggregator instance
+rating_aggregator = RatingAggregator()
@@ -0,0 +1,186 @@
+import bisect
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple, Union
+from zoneinfo import ZoneInfo
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from ..cache import TTLCache
+
+# Minutes a therapist needs between appointments to reach the next client
+BOOKING_TRAVEL_BUFFER_MINUTES = int(os.getenv("BOOKING_TRAVEL_BUFFER_MINUTES", 30))
+
+# IANA zone appointment dates and times are entered in
+BOOKING_TIMEZONE = os.getenv("BOOKING_TIMEZONE", "UTC")
+
+# Booking states that occupy the therapist's time
+BLOCKING_STATUSES = ["pending", "confirmed", "in_progress"]
+
+Interval = Tuple[int, int, str]
+
+def storage_date(value: Union[date, datetime]) -> datetime:
+    """BSON has no date type: calendar days are keyed by midnight datetimes."""
+    if isinstance(value, datetime):
+        return datetime.combine(value.date(), time())
+    return datetime.combine(value, time())
+
+def utc_datetime(day: date, at: time, zone: str = BOOKING_TIMEZONE) -> datetime:
+    """A local date and time as the naive UTC datetime BSON stores."""
+    local = datetime.combine(day, at).replace(tzinfo=ZoneInfo(zone))
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+def day_bounds(day: Union[date, datetime], zone: str = BOOKING_TIMEZONE) -> Tuple[datetime, datetime]:
+    """UTC [start, end) of a local day, for range queries on starts_at."""
+    if isinstance(day, datetime):
+        day = day.date()
+    return utc_datetime(day, time(), zone), utc_datetime(day + timedelta(days=1), time(), zone)
+
+def local_appointment(booking: dict) -> Tuple[Optional[date], time]:
+    """Local appointment date and time of a booking document.
+
+    Derived from starts_at in the booking's timezone; documents not yet
+    backfilled (tools/backfill_booking_times.py) still carry the old
+    appointment_date and appointment_time fields.
+    """
+    if booking.get("starts_at") is not None:
+        zone = ZoneInfo(booking.get("timezone") or BOOKING_TIMEZONE)
+        local = booking["starts_at"].replace(tzinfo=timezone.utc).astimezone(zone)
+        return local.date(), local.time()
+    day = booking.get("appointment_date")
+    if isinstance(day, datetime):
+        day = day.date()
+    at = booking["appointment_time"]
+    if isinstance(at, str):
+        at = time.fromisoformat(at)
+    return day, at
+
+def booking_document(booking) -> dict:
+    """Booking model to a Mongo document: indexed UTC start and end plus the zone."""
+    document = booking.dict()
+    zone = document.get("timezone") or BOOKING_TIMEZONE
+    document["timezone"] = zone
+    document["starts_at"] = utc_datetime(booking.appointment_date, booking.appointment_time, zone)
+    document["ends_at"] = document["starts_at"] + timedelta(minutes=booking.duration_minutes)
+    del document["appointment_date"], document["appointment_time"]
+    return document
+
+def booking_output(document: dict) -> dict:
+    """Mongo document to API fields, with the local appointment date and time."""
+    day, at = local_appointment(document)
+    return {**document, "appointment_date": day, "appointment_time": at}
+
+def minutes_of(value: Union[time, str]) -> int:
+    """Minutes since midnight of a time or an HH:MM[:SS] string."""
+    if isinstance(value, str):
+        value = time.fromisoformat(value)
+    return value.hour * 60 + value.minute
+
+def booking_interval(booking: dict) -> Interval:
+    """(start, end, booking id) of a booking document, in minutes since midnight."""
+    start = minutes_of(local_appointment(booking)[1])
+    return start, start + booking["duration_minutes"], booking["id"]
+
+class DaySchedule:
+    """Booked intervals of one therapist on one day, sorted by start."""
+
+    # Overlap checks bisect the starts and only scan bookings that start within
+    # the longest booked duration before the candidate: O(log n + k).
+
+    def __init__(self, intervals: Iterable[Interval] = ()):
+        self.intervals: List[Interval] = sorted(intervals)
+        self.starts = [start for start, _, _ in self.intervals]
+        self.max_duration = max((end - start for start, end, _ in self.intervals), default=0)
+
+    def __len__(self) -> int:
+        return len(self.intervals)
+
+    def add(self, start: int, end: int, booking_id: str):
+        index = bisect.bisect_right(self.intervals, (start, end, booking_id))
+        self.intervals.insert(index, (start, end, booking_id))
+        self.starts.insert(index, start)
+        self.max_duration = max(self.max_duration, end - start)
+
+    def remove(self, booking_id: str) -> bool:
+        for index, (_, _, existing_id) in enumerate(self.intervals):
+            if existing_id == booking_id:
+                del self.intervals[index]
+                del self.starts[index]
+                return True
+        return False
+
+    def conflicts(self, start: int, end: int, buffer: int = BOOKING_TRAVEL_BUFFER_MINUTES) -> List[str]:
+        """Ids of bookings within `buffer` minutes of [start, end)."""
+        lo = bisect.bisect_right(self.starts, start - buffer - self.max_duration)
+        hi = bisect.bisect_left(self.starts, end + buffer)
+        return [
+            booking_id
+            for booking_start, booking_end, booking_id in self.intervals[lo:hi]
+            if booking_end + buffer > start
+        ]
+
+    def is_free(self, start: int, end: int, buffer: int = BOOKING_TRAVEL_BUFFER_MINUTES) -> bool:
+        lo = bisect.bisect_right(self.starts, start - buffer - self.max_duration)
+        hi = bisect.bisect_left(self.starts, end + buffer)
+        return not any(booking_end + buffer > start for _, booking_end, _ in self.intervals[lo:hi])
+
+class ScheduleIndex:
+    """Per-therapist, per-day interval index over blocking bookings."""
+
+    # Days are loaded with one indexed query and cached briefly. Bookings this
+    # worker creates or releases update the cached day in place; the TTL picks
+    # up changes made by other workers.
+
+    def __init__(self):
+        self.cache = TTLCache(
+            maxsize=int(os.getenv("SCHEDULE_CACHE_SIZE", 10000)),
+            ttl=float(os.getenv("SCHEDULE_CACHE_TTL_SECONDS", 30))
+        )
+
+    @staticmethod
+    def _key(therapist_id: str, day: Union[date, datetime]) -> tuple:
+        return therapist_id, storage_date(day)
+
+    async def get_day(
+        self,
+        db: AsyncIOMotorDatabase,
+        therapist_id: str,
+        day: Union[date, datetime],
+        fresh: bool = False
+    ) -> DaySchedule:
+        """The therapist's schedule for a day; `fresh` bypasses the cache."""
+        key = self._key(therapist_id, day)
+        if not fresh:
+            schedule = self.cache.get(key)
+            if schedule is not None:
+                return schedule
+
+        starts_from, starts_before = day_bounds(day)
+        bookings = await db.bookings.find(
+            {
+                "therapist_id": therapist_id,
+                "starts_at": {"$gte": starts_from, "$lt": starts_before},
+                "status": {"$in": BLOCKING_STATUSES}
+            },
+            {"id": 1, "starts_at": 1, "timezone": 1, "duration_minutes": 1}
+        ).to_list(length=None)
+        schedule = DaySchedule(booking_interval(booking) for booking in bookings)
+        self.cache.set(key, schedule)
+        return schedule
+
+    def booking_added(self, booking: dict):
+        """Record a new blocking booking in the cached day, if loaded."""
+        schedule: Optional[DaySchedule] = self.cache.get(
+            self._key(booking["therapist_id"], local_appointment(booking)[0])
+        )
+        if schedule is not None:
+            schedule.add(*booking_interval(booking))
+
+    def booking_released(self, booking: dict):
+        """Drop a cancelled or completed booking from the cached day, if loaded."""
+        schedule: Optional[DaySchedule] = self.cache.get(
+            self._key(booking["therapist_id"], local_appointment(booking)[0])
+        )
+        if schedule is not None:
+            schedule.remove(booking["id"])
+
+# Global schedule index instance
+schedule_index = ScheduleIndex()
@@ -0,0 +1,65 @@
+import os
+from datetime import datetime, timedelta
+from typing import List
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from .scheduling import BOOKING_TRAVEL_BUFFER_MINUTES, booking_interval, local_appointment, storage_date
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Reservation granularity; bookings are rounded out to whole slots
+BOOKING_SLOT_MINUTES = int(os.getenv("BOOKING_SLOT_MINUTES", 15))
+
+class SlotUnavailable(Exception):
+    """Another booking already holds one of the requested slots."""
+
+class SlotReservationService:
+    """Reserves therapist time as one document per slot."""
+
+    # The unique (therapist_id, date, slot) index rejects the second of two
+    # overlapping bookings within its insert_many round trip. Each booking holds
+    # [start, end + buffer), so two bookings collide exactly when they come
+    # within the travel buffer of each other.
+
+    def __init__(self, slot_minutes: int = BOOKING_SLOT_MINUTES, buffer_minutes: int = BOOKING_TRAVEL_BUFFER_MINUTES):
+        self.slot_minutes = slot_minutes
+        self.buffer_minutes = buffer_minutes
+
+    def slots_for(self, booking: dict) -> List[dict]:
+        """Reservation documents covering a booking and its travel buffer."""
+        start, end, booking_id = booking_interval(booking)
+        day = storage_date(local_appointment(booking)[0])
+        first = start // self.slot_minutes
+        last = -(-(end + self.buffer_minutes) // self.slot_minutes)
+        slots_per_day = 24 * 60 // self.slot_minutes
+        now = datetime.utcnow()
+
+        return [
+            {
+                "therapist_id": booking["therapist_id"],
+                # Bookings running past midnight hold slots on the next day
+                "date": day + timedelta(days=slot // slots_per_day),
+                "slot": slot % slots_per_day,
+                "booking_id": booking_id,
+                "created_at": now
+            }
+            for slot in range(first, last)
+        ]
+
+    async def reserve(self, db: AsyncIOMotorDatabase, booking: dict):
+        """Atomically claim every slot of a booking, or none of them."""
+        try:
+            await db.slot_reservations.insert_many(self.slots_for(booking), ordered=True)
+        except (BulkWriteError, DuplicateKeyError):
+            # Ordered inserts stop at the first taken slot; undo the ones before it
+            await self.release(db, booking["id"])
+            raise SlotUnavailable(booking["id"])
+
+    async def release(self, db: AsyncIOMotorDatabase, booking_id: str) -> int:
+        """Free the slots held by a failed, cancelled or completed booking."""
+        result = await db.slot_reservations.delete_many({"booking_id": booking_id})
+        return result.deleted_count
+
+# Global slot reservation service instance
+slot_reservations = SlotReservationService()
@@ -1,38 +1,68 @@
 import os
-from twilio.rest import Client
+import asyncio
 from typing import Optional
+import httpx
+from .http_client import create_http_client
 import logging
 
 logger = logging.getLogger(__name__)
 
 class SMSService:
-    def __init__(self):
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
         self.account_sid = os.getenv('TWILIO_ACCOUNT_SID')
         self.auth_token = os.getenv('TWILIO_AUTH_TOKEN')
         self.phone_number = os.getenv('TWILIO_PHONE_NUMBER')
-        
-        self.client = None
-        if self.account_sid and self.auth_token:
-            self.client = Client(self.account_sid, self.auth_token)
+        # Point at a local stub (see tools/notification_stub.py) to run without network
+        self.base_url = os.getenv('TWILIO_API_BASE_URL', 'https://api.twilio.com')
+        self.max_concurrency = int(os.getenv('SMS_MAX_CONCURRENCY', 5))
+        self.transport = transport
+        self.client: Optional[httpx.AsyncClient] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+    
+    @property
+    def configured(self) -> bool:
+        return bool(self.account_sid and self.auth_token)
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        if self.client is None:
+            self.client = create_http_client(
+                self.base_url,
+                "TWILIO",
+                transport=self.transport,
+                auth=(self.account_sid, self.auth_token)
+            )
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.client
+    
+    async def close(self):
+        """Close pooled connections."""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
     
     async def send_sms(self, to_phone: str, message: str) -> bool:
-        """Send SMS message."""
-        if not self.client:
+        """Send SMS message through the Twilio REST API."""
+        if not self.configured:
             logger.warning("Twilio credentials not configured, SMS not sent")
             return False
         
         try:
-            message = self.client.messages.create(
-                body=message,
-                from_=self.phone_number,
-                to=to_phone
-            )
+            client = self._get_client()
+            async with self.semaphore:
+                response = await client.post(
+                    f"/2010-04-01/Accounts/{self.account_sid}/Messages.json",
+                    data={"Body": message, "From": self.phone_number, "To": to_phone}
+                )
+            
+            if response.status_code >= 400:
+                logger.error(f"Failed to send SMS: Twilio returned {response.status_code}: {response.text[:200]}")
+                return False
             
-            logger.info(f"SMS sent successfully. SID: {message.sid}")
+            logger.info(f"SMS sent successfully. SID: {response.json().get('sid')}")
             return True
             
-        except Exception as e:
-            logger.error(f"Failed to send SMS: {str(e)}")
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to send SMS: {e.__class__.__name__}: {str(e)}")
             return False
     
     async def send_booking_reminder(
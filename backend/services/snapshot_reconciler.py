@@ -0,0 +1,177 @@
+import os
+import asyncio
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateMany
+from ..database import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SnapshotReconciler:
+    """Keeps booking snapshots in step with renamed users and services.
+
+    Each worker applies the renames it queues; the periodic full sweep that
+    catches anything missed (e.g. a worker stopped mid-queue) runs once per
+    deployment from tools/reconcile_snapshots.py.
+    """
+
+    def __init__(self):
+        self.batch_size = int(os.getenv('SNAPSHOT_RECONCILE_BATCH_SIZE', 500))
+        self.queue: "asyncio.Queue[tuple]" = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+
+    def user_renamed(self, user_id: str, full_name: str):
+        """Queue snapshot updates after a user changes their name."""
+        self.queue.put_nowait(("user", user_id, full_name))
+
+    def service_changed(self, service_id: str, name: str, category: str):
+        """Queue snapshot updates after a service is renamed or recategorized."""
+        self.queue.put_nowait(("service", service_id, name, category))
+
+    async def apply_user_rename(self, user_id: str, full_name: str) -> int:
+        database = db.database
+        result = await database.bookings.update_many(
+            {"client_id": user_id, "snapshot.client_name": {"$ne": full_name}},
+            {"$set": {"snapshot.client_name": full_name}}
+        )
+        updated = result.modified_count
+
+        therapist = await database.therapists.find_one({"user_id": user_id}, {"id": 1})
+        if therapist:
+            result = await database.bookings.update_many(
+                {"therapist_id": therapist["id"], "snapshot.therapist_name": {"$ne": full_name}},
+                {"$set": {"snapshot.therapist_name": full_name}}
+            )
+            updated += result.modified_count
+        return updated
+
+    async def apply_service_change(self, service_id: str, name: str, category: str) -> int:
+        result = await db.database.bookings.update_many(
+            {
+                "service_id": service_id,
+                "$or": [
+                    {"snapshot.service_name": {"$ne": name}},
+                    {"snapshot.service_category": {"$ne": category}}
+                ]
+            },
+            {"$set": {"snapshot.service_name": name, "snapshot.service_category": category}}
+        )
+        return result.modified_count
+
+    async def sweep(self, database: AsyncIOMotorDatabase) -> int:
+        """Reconcile every service and therapist name, plus unnamed clients.
+
+        Runs from tools/reconcile_snapshots.py rather than in each worker; every
+        batch of names is written with one bulk_write.
+        """
+        updated = 0
+
+        services = await database.services.find({}, {"id": 1, "name": 1, "category": 1}).to_list(length=None)
+        updated += await self._write(database, [
+            UpdateMany(
+                {
+                    "service_id": service["id"],
+                    "$or": [
+                        {"snapshot.service_name": {"$ne": service["name"]}},
+                        {"snapshot.service_category": {"$ne": service["category"]}}
+                    ]
+                },
+                {"$set": {"snapshot.service_name": service["name"], "snapshot.service_category": service["category"]}}
+            )
+            for service in services
+        ])
+
+        therapists = database.therapists.find({}, {"id": 1, "user_id": 1}).batch_size(self.batch_size)
+        batch = []
+        async for therapist in therapists:
+            batch.append(therapist)
+            if len(batch) >= self.batch_size:
+                updated += await self._sweep_therapists(database, batch)
+                batch = []
+        if batch:
+            updated += await self._sweep_therapists(database, batch)
+
+        client_ids = await database.bookings.distinct(
+            "client_id", {"snapshot.client_name": {"$in": [None, ""]}}
+        )
+        for start in range(0, len(client_ids), self.batch_size):
+            chunk = client_ids[start:start + self.batch_size]
+            users = await database.users.find({"id": {"$in": chunk}}, {"id": 1, "full_name": 1}).to_list(length=None)
+            updated += await self._write(database, [
+                UpdateMany(
+                    {"client_id": user["id"], "snapshot.client_name": {"$ne": user["full_name"]}},
+                    {"$set": {"snapshot.client_name": user["full_name"]}}
+                )
+                for user in users
+            ])
+
+        if updated:
+            logger.info(f"Snapshot sweep updated {updated} bookings")
+        return updated
+
+    async def _sweep_therapists(self, database: AsyncIOMotorDatabase, therapists: list) -> int:
+        users = await database.users.find(
+            {"id": {"$in": [therapist["user_id"] for therapist in therapists]}},
+            {"id": 1, "full_name": 1}
+        ).to_list(length=None)
+        names = {user["id"]: user["full_name"] for user in users}
+
+        return await self._write(database, [
+            UpdateMany(
+                {"therapist_id": therapist["id"], "snapshot.therapist_name": {"$ne": names[therapist["user_id"]]}},
+                {"$set": {"snapshot.therapist_name": names[therapist["user_id"]]}}
+            )
+            for therapist in therapists if names.get(therapist["user_id"])
+        ])
+
+    async def _write(self, database: AsyncIOMotorDatabase, operations: list) -> int:
+        if not operations:
+            return 0
+        result = await database.bookings.bulk_write(operations, ordered=False)
+        return result.modified_count
+
+    async def _apply(self, change: tuple):
+        if change[0] == "user":
+            await self.apply_user_rename(*change[1:])
+        elif change[0] == "service":
+            await self.apply_service_change(*change[1:])
+
+    async def _run(self):
+        while True:
+            change = await self.queue.get()
+            try:
+                await self._apply(change)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Snapshot reconciliation failed: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    def start(self):
+        """Start the background reconciler."""
+        if self.task is None:
+            # A fresh queue binds to the running loop; stop() drained the last one
+            self.queue = asyncio.Queue()
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Apply queued renames, then stop the background reconciler."""
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+        while not self.queue.empty():
+            try:
+                await self._apply(self.queue.get_nowait())
+            except Exception as e:
+                logger.error(f"Snapshot reconciliation failed: {str(e)}")
+
+# Global snapshot reconciler instance
+snapshot_reconciler = SnapshotReconciler()
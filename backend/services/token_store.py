@@ -0,0 +1,140 @@
+import os
+import asyncio
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from pymongo import ReturnDocument
+from ..database import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RefreshTokenStore(ABC):
+    """Server-side record of issued refresh tokens (keyed by token hash)."""
+
+    @abstractmethod
+    async def save(self, record: dict):
+        ...
+
+    @abstractmethod
+    async def get(self, token_hash: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def consume(self, token_hash: str, successor: str) -> Optional[dict]:
+        """Atomically mark a live token as used by successor and return it, or None."""
+
+    @abstractmethod
+    async def revoke_family(self, family_id: str) -> int:
+        ...
+
+    @abstractmethod
+    async def revoke_user(self, user_id: str) -> int:
+        ...
+
+class InMemoryRefreshTokenStore(RefreshTokenStore):
+    """Process-local store for tests, benchmarks and single-worker setups."""
+
+    # Expired records are dropped every PURGE_INTERVAL on save, the way the
+    # TTL index on expires_at drops them from the Mongo store.
+    PURGE_INTERVAL = timedelta(minutes=5)
+
+    def __init__(self):
+        self.tokens: Dict[str, dict] = {}
+        self.lock = asyncio.Lock()
+        self.next_purge = datetime.utcnow() + self.PURGE_INTERVAL
+
+    def purge_expired(self, now: datetime) -> int:
+        expired = [token_hash for token_hash, record in self.tokens.items() if record["expires_at"] <= now]
+        for token_hash in expired:
+            del self.tokens[token_hash]
+        return len(expired)
+
+    async def save(self, record: dict):
+        now = datetime.utcnow()
+        if now >= self.next_purge:
+            self.purge_expired(now)
+            self.next_purge = now + self.PURGE_INTERVAL
+        self.tokens[record["id"]] = dict(record)
+
+    async def get(self, token_hash: str) -> Optional[dict]:
+        record = self.tokens.get(token_hash)
+        return dict(record) if record else None
+
+    async def consume(self, token_hash: str, successor: str) -> Optional[dict]:
+        async with self.lock:
+            record = self.tokens.get(token_hash)
+            now = datetime.utcnow()
+            if (not record or record["revoked"] or record["used_at"] is not None
+                    or record["expires_at"] <= now):
+                return None
+            record["used_at"] = now
+            record["successor"] = successor
+            return dict(record)
+
+    async def revoke_family(self, family_id: str) -> int:
+        revoked = 0
+        for record in self.tokens.values():
+            if record["family_id"] == family_id and not record["revoked"]:
+                record["revoked"] = True
+                revoked += 1
+        return revoked
+
+    async def revoke_user(self, user_id: str) -> int:
+        revoked = 0
+        for record in self.tokens.values():
+            if record["user_id"] == user_id and not record["revoked"]:
+                record["revoked"] = True
+                revoked += 1
+        return revoked
+
+class MongoRefreshTokenStore(RefreshTokenStore):
+    """Store backed by the refresh_tokens collection."""
+
+    @property
+    def collection(self):
+        return db.database.refresh_tokens
+
+    async def save(self, record: dict):
+        await self.collection.insert_one(dict(record))
+
+    async def get(self, token_hash: str) -> Optional[dict]:
+        return await self.collection.find_one({"id": token_hash})
+
+    async def consume(self, token_hash: str, successor: str) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {
+                "id": token_hash,
+                "revoked": False,
+                "used_at": None,
+                "expires_at": {"$gt": now}
+            },
+            {"$set": {"used_at": now, "successor": successor}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def revoke_family(self, family_id: str) -> int:
+        result = await self.collection.update_many(
+            {"family_id": family_id, "revoked": False},
+            {"$set": {"revoked": True}}
+        )
+        return result.modified_count
+
+    async def revoke_user(self, user_id: str) -> int:
+        result = await self.collection.update_many(
+            {"user_id": user_id, "revoked": False},
+            {"$set": {"revoked": True}}
+        )
+        return result.modified_count
+
+def create_refresh_token_store() -> RefreshTokenStore:
+    """Build the store selected by REFRESH_TOKEN_STORE (mongo or memory)."""
+    backend = os.getenv('REFRESH_TOKEN_STORE', 'mongo').lower()
+    if backend == 'memory':
+        logger.info("Using in-memory refresh token store")
+        return InMemoryRefreshTokenStore()
+    return MongoRefreshTokenStore()
+
+# Global refresh token store instance
+refresh_token_store = create_refresh_token_store()
@@ -0,0 +1,86 @@
+"""Convert stored bookings from appointment_date/appointment_time to starts_at/ends_at.
+
+Usage:
+    python -m backend.tools.backfill_booking_times --dry-run
+    python -m backend.tools.backfill_booking_times
+    python -m backend.tools.backfill_booking_times --keep-legacy-fields   # while old workers still run
+
+Bookings are read in _id order, --batch-size at a time, and each batch is
+written with one bulk_write. Only bookings without starts_at are touched, so
+the tool can be stopped and rerun. Run it right after deploying, then
+sync indexes (tools/sync_indexes.py --apply --drop-extra) to drop the old
+appointment_date indexes.
+"""
+import argparse
+import asyncio
+import json
+from datetime import timedelta
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / '.env')
+
+from pymongo import UpdateOne
+from ..database import create_client, db_name
+from ..services.scheduling import BOOKING_TIMEZONE, local_appointment, utc_datetime
+
+LEGACY_FIELDS = {"appointment_date": "", "appointment_time": ""}
+
+def conversion(booking: dict, zone: str, keep_legacy_fields: bool) -> UpdateOne:
+    day, at = local_appointment(booking)
+    starts_at = utc_datetime(day, at, zone)
+    update = {"$set": {
+        "starts_at": starts_at,
+        "ends_at": starts_at + timedelta(minutes=booking["duration_minutes"]),
+        "timezone": zone
+    }}
+    if not keep_legacy_fields:
+        update["$unset"] = LEGACY_FIELDS
+    return UpdateOne({"_id": booking["_id"], "starts_at": {"$exists": False}}, update)
+
+async def run(args) -> int:
+    client = create_client()
+    database = client[db_name]
+    counts = {"bookings": 0, "converted": 0, "failed": 0, "batches": 0}
+    last_id = None
+    try:
+        while True:
+            query = {"starts_at": {"$exists": False}}
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            batch = await database.bookings.find(
+                query, {"_id": 1, "id": 1, "appointment_date": 1, "appointment_time": 1, "duration_minutes": 1}
+            ).sort("_id", 1).limit(args.batch_size).to_list(length=args.batch_size)
+            if not batch:
+                break
+            last_id = batch[-1]["_id"]
+            counts["bookings"] += len(batch)
+            counts["batches"] += 1
+
+            operations = []
+            for booking in batch:
+                try:
+                    operations.append(conversion(booking, args.timezone, args.keep_legacy_fields))
+                except (KeyError, TypeError, ValueError) as e:
+                    counts["failed"] += 1
+                    print(f"booking {booking.get('id')}: {e}")
+            if operations and not args.dry_run:
+                result = await database.bookings.bulk_write(operations, ordered=False)
+                counts["converted"] += result.modified_count
+    finally:
+        client.close()
+
+    print(json.dumps({**counts, "timezone": args.timezone, "dry_run": args.dry_run}, indent=2))
+    return 1 if counts["failed"] else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill indexed UTC starts_at/ends_at on bookings in batches.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--timezone", default=BOOKING_TIMEZONE, help="zone the stored dates and times were entered in")
+    parser.add_argument("--keep-legacy-fields", action="store_true", help="leave appointment_date/appointment_time in place")
+    parser.add_argument("--dry-run", action="store_true", help="count bookings without writing")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Reserve slots for bookings created before slot reservations existed.
+
+Usage:
+    python -m backend.tools.backfill_slot_reservations --dry-run
+    python -m backend.tools.backfill_slot_reservations
+    python -m backend.tools.backfill_slot_reservations --include-past
+
+Bookings in a blocking status (pending, confirmed, in progress) that have not
+ended yet get their slots inserted, --batch-size bookings per insert_many.
+Slots the booking already holds are left alone, so the tool can be rerun.
+Slots held by a different booking are reported as conflicts: those
+bookings overlapped before reservations enforced it and need a manual fix.
+Exits 1 when there are conflicts.
+"""
+import argparse
+import asyncio
+import json
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / '.env')
+
+from pymongo.errors import BulkWriteError
+from ..database import create_client, db_name
+from ..services.scheduling import BLOCKING_STATUSES
+from ..services.slot_reservations import slot_reservations
+
+BOOKING_PROJECTION = {"_id": 0, "id": 1, "therapist_id": 1, "starts_at": 1, "timezone": 1, "duration_minutes": 1}
+
+async def reserve_batch(database, bookings: list, counts: dict):
+    slots = [slot for booking in bookings for slot in slot_reservations.slots_for(booking)]
+    try:
+        await database.slot_reservations.insert_many(slots, ordered=False)
+        counts["reserved"] += len(slots)
+    except BulkWriteError as e:
+        taken = [error["op"] for error in e.details["writeErrors"]]
+        counts["reserved"] += e.details["nInserted"]
+
+        # Tell slots this booking already holds from ones another booking holds
+        holders = {}
+        async for reservation in database.slot_reservations.find(
+            {"$or": [{"therapist_id": slot["therapist_id"], "date": slot["date"], "slot": slot["slot"]} for slot in taken]},
+            {"_id": 0, "therapist_id": 1, "date": 1, "slot": 1, "booking_id": 1}
+        ):
+            holders[(reservation["therapist_id"], reservation["date"], reservation["slot"])] = reservation["booking_id"]
+
+        for slot in taken:
+            holder = holders.get((slot["therapist_id"], slot["date"], slot["slot"]))
+            if holder == slot["booking_id"]:
+                counts["already_reserved"] += 1
+            else:
+                counts["conflicts"] += 1
+                print(f"booking {slot['booking_id']}: slot {slot['slot']} on {slot['date'].date()} held by {holder}")
+
+async def run(args) -> int:
+    client = create_client()
+    database = client[db_name]
+    counts = {"bookings": 0, "reserved": 0, "already_reserved": 0, "conflicts": 0}
+    query = {"status": {"$in": BLOCKING_STATUSES}}
+    if not args.include_past:
+        query["ends_at"] = {"$gt": datetime.utcnow()}
+    try:
+        batch = []
+        async for booking in database.bookings.find(query, BOOKING_PROJECTION).sort("starts_at", 1):
+            batch.append(booking)
+            if len(batch) >= args.batch_size:
+                counts["bookings"] += len(batch)
+                if not args.dry_run:
+                    await reserve_batch(database, batch, counts)
+                batch = []
+        if batch:
+            counts["bookings"] += len(batch)
+            if not args.dry_run:
+                await reserve_batch(database, batch, counts)
+    finally:
+        client.close()
+
+    print(json.dumps({**counts, "dry_run": args.dry_run}, indent=2))
+    return 1 if counts["conflicts"] else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Insert slot reservations for existing blocking bookings.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--include-past", action="store_true", help="also reserve slots of bookings that already ended")
+    parser.add_argument("--dry-run", action="store_true", help="count bookings without writing")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
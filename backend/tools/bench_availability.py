@@ -0,0 +1,79 @@
+"""Benchmark the availability search over calendar bitmaps and check it against DaySchedule.
+
+Generates random bookings for many therapist-days, builds their calendar
+bitmaps the way CalendarService does, times unpacking them and the vectorized
+free-start computation, and verifies a sample of answers with the interval
+index and working-hours check used when booking.
+
+Usage:
+    python -m backend.tools.bench_availability
+    python -m backend.tools.bench_availability --therapists 5000 --days 7 --duration 90
+    python -m backend.tools.bench_availability --max-ms 100   # exit 1 if slower
+"""
+import argparse
+import random
+import time
+from datetime import date
+from ..services.availability import bit_matrix, bookable_starts
+from ..services.calendars import SLOTS_PER_DAY, open_mask, within_working_hours
+from ..services.scheduling import BOOKING_TRAVEL_BUFFER_MINUTES, DaySchedule
+from ..services.slot_reservations import BOOKING_SLOT_MINUTES, slot_reservations
+
+DURATIONS = [30, 60, 90, 120]
+
+def main():
+    parser = argparse.ArgumentParser(description="Time free-slot search over many therapist-days.")
+    parser.add_argument("--therapists", type=int, default=3000)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--bookings-per-day", type=int, default=4)
+    parser.add_argument("--duration", type=int, default=90)
+    parser.add_argument("--samples", type=int, default=2000, help="answers verified against DaySchedule")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-ms", type=float, default=0, help="fail above this many milliseconds")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    day = date.today()
+    row_count = args.therapists * args.days
+    rows, starts, ends = [], [], []
+    busy_masks = [0] * row_count
+    for row in range(row_count):
+        for _ in range(rng.randint(0, 2 * args.bookings_per_day)):
+            start = rng.randrange(8 * 60, 21 * 60, BOOKING_SLOT_MINUTES)
+            end = start + rng.choice(DURATIONS)
+            rows.append(row)
+            starts.append(start)
+            ends.append(end)
+            for slot in slot_reservations.slots_for({
+                "id": None, "therapist_id": None, "appointment_date": day,
+                "appointment_time": f"{start // 60:02d}:{start % 60:02d}:00", "duration_minutes": end - start
+            }):
+                if slot["date"].date() == day:
+                    busy_masks[row] |= 1 << slot["slot"]
+    open_masks = [open_mask(None, day)] * row_count
+
+    started = time.perf_counter()
+    free = bookable_starts(bit_matrix(open_masks), bit_matrix(busy_masks), args.duration)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    schedules = {}
+    for row, start, end in zip(rows, starts, ends):
+        schedules.setdefault(row, DaySchedule()).add(start, end, f"booking-{row}-{start}-{end}")
+    mismatches = 0
+    for _ in range(args.samples):
+        row = rng.randrange(row_count)
+        slot = rng.randrange(0, SLOTS_PER_DAY - args.duration // BOOKING_SLOT_MINUTES)
+        start = slot * BOOKING_SLOT_MINUTES
+        expected = (
+            within_working_hours(None, day, start, start + args.duration)
+            and schedules.get(row, DaySchedule()).is_free(start, start + args.duration, BOOKING_TRAVEL_BUFFER_MINUTES)
+        )
+        mismatches += bool(free[row, slot]) != expected
+
+    print(f"matrix:   {row_count} therapist-days, {len(rows)} bookings")
+    print(f"search:   {elapsed_ms:.1f} ms for {args.duration}-minute sessions, {int(free.sum())} free starts")
+    print(f"verified: {args.samples} samples, {mismatches} mismatches")
+    raise SystemExit(1 if mismatches or (args.max_ms and elapsed_ms > args.max_ms) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Benchmark login throughput and its effect on unrelated endpoints.
+
+Runs the app in-process on the in-memory storage backend, first timing a
+probe endpoint alone, then again while --concurrency clients log in
+back to back. bcrypt runs in the password pool, so the probe's p99 should
+barely move while logins saturate it.
+
+Usage:
+    python -m backend.tools.bench_login
+    python -m backend.tools.bench_login --concurrency 64 --seconds 10
+    python -m backend.tools.bench_login --max-p99-ms 50   # exit 1 if the probe is slower
+"""
+import argparse
+import asyncio
+import os
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / '.env')
+os.environ["STORAGE_BACKEND"] = "memory"
+
+import httpx
+from .. import server
+from ..services.password_service import password_service
+
+EMAIL = "bench-login@example.com"
+PASSWORD = "bench-password"
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+async def probe(client: httpx.AsyncClient, path: str, until: float, interval: float) -> list:
+    """Latencies (ms) of requests to path, one every interval seconds, until the deadline."""
+    latencies = []
+    while time.perf_counter() < until:
+        started = time.perf_counter()
+        response = await client.get(path)
+        latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+        # The in-memory store never blocks, so an unpaced probe would starve the logins
+        await asyncio.sleep(interval)
+    return latencies
+
+async def log_in(client: httpx.AsyncClient, until: float, counts: dict):
+    while time.perf_counter() < until:
+        response = await client.post("/api/auth/login", json={"email": EMAIL, "password": PASSWORD})
+        counts[response.status_code] = counts.get(response.status_code, 0) + 1
+        if response.status_code == 503:
+            # Pool full: back off the way a client honouring Retry-After would
+            await asyncio.sleep(0.05)
+
+async def run(args) -> int:
+    await server.startup_event()
+    try:
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.post("/api/auth/register", json={
+                "email": EMAIL, "password": PASSWORD, "full_name": "Bench Login",
+                "phone": "+15550000000", "role": "client"
+            })
+            # Already registered by an earlier run
+            if response.status_code != 400:
+                response.raise_for_status()
+
+            baseline = await probe(client, args.probe, time.perf_counter() + args.baseline_seconds, args.interval)
+
+            counts = {}
+            until = time.perf_counter() + args.seconds
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                probe(client, args.probe, until, args.interval),
+                *(log_in(client, until, counts) for _ in range(args.concurrency))
+            )
+            elapsed = time.perf_counter() - started
+            loaded = results[0]
+    finally:
+        await server.shutdown_event()
+
+    logins = counts.get(200, 0)
+    p99 = percentile(loaded, 0.99)
+    print(f"pool:     {password_service.max_workers} {password_service.executor_type} workers, "
+          f"max {password_service.max_pending} pending")
+    print(f"logins:   {logins} in {elapsed:.1f}s -> {logins / elapsed:.1f}/s "
+          f"({counts.get(503, 0)} rejected with 503, {args.concurrency} clients)")
+    print(f"probe:    {args.probe} alone p50 {percentile(baseline, 0.5):.1f} ms, p99 {percentile(baseline, 0.99):.1f} ms")
+    print(f"          during logins p50 {percentile(loaded, 0.5):.1f} ms, p99 {p99:.1f} ms ({len(loaded)} requests)")
+    failed = set(counts) - {200, 503}
+    return 1 if failed or (args.max_p99_ms and p99 > args.max_p99_ms) else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure logins per second and probe latency while logins run.")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--baseline-seconds", type=float, default=2)
+    parser.add_argument("--probe", default="/api/services/", help="unrelated endpoint timed during the run")
+    parser.add_argument("--interval", type=float, default=0.005, help="seconds between probe requests")
+    parser.add_argument("--max-p99-ms", type=float, default=0, help="fail above this probe p99 under load")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Benchmark booking conflict checks against a dense calendar.
+
+Builds one DaySchedule per therapist-day, packed with back-to-back bookings of
+mixed durations (travel buffer included), then checks random candidate slots.
+
+Usage:
+    python -m backend.tools.bench_schedule
+    python -m backend.tools.bench_schedule --therapists 500 --days 30 --checks 200000
+    python -m backend.tools.bench_schedule --min-rate 50000   # exit 1 if slower
+"""
+import argparse
+import random
+import time
+from ..services.scheduling import BOOKING_TRAVEL_BUFFER_MINUTES, DaySchedule
+
+DURATIONS = [30, 60, 90, 120]
+
+def dense_day(rng: random.Random, buffer: int) -> DaySchedule:
+    """A day with bookings from 06:00 to midnight, separated only by the buffer."""
+    schedule = DaySchedule()
+    start = 6 * 60
+    while True:
+        duration = rng.choice(DURATIONS)
+        if start + duration > 24 * 60:
+            return schedule
+        schedule.add(start, start + duration, f"booking-{start}")
+        start += duration + buffer
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure conflict checks per second on a dense calendar.")
+    parser.add_argument("--therapists", type=int, default=200)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--checks", type=int, default=100000)
+    parser.add_argument("--buffer", type=int, default=BOOKING_TRAVEL_BUFFER_MINUTES)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-rate", type=float, default=0, help="fail below this many checks per second")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    calendar = [dense_day(rng, args.buffer) for _ in range(args.therapists * args.days)]
+    build_seconds = time.perf_counter() - started
+    bookings = sum(len(schedule) for schedule in calendar)
+
+    candidates = []
+    for _ in range(args.checks):
+        start = rng.randrange(0, 24 * 60 - 120, 15)
+        candidates.append((rng.choice(calendar), start, start + rng.choice(DURATIONS)))
+
+    started = time.perf_counter()
+    free = 0
+    for schedule, start, end in candidates:
+        free += schedule.is_free(start, end, args.buffer)
+    check_seconds = time.perf_counter() - started
+    rate = args.checks / check_seconds
+
+    print(f"calendar: {len(calendar)} therapist-days, {bookings} bookings (built in {build_seconds:.2f}s)")
+    print(f"checks:   {args.checks} in {check_seconds:.3f}s -> {rate:,.0f} checks/s ({free} free)")
+    raise SystemExit(1 if args.min_rate and rate < args.min_rate else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Local stand-in for the SendGrid and Twilio APIs.
+
+Accepts the two endpoints the notification services call, optionally after a
+delay or with random failures, so tests and load runs need no network:
+
+    python -m backend.tools.notification_stub --port 8025 --latency-ms 150
+    SENDGRID_API_BASE_URL=http://127.0.0.1:8025 TWILIO_API_BASE_URL=http://127.0.0.1:8025 ...
+
+GET /stats returns the number of messages accepted and rejected.
+"""
+import argparse
+import asyncio
+import random
+import uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import uvicorn
+
+def create_app(latency_ms: float = 0, failure_rate: float = 0) -> FastAPI:
+    app = FastAPI(title="Notification provider stub")
+    counters = {"emails": 0, "sms": 0, "rejected": 0}
+
+    async def simulate() -> bool:
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        if random.random() < failure_rate:
+            counters["rejected"] += 1
+            return False
+        return True
+
+    @app.post("/v3/mail/send")
+    async def send_mail(request: Request):
+        await request.json()
+        if not await simulate():
+            return JSONResponse({"errors": [{"message": "stub failure"}]}, status_code=503)
+        counters["emails"] += 1
+        return JSONResponse(None, status_code=202)
+
+    @app.post("/2010-04-01/Accounts/{account_sid}/Messages.json")
+    async def send_sms(account_sid: str, request: Request):
+        form = await request.form()
+        if not await simulate():
+            return JSONResponse({"code": 20500, "message": "stub failure"}, status_code=503)
+        counters["sms"] += 1
+        return JSONResponse(
+            {"sid": f"SM{uuid.uuid4().hex}", "account_sid": account_sid, "to": form.get("To"), "status": "queued"},
+            status_code=201
+        )
+
+    @app.get("/stats")
+    async def stats():
+        return counters
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve stub SendGrid and Twilio endpoints.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay before every response")
+    parser.add_argument("--failure-rate", type=float, default=0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency_ms, args.failure_rate), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
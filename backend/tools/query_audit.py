@@ -0,0 +1,207 @@
+"""Explain the query shapes the routers issue and flag bad plans.
+
+Each shape mirrors a query in a router (same filter fields, operators and sort).
+The audit runs explain("executionStats") for every shape and reports:
+  * COLLSCAN stages (no usable index),
+  * SORT stages (in-memory sort instead of an index-ordered scan),
+  * docs examined / docs returned above --max-ratio.
+
+Usage:
+    python -m backend.tools.query_audit              # table, exit 1 on findings
+    python -m backend.tools.query_audit --json
+    python -m backend.tools.query_audit --only bookings
+"""
+import argparse
+import asyncio
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / '.env')
+
+from ..database import create_client, db_name
+
+# Placeholder values: only the shape matters to the planner
+SAMPLE_ID = "query-audit-sample"
+SAMPLE_DAY = datetime(2024, 1, 1)
+
+QUERY_SHAPES = [
+    # auth
+    {"name": "auth.get_user_by_email", "collection": "users",
+     "filter": {"email": "audit@example.com"}, "limit": 1},
+    {"name": "auth.get_user_by_id", "collection": "users",
+     "filter": {"id": SAMPLE_ID}, "limit": 1},
+    {"name": "auth.get_therapist_profile", "collection": "therapists",
+     "filter": {"user_id": SAMPLE_ID}, "limit": 1},
+
+    # booking_router
+    {"name": "scheduling.get_day (conflict check, availability)", "collection": "bookings",
+     "filter": {"therapist_id": SAMPLE_ID,
+                "starts_at": {"$gte": SAMPLE_DAY, "$lt": SAMPLE_DAY + timedelta(days=1)},
+                "status": {"$in": ["pending", "confirmed", "in_progress"]}}},
+    {"name": "booking_router.get_my_bookings", "collection": "bookings",
+     "filter": {"client_id": SAMPLE_ID}, "sort": {"starts_at": -1}, "limit": 20},
+    {"name": "booking_router.get_my_bookings (status)", "collection": "bookings",
+     "filter": {"client_id": SAMPLE_ID, "status": "confirmed"},
+     "sort": {"starts_at": -1}, "limit": 20},
+    {"name": "booking_router.get_therapist_bookings", "collection": "bookings",
+     "filter": {"therapist_id": SAMPLE_ID}, "sort": {"starts_at": -1}, "limit": 20},
+    {"name": "booking_router.get_therapist_bookings (status)", "collection": "bookings",
+     "filter": {"therapist_id": SAMPLE_ID, "status": "pending"},
+     "sort": {"starts_at": -1}, "limit": 20},
+    {"name": "booking_router.get_booking", "collection": "bookings",
+     "filter": {"id": SAMPLE_ID}, "limit": 1},
+    {"name": "booking_router.create_review (existing review)", "collection": "reviews",
+     "filter": {"booking_id": SAMPLE_ID}, "limit": 1},
+
+    # therapist_router
+    {"name": "therapist_router.get_therapists", "collection": "therapists",
+     "filter": {"status": "approved", "is_available": True},
+     "sort": {"rating": -1}, "limit": 20},
+    {"name": "therapist_router.get_therapists (min_rating)", "collection": "therapists",
+     "filter": {"status": "approved", "is_available": True, "rating": {"$gte": 4}},
+     "sort": {"rating": -1}, "limit": 20},
+    {"name": "therapist_router.get_therapist", "collection": "therapists",
+     "filter": {"id": SAMPLE_ID}, "limit": 1},
+    {"name": "therapist_router.get_therapist_reviews", "collection": "reviews",
+     "filter": {"therapist_id": SAMPLE_ID}, "sort": {"created_at": -1}, "limit": 10},
+    {"name": "therapist_router.get_therapist_applications", "collection": "therapist_applications",
+     "filter": {"status": "pending"}, "sort": {"created_at": -1}, "limit": 20},
+
+    # service_router
+    {"name": "service_router.get_services", "collection": "services",
+     "filter": {"is_active": True}, "sort": {"name": 1}, "limit": 50},
+    {"name": "service_router.get_service", "collection": "services",
+     "filter": {"id": SAMPLE_ID}, "limit": 1},
+
+    # payment_router
+    {"name": "payment_router.create_payment_intent", "collection": "bookings",
+     "filter": {"id": SAMPLE_ID, "client_id": SAMPLE_ID}, "limit": 1},
+
+    # admin_router
+    {"name": "admin_router.get_all_users (role)", "collection": "users",
+     "filter": {"role": "client"}, "sort": {"created_at": -1}, "limit": 50},
+    {"name": "admin_router.get_all_bookings", "collection": "bookings",
+     "filter": {}, "sort": {"created_at": -1}, "limit": 50},
+    {"name": "admin_router.get_all_bookings (filters)", "collection": "bookings",
+     "filter": {"status": "confirmed", "payment_status": "paid",
+                "starts_at": {"$gte": SAMPLE_DAY, "$lt": SAMPLE_DAY + timedelta(days=30)}},
+     "sort": {"created_at": -1}, "limit": 50},
+    {"name": "admin_router.get_all_therapists (status)", "collection": "therapists",
+     "filter": {"status": "approved"}, "sort": {"created_at": -1}, "limit": 50},
+    {"name": "admin_router.get_admin_stats (revenue)", "collection": "bookings",
+     "filter": {"payment_status": "paid"}},
+    {"name": "admin_router.get_revenue_analytics", "collection": "bookings",
+     "filter": {"created_at": {"$gte": SAMPLE_DAY}, "payment_status": "paid"}},
+    {"name": "admin_router.get_popular_services", "collection": "bookings",
+     "pipeline": [
+         {"$match": {"status": {"$in": ["confirmed", "completed"]}}},
+         {"$group": {"_id": "$service_id", "total_bookings": {"$sum": 1}}},
+         {"$sort": {"total_bookings": -1}},
+         {"$limit": 10}
+     ]},
+]
+
+def _explain_command(shape: dict) -> dict:
+    if "pipeline" in shape:
+        return {"aggregate": shape["collection"], "pipeline": shape["pipeline"], "cursor": {}}
+
+    command = {"find": shape["collection"], "filter": shape["filter"]}
+    if shape.get("sort"):
+        command["sort"] = shape["sort"]
+    if shape.get("limit"):
+        command["limit"] = shape["limit"]
+    return command
+
+def _plan_stages(plan: Optional[dict]) -> List[str]:
+    """Flatten a (classic or SBE) plan tree into its stage names."""
+    if not plan:
+        return []
+    if "queryPlan" in plan:
+        plan = plan["queryPlan"]
+
+    stages = [plan.get("stage", "?")]
+    if "inputStage" in plan:
+        stages += _plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+def _unwrap(explain: dict) -> dict:
+    """Aggregate explains nest the find-layer plan under $cursor."""
+    if "stages" in explain:
+        for stage in explain["stages"]:
+            if "$cursor" in stage:
+                return stage["$cursor"]
+    return explain
+
+def analyze(shape: dict, explain: dict, max_ratio: float) -> dict:
+    """Turn an explain document into audit findings."""
+    explain = _unwrap(explain)
+    stages = _plan_stages(explain.get("queryPlanner", {}).get("winningPlan"))
+    stats = explain.get("executionStats", {})
+    returned = stats.get("nReturned", 0)
+    examined = stats.get("totalDocsExamined", 0)
+    ratio = examined / max(returned, 1)
+
+    findings = []
+    if "COLLSCAN" in stages:
+        findings.append("COLLSCAN")
+    if "SORT" in stages:
+        findings.append("IN_MEMORY_SORT")
+    if examined and ratio > max_ratio:
+        findings.append(f"EXAMINED_RATIO>{max_ratio:g}")
+
+    return {
+        "name": shape["name"],
+        "collection": shape["collection"],
+        "stages": stages,
+        "docs_examined": examined,
+        "keys_examined": stats.get("totalKeysExamined", 0),
+        "returned": returned,
+        "ratio": round(ratio, 2),
+        "findings": findings
+    }
+
+async def run(args) -> int:
+    client = create_client()
+    database = client[db_name]
+    shapes = [
+        shape for shape in QUERY_SHAPES
+        if not args.only or args.only in shape["name"] or args.only == shape["collection"]
+    ]
+
+    try:
+        explains = await asyncio.gather(*(
+            database.command({"explain": _explain_command(shape), "verbosity": "executionStats"})
+            for shape in shapes
+        ))
+    finally:
+        client.close()
+
+    results = [analyze(shape, explain, args.max_ratio) for shape, explain in zip(shapes, explains)]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            status = ", ".join(result["findings"]) or "ok"
+            print(f"{status:<28} {result['name']:<55} "
+                  f"{' > '.join(result['stages']):<40} "
+                  f"examined={result['docs_examined']} returned={result['returned']} ratio={result['ratio']}")
+
+    return 1 if any(result["findings"] for result in results) else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag collection scans and in-memory sorts in router queries.")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--only", help="restrict to shapes whose name contains this text, or a collection name")
+    parser.add_argument("--max-ratio", type=float, default=10.0,
+                        help="flag shapes examining more than this many docs per returned doc")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Recompute therapist calendar bitmaps from bookings.
+
+Usage:
+    python -m backend.tools.rebuild_calendars                        # from today on
+    python -m backend.tools.rebuild_calendars --since 2024-01-01
+    python -m backend.tools.rebuild_calendars --therapist-id <id>
+
+Busy slots are rebuilt from pending, confirmed and in-progress bookings, so
+the tool does not depend on tools/backfill_slot_reservations.py having run.
+Run it once after deploying calendars, and whenever bookings are changed
+outside the API. A booking made while it runs can lose its bits, so rerun it
+if bookings were being taken. Working-hours bitmaps are never stored.
+"""
+import argparse
+import asyncio
+import json
+from datetime import date
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / '.env')
+
+from ..database import create_client, db_name
+from ..services.calendars import calendar_service
+
+async def run(args) -> int:
+    client = create_client()
+    database = client[db_name]
+    try:
+        result = await calendar_service.rebuild(database, args.since, args.therapist_id)
+    finally:
+        client.close()
+
+    print(json.dumps(result, indent=2))
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild busy slot bitmaps in therapist_calendars from bookings.")
+    parser.add_argument("--since", type=date.fromisoformat, default=date.today(), help="first day rebuilt (YYYY-MM-DD)")
+    parser.add_argument("--therapist-id", action="append", help="limit the rebuild to these therapists")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Recompute therapist rating totals from the reviews collection.
+
+Usage:
+    python -m backend.tools.rebuild_ratings                  # every therapist
+    python -m backend.tools.rebuild_ratings --therapist-id <id>
+
+Run once after deploying running totals, and whenever reviews are edited or
+deleted outside the API. The counters are overwritten, not incremented, so
+stop review writes (e.g. maintenance mode) while it runs; until it has run,
+therapists with pre-existing reviews keep their old average.
+"""
+import argparse
+import asyncio
+import json
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / '.env')
+
+from ..database import create_client, db_name
+from ..services.ratings import rating_aggregator
+
+async def run(args) -> int:
+    client = create_client()
+    database = client[db_name]
+    try:
+        modified = await rating_aggregator.rebuild(database, args.therapist_id)
+    finally:
+        client.close()
+
+    print(json.dumps({"therapists_modified": modified}, indent=2))
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild rating_sum, reviews_count and rating_histogram in one aggregation.")
+    parser.add_argument("--therapist-id", action="append", help="limit the rebuild to these therapists")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Reconcile booking payment state with Stripe payment intents and refunds.
+
+Usage:
+    python -m backend.tools.reconcile_payments --days 7 --dry-run
+    python -m backend.tools.reconcile_payments --since 2024-01-01 --until 2024-02-01
+    python -m backend.tools.reconcile_payments --days 1 --report corrections.json
+
+Exits 1 when a dry run finds corrections.
+"""
+import argparse
+import asyncio
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / '.env')
+
+from ..database import create_client, db_name
+from ..services.payment_service import payment_service
+from ..services.payment_reconciler import payment_reconciler
+
+async def run(args) -> int:
+    if args.since:
+        since = datetime.fromisoformat(args.since)
+    else:
+        since = datetime.now() - timedelta(days=args.days)
+    until = datetime.fromisoformat(args.until) if args.until else None
+
+    client = create_client()
+    database = client[db_name]
+    try:
+        report = await payment_reconciler.reconcile(database, since, until, dry_run=args.dry_run)
+    finally:
+        client.close()
+        await payment_service.close()
+
+    diff = report.pop("diff")
+    if args.report:
+        Path(args.report).write_text(json.dumps(diff, indent=2, default=str))
+    else:
+        report["diff"] = diff
+    print(json.dumps(report, indent=2, default=str))
+    return 1 if diff and args.dry_run else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Page through Stripe and correct booking payment state in bulk.")
+    parser.add_argument("--since", help="window start (ISO date); defaults to --days ago")
+    parser.add_argument("--until", help="window end (ISO date, exclusive)")
+    parser.add_argument("--days", type=int, default=3, help="window length when --since is not given")
+    parser.add_argument("--dry-run", action="store_true", help="report corrections without writing")
+    parser.add_argument("--report", help="write the per-booking diff to this JSON file")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Sweep booking snapshots for user and service names that drifted.
+
+Usage:
+    python -m backend.tools.reconcile_snapshots          # one sweep, e.g. from cron
+    python -m backend.tools.reconcile_snapshots --loop   # sweep every SNAPSHOT_RECONCILE_INTERVAL_SECONDS
+
+API workers only apply the renames they queue themselves; run this from a
+single place so the full sweep happens once per interval, not once per
+worker. With --loop, sweeps start on a fixed wall-clock schedule: a slow
+sweep delays the next one only if it overruns the interval, and missed
+ticks are skipped rather than run back to back.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / '.env')
+
+from ..database import create_client, db_name
+from ..services.snapshot_reconciler import snapshot_reconciler
+
+SNAPSHOT_RECONCILE_INTERVAL_SECONDS = float(os.getenv('SNAPSHOT_RECONCILE_INTERVAL_SECONDS', 3600))
+
+async def run(args) -> int:
+    client = create_client()
+    database = client[db_name]
+    try:
+        next_sweep = time.time()
+        while True:
+            started = time.time()
+            updated = await snapshot_reconciler.sweep(database)
+            print(json.dumps({"updated": updated, "seconds": round(time.time() - started, 1)}), flush=True)
+            if not args.loop:
+                return 0
+
+            # Next tick on the wall-clock grid, skipping any the sweep overran
+            while next_sweep <= time.time():
+                next_sweep += args.interval
+            await asyncio.sleep(next_sweep - time.time())
+    finally:
+        client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile booking display snapshots with current names.")
+    parser.add_argument("--loop", action="store_true", help="keep sweeping on a wall-clock schedule")
+    parser.add_argument("--interval", type=float, default=SNAPSHOT_RECONCILE_INTERVAL_SECONDS,
+                        help="seconds between sweep starts with --loop")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Rebuild booking payment state from the Stripe webhook event log.
+
+Usage:
+    python -m backend.tools.replay_payment_events --dry-run
+    python -m backend.tools.replay_payment_events --since 2024-01-01
+    python -m backend.tools.replay_payment_events --booking-id <id> --booking-id <id>
+"""
+import argparse
+import asyncio
+import json
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / '.env')
+
+from ..database import create_client, db_name
+from ..services.payment_events import payment_event_processor
+
+async def run(args) -> int:
+    client = create_client()
+    database = client[db_name]
+    try:
+        report = await payment_event_processor.replay(
+            database,
+            since=datetime.fromisoformat(args.since) if args.since else None,
+            booking_ids=args.booking_id,
+            dry_run=args.dry_run
+        )
+    finally:
+        client.close()
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay logged Stripe events onto bookings with bulk writes.")
+    parser.add_argument("--since", help="only replay events created at or after this ISO date")
+    parser.add_argument("--booking-id", action="append", help="limit the replay to these bookings")
+    parser.add_argument("--dry-run", action="store_true", help="count events and bookings without writing")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
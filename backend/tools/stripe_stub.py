@@ -0,0 +1,167 @@
+"""Local stand-in for the Stripe endpoints the payment service calls.
+
+Honors Idempotency-Key like Stripe (same key, same response), with optional
+latency, so payment flows can be load-tested without network:
+
+    python -m backend.tools.stripe_stub --port 12111 --latency-ms 200
+    STRIPE_API_BASE_URL=http://127.0.0.1:12111 ...
+
+stripe-mock (https://github.com/stripe/stripe-mock) works as well.
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from typing import Dict, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import uvicorn
+
+def _nest(form) -> dict:
+    """Decode Stripe's form encoding (metadata[booking_id]=...) into dicts."""
+    result = {}
+    for key, value in form.multi_items():
+        parts = key.replace("]", "").split("[")
+        target = result
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return result
+
+def _error(message: str, status_code: int = 404) -> JSONResponse:
+    return JSONResponse({"error": {"type": "invalid_request_error", "message": message}}, status_code=status_code)
+
+def create_app(latency_ms: float = 0) -> FastAPI:
+    app = FastAPI(title="Stripe stub")
+    payment_intents: Dict[str, dict] = {}
+    refunds: Dict[str, dict] = {}
+    idempotent: Dict[str, dict] = {}
+
+    async def replay(request: Request) -> Optional[dict]:
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        return idempotent.get(request.headers.get("idempotency-key"))
+
+    def remember(request: Request, body: dict) -> dict:
+        key = request.headers.get("idempotency-key")
+        if key:
+            idempotent[key] = body
+        return body
+
+    async def listing(request: Request, objects: Dict[str, dict], url: str) -> dict:
+        # Newest first, paged with starting_after, filtered on created[gte|lt]
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        params = _nest(request.query_params)
+        created = params.get("created", {})
+        matches = [
+            item for item in reversed(list(objects.values()))
+            if ("gte" not in created or item["created"] >= int(created["gte"]))
+            and ("lt" not in created or item["created"] < int(created["lt"]))
+        ]
+        if "starting_after" in params:
+            ids = [item["id"] for item in matches]
+            start = ids.index(params["starting_after"]) + 1 if params["starting_after"] in ids else len(ids)
+            matches = matches[start:]
+        limit = int(params.get("limit", 10))
+        return {"object": "list", "url": url, "data": matches[:limit], "has_more": len(matches) > limit}
+
+    @app.post("/v1/payment_intents")
+    async def create_payment_intent(request: Request):
+        previous = await replay(request)
+        if previous is not None:
+            return previous
+        params = _nest(await request.form())
+        intent_id = f"pi_{uuid.uuid4().hex[:24]}"
+        intent = {
+            "id": intent_id,
+            "object": "payment_intent",
+            "amount": int(params["amount"]),
+            "amount_received": 0,
+            "currency": params.get("currency", "usd"),
+            "client_secret": f"{intent_id}_secret_{uuid.uuid4().hex[:24]}",
+            "status": "requires_payment_method",
+            "metadata": params.get("metadata", {}),
+            "created": int(time.time()),
+            "livemode": False
+        }
+        payment_intents[intent_id] = intent
+        return remember(request, intent)
+
+    @app.get("/v1/payment_intents/{intent_id}")
+    async def retrieve_payment_intent(intent_id: str):
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        if intent_id not in payment_intents:
+            return _error(f"No such payment_intent: '{intent_id}'")
+        return payment_intents[intent_id]
+
+    @app.post("/v1/payment_intents/{intent_id}")
+    async def update_payment_intent(intent_id: str, request: Request):
+        previous = await replay(request)
+        if previous is not None:
+            return previous
+        if intent_id not in payment_intents:
+            return _error(f"No such payment_intent: '{intent_id}'")
+        params = _nest(await request.form())
+        intent = payment_intents[intent_id]
+        if "amount" in params:
+            intent["amount"] = int(params["amount"])
+        intent["metadata"].update(params.get("metadata", {}))
+        return remember(request, intent)
+
+    @app.post("/v1/payment_intents/{intent_id}/confirm")
+    async def confirm_payment_intent(intent_id: str, request: Request):
+        previous = await replay(request)
+        if previous is not None:
+            return previous
+        if intent_id not in payment_intents:
+            return _error(f"No such payment_intent: '{intent_id}'")
+        intent = payment_intents[intent_id]
+        intent["status"] = "succeeded"
+        intent["amount_received"] = intent["amount"]
+        return remember(request, intent)
+
+    @app.post("/v1/refunds")
+    async def create_refund(request: Request):
+        previous = await replay(request)
+        if previous is not None:
+            return previous
+        params = _nest(await request.form())
+        intent = payment_intents.get(params.get("payment_intent"))
+        if intent is None:
+            return _error(f"No such payment_intent: '{params.get('payment_intent')}'")
+        refund = {
+            "id": f"re_{uuid.uuid4().hex[:24]}",
+            "object": "refund",
+            "amount": int(params.get("amount", intent["amount"])),
+            "currency": intent["currency"],
+            "payment_intent": intent["id"],
+            "reason": params.get("reason"),
+            "status": "succeeded",
+            "metadata": params.get("metadata", {}),
+            "created": int(time.time())
+        }
+        refunds[refund["id"]] = refund
+        return remember(request, refund)
+
+    @app.get("/v1/payment_intents")
+    async def list_payment_intents(request: Request):
+        return await listing(request, payment_intents, "/v1/payment_intents")
+
+    @app.get("/v1/refunds")
+    async def list_refunds(request: Request):
+        return await listing(request, refunds, "/v1/refunds")
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve stub Stripe payment intent and refund endpoints.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay before every response")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency_ms), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Report or fix drift between the declared indexes and the database.
+
+Usage:
+    python -m backend.tools.sync_indexes                 # report only
+    python -m backend.tools.sync_indexes --apply         # create missing indexes
+    python -m backend.tools.sync_indexes --apply --drop-extra --drop-changed
+"""
+import argparse
+import asyncio
+import json
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / '.env')
+
+from ..database import create_client, db_name
+from ..indexes import diff_indexes, sync_indexes
+
+async def run(args) -> int:
+    client = create_client()
+    database = client[db_name]
+    try:
+        if args.apply:
+            diffs = await sync_indexes(
+                database,
+                drop_extra=args.drop_extra,
+                drop_changed=args.drop_changed
+            )
+        else:
+            diffs = await diff_indexes(database)
+    finally:
+        client.close()
+
+    print(json.dumps(diffs, indent=2))
+    drift = any(diff["missing"] or diff["extra"] or diff["changed"] for diff in diffs.values())
+    return 1 if drift and not args.apply else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff or sync MongoDB indexes against INDEX_SPECS.")
+    parser.add_argument("--apply", action="store_true", help="create missing indexes")
+    parser.add_argument("--drop-extra", action="store_true", help="with --apply, drop indexes not in the spec")
+    parser.add_argument("--drop-changed", action="store_true", help="with --apply, recreate indexes whose options differ")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
@@ -31,6 +31,7 @@ export const AuthProvider = ({ children }) => {
     } catch (error) {
       console.error('Auth check failed:', error);
       Cookies.remove('access_token');
+      Cookies.remove('refresh_token');
     } finally {
       setLoading(false);
     }
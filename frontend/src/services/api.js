@@ -21,12 +21,61 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+const storeTokens = (data) => {
+  if (data.access_token) {
+    Cookies.set('access_token', data.access_token, { expires: 7 });
+  }
+  if (data.refresh_token) {
+    Cookies.set('refresh_token', data.refresh_token, { expires: 14 });
+  }
+};
+
+const clearTokens = () => {
+  Cookies.remove('access_token');
+  Cookies.remove('refresh_token');
+};
+
+// Refresh tokens are single-use, so concurrent 401s share one refresh call
+// (other tabs refreshing at the same moment get the same token back from the server)
+let refreshPromise = null;
+
+const refreshAccessToken = () => {
+  if (!refreshPromise) {
+    const refreshToken = Cookies.get('refresh_token');
+    refreshPromise = axios
+      .post(`${API_BASE}/auth/refresh`, { refresh_token: refreshToken })
+      .then((response) => {
+        storeTokens(response.data);
+        return response.data.access_token;
+      })
+      .finally(() => {
+        refreshPromise = null;
+      });
+  }
+  return refreshPromise;
+};
+
 // Handle token expiration
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
-    if (error.response?.status === 401) {
-      Cookies.remove('access_token');
+  async (error) => {
+    const originalRequest = error.config;
+    const isLoginCall = originalRequest?.url?.startsWith('/auth/login');
+
+    if (error.response?.status === 401 && originalRequest && !originalRequest._retry && !isLoginCall) {
+      originalRequest._retry = true;
+
+      if (Cookies.get('refresh_token')) {
+        try {
+          const accessToken = await refreshAccessToken();
+          originalRequest.headers.Authorization = `Bearer ${accessToken}`;
+          return api(originalRequest);
+        } catch (refreshError) {
+          // Fall through to the login redirect below
+        }
+      }
+
+      clearTokens();
       window.location.href = '/login';
     }
     return Promise.reject(error);
@@ -42,14 +91,16 @@ export const authAPI = {
 
   login: async (credentials) => {
     const response = await api.post('/auth/login', credentials);
-    if (response.data.access_token) {
-      Cookies.set('access_token', response.data.access_token, { expires: 7 });
-    }
+    storeTokens(response.data);
     return response.data;
   },
 
   logout: () => {
-    Cookies.remove('access_token');
+    const refreshToken = Cookies.get('refresh_token');
+    if (refreshToken) {
+      api.post('/auth/logout', { refresh_token: refreshToken }).catch(() => {});
+    }
+    clearTokens();
   },
 
   getCurrentUser: async () => {
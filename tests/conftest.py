@@ -0,0 +1,140 @@
+"""Shared fixtures: the API running on the in-memory storage backend."""
+import asyncio
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+import pytest
+import stripe
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / "backend" / ".env")
+# Settings are read at import time, so they are pinned before the app loads
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ["REFRESH_TOKEN_STORE"] = "memory"
+
+from fastapi.testclient import TestClient
+from backend import server
+from backend.database import db
+from backend.services.payment_service import payment_service
+
+PASSWORD = "secret123"
+
+@pytest.fixture
+def client():
+    """App client; each test starts on an empty in-memory database."""
+    with TestClient(server.app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def register(client):
+    """Register and log in a user; returns (user_id, auth headers, login body)."""
+    def register_user(role: str = "client"):
+        email = f"{role}-{uuid.uuid4().hex[:12]}@example.com"
+        response = client.post("/api/auth/register", json={
+            "email": email, "password": PASSWORD, "full_name": f"Test {role.title()}",
+            "phone": f"+1555{uuid.uuid4().int % 10**7:07d}", "role": role
+        })
+        assert response.status_code == 200, response.text
+        login = client.post("/api/auth/login", json={"email": email, "password": PASSWORD}).json()
+        return response.json()["id"], {"Authorization": f"Bearer {login['access_token']}"}, login
+    return register_user
+
+@pytest.fixture
+def make_therapist(client, register):
+    """Create approved therapists: each call returns (therapist_id, user_id, auth headers)."""
+    def make():
+        user_id, headers, _ = register("therapist")
+        therapist_id = f"therapist-{uuid.uuid4().hex[:12]}"
+        now = datetime.utcnow()
+        client.portal.call(db.database.therapists.insert_one, {
+            "id": therapist_id, "user_id": user_id, "status": "approved", "is_available": True,
+            "license_number": "L-1", "specialties": ["swedish"], "experience_years": 5,
+            "certifications": [], "service_areas": ["Cape Town"], "hourly_rate": 100.0,
+            "languages": ["en"], "rating": 0.0, "reviews_count": 0, "total_bookings": 0,
+            "gallery_images": [], "created_at": now, "updated_at": now
+        })
+        return therapist_id, user_id, headers
+    return make
+
+@pytest.fixture
+def therapist(make_therapist):
+    """An approved therapist: (therapist_id, user_id, auth headers)."""
+    return make_therapist()
+
+@pytest.fixture
+def admin(client, register):
+    """Auth headers of an admin (roles can't be chosen at registration)."""
+    user_id, headers, _ = register("client")
+    client.portal.call(db.database.users.update_one, {"id": user_id}, {"$set": {"role": "admin"}})
+    return headers
+
+class FakePaymentIntents:
+    """Stripe's payment_intents API, answering repeated idempotency keys from memory."""
+
+    def __init__(self):
+        self.intents = {}
+        self.by_key = {}
+
+    async def create_async(self, params: dict, options: dict):
+        key = options["idempotency_key"]
+        if key not in self.by_key:
+            intent_id = f"pi_{len(self.intents) + 1}"
+            self.intents[intent_id] = SimpleNamespace(
+                id=intent_id, client_secret=f"{intent_id}_secret", status="requires_payment_method",
+                amount=params["amount"], currency=params["currency"]
+            )
+            self.by_key[key] = intent_id
+        return self.intents[self.by_key[key]]
+
+    async def retrieve_async(self, intent_id: str):
+        return self.intents[intent_id]
+
+class FakeRefunds:
+    """Stripe's refunds API; intents listed in `declined` raise a Stripe error."""
+
+    def __init__(self):
+        self.refunds = {}
+        self.by_key = {}
+        self.declined = set()
+
+    async def create_async(self, params: dict, options: dict):
+        if params["payment_intent"] in self.declined:
+            raise stripe.error.InvalidRequestError("Charge has already been refunded", "payment_intent")
+        key = options["idempotency_key"]
+        if key not in self.by_key:
+            refund_id = f"re_{len(self.refunds) + 1}"
+            self.refunds[refund_id] = SimpleNamespace(id=refund_id, amount=8000, payment_intent=params["payment_intent"])
+            self.by_key[key] = refund_id
+        return self.refunds[self.by_key[key]]
+
+@pytest.fixture
+def stripe_api(client, monkeypatch):
+    """An in-memory Stripe client behind payment_service."""
+    api = SimpleNamespace(payment_intents=FakePaymentIntents(), refunds=FakeRefunds())
+    monkeypatch.setattr(payment_service, "_get_client", lambda: SimpleNamespace(v1=api))
+    monkeypatch.setattr(payment_service, "semaphore", asyncio.Semaphore(1))
+    payment_service.intent_cache.clear()
+    return api
+
+def booking_body(therapist_id: str, day: str = "2030-01-02", at: str = "10:00:00", duration: int = 60) -> dict:
+    return {
+        "client_id": "ignored", "therapist_id": therapist_id, "service_id": "swedish-massage",
+        "appointment_date": day, "appointment_time": at, "duration_minutes": duration,
+        "location_address": "1 Long St", "location_city": "Cape Town",
+        "location_state": "WC", "location_zip": "8001"
+    }
+
+def booking_document(client_id: str, therapist_id: str, at: str = "10:00:00", **fields) -> dict:
+    """A booking as stored on 2030-01-02, for inserting without the API."""
+    now = datetime.utcnow()
+    return {
+        "id": str(uuid.uuid4()), "client_id": client_id, "therapist_id": therapist_id,
+        "service_id": "swedish-massage", "appointment_date": datetime(2030, 1, 2),
+        "appointment_time": at, "duration_minutes": 60,
+        "location_address": "1 Long St", "location_city": "Cape Town",
+        "location_state": "WC", "location_zip": "8001",
+        "status": "pending", "payment_status": "pending", "total_amount": 100.0,
+        "created_at": now, "updated_at": now, **fields
+    }
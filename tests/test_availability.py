@@ -0,0 +1,42 @@
+"""Availability search over therapists' calendars."""
+from .conftest import booking_body
+
+def search(client, **params):
+    return client.get("/api/therapists/availability/search", params={"date": "2030-01-02", **params})
+
+def times_for(response, therapist_id: str) -> dict:
+    for match in response.json()["matches"]:
+        if match["therapist"]["id"] == therapist_id:
+            return {day["date"]: day["times"] for day in match["available"]}
+    return {}
+
+def test_booked_start_times_drop_out(client, register, therapist):
+    therapist_id, _, _ = therapist
+    _, headers, _ = register()
+    before = times_for(search(client), therapist_id)["2030-01-02"]
+    assert "10:00" in before
+
+    assert client.post("/api/bookings/", json=booking_body(therapist_id), headers=headers).status_code == 200
+    after = times_for(search(client), therapist_id)["2030-01-02"]
+
+    # 10:00-11:00 plus the travel buffer blocks 09:00 through 11:00 starts
+    assert {"09:00", "10:00", "11:00"}.isdisjoint(after)
+    assert set(after) == set(before) - {"09:00", "10:00", "11:00"}
+
+def test_single_time_search(client, therapist):
+    therapist_id, _, _ = therapist
+
+    response = search(client, time="14:15", days=2)
+
+    assert response.status_code == 200, response.text
+    assert times_for(response, therapist_id) == {"2030-01-02": ["14:15"], "2030-01-03": ["14:15"]}
+
+def test_off_grid_time_is_rejected(client, therapist):
+    response = search(client, time="14:10")
+
+    assert response.status_code == 400
+    assert "multiples of 15" in response.json()["detail"]
+
+def test_off_grid_step_is_rejected(client, therapist):
+    assert search(client, step_minutes=20).status_code == 400
+    assert search(client, step_minutes=30).status_code == 200
@@ -0,0 +1,128 @@
+"""Racing status changes: exactly one wins, and refunds never undo a completion."""
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+import httpx
+import pytest
+from backend import server
+from backend.database import db
+from backend.services.payment_reconciler import payment_reconciler
+from backend.services.payment_service import payment_service
+from .conftest import booking_body
+
+@pytest.fixture
+def paid_booking(client, register, therapist):
+    """A confirmed, paid booking: (booking id, client headers, therapist headers)."""
+    therapist_id, _, therapist_headers = therapist
+    _, headers, _ = register()
+    booking_id = client.post("/api/bookings/", json=booking_body(therapist_id), headers=headers).json()["id"]
+    client.portal.call(db.database.bookings.update_one, {"id": booking_id}, {"$set": {
+        "status": "confirmed", "payment_status": "paid", "stripe_payment_intent_id": f"pi_{booking_id}"
+    }})
+    return booking_id, headers, therapist_headers
+
+@pytest.fixture
+def stripe_refunds(monkeypatch):
+    refunded = []
+
+    async def create_refund(booking_id, payment_intent_id, metadata):
+        refunded.append(booking_id)
+        # Yield like a network call, so racing requests interleave here
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(id=f"re_{booking_id}", amount=8000)
+
+    monkeypatch.setattr(payment_service, "create_refund", create_refund)
+    return refunded
+
+def race(client, *requests):
+    """Send (method, url, headers) requests concurrently; returns the responses."""
+    async def send():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(*(http.request(method, url, headers=headers) for method, url, headers in requests))
+    return client.portal.call(send)
+
+def stored(client, booking_id: str) -> dict:
+    return client.portal.call(db.database.bookings.find_one, {"id": booking_id})
+
+def test_complete_and_cancel_race_has_one_winner(client, paid_booking):
+    booking_id, headers, therapist_headers = paid_booking
+
+    completed, cancelled = race(
+        client,
+        ("PUT", f"/api/bookings/{booking_id}/complete", therapist_headers),
+        ("PUT", f"/api/bookings/{booking_id}/cancel?reason=plans", headers)
+    )
+
+    assert sorted([completed.status_code, cancelled.status_code]) == [200, 409]
+    winner = "completed" if completed.status_code == 200 else "cancelled"
+    assert stored(client, booking_id)["status"] == winner
+
+def test_refund_racing_completion_keeps_the_completion(client, paid_booking, stripe_refunds):
+    booking_id, headers, therapist_headers = paid_booking
+
+    refund, completed = race(
+        client,
+        ("POST", f"/api/payments/refund/{booking_id}?reason=late", headers),
+        ("PUT", f"/api/bookings/{booking_id}/complete", therapist_headers)
+    )
+
+    assert refund.status_code == 200, refund.text
+    after = stored(client, booking_id)
+    assert after["payment_status"] == "refunded"
+    # Completion lands while Stripe refunds; the refund must not overwrite it
+    assert completed.status_code == 200, completed.text
+    assert after["status"] == "completed"
+
+def test_refund_of_upcoming_booking_cancels_it_and_frees_slots(client, paid_booking, stripe_refunds):
+    booking_id, headers, _ = paid_booking
+
+    response = client.post(f"/api/payments/refund/{booking_id}?reason=sick", headers=headers)
+
+    assert response.status_code == 200, response.text
+    after = stored(client, booking_id)
+    assert (after["payment_status"], after["status"]) == ("refunded", "cancelled")
+    assert client.portal.call(db.database.slot_reservations.count_documents, {"booking_id": booking_id}) == 0
+
+def test_bulk_refund_leaves_completed_bookings_completed(client, register, therapist, admin, stripe_refunds):
+    therapist_id, _, therapist_headers = therapist
+    _, headers, _ = register()
+    ids = [
+        client.post("/api/bookings/", json=booking_body(therapist_id, at=at), headers=headers).json()["id"]
+        for at in ("09:00:00", "12:00:00")
+    ]
+    client.portal.call(db.database.bookings.update_many, {"id": {"$in": ids}}, {"$set": {
+        "status": "confirmed", "payment_status": "paid", "stripe_payment_intent_id": "pi_bulk"
+    }})
+    assert client.put(f"/api/bookings/{ids[0]}/complete", headers=therapist_headers).status_code == 200
+
+    response = client.post("/api/payments/refunds/bulk", json={"booking_ids": ids, "reason": "storm"}, headers=admin)
+
+    assert response.status_code == 200, response.text
+    assert response.json()["refunded"] == 2
+    completed, upcoming = (stored(client, booking_id) for booking_id in ids)
+    assert (completed["payment_status"], completed["status"]) == ("refunded", "completed")
+    assert (upcoming["payment_status"], upcoming["status"]) == ("refunded", "cancelled")
+    assert client.portal.call(db.database.slot_reservations.count_documents, {"booking_id": ids[1]}) == 0
+
+def test_reconciled_refund_does_not_cancel_a_completed_booking(client, paid_booking, monkeypatch):
+    booking_id, _, therapist_headers = paid_booking
+    assert client.put(f"/api/bookings/{booking_id}/complete", headers=therapist_headers).status_code == 200
+    intent_id = f"pi_{booking_id}"
+    stripe_objects = {
+        "payment_intents": [SimpleNamespace(id=intent_id, status="succeeded", metadata=None)],
+        "refunds": [SimpleNamespace(id="re_1", status="succeeded", payment_intent=intent_id, metadata=None)]
+    }
+
+    async def pages(resource, params):
+        yield stripe_objects[resource]
+
+    monkeypatch.setattr(payment_reconciler, "_pages", pages)
+    report = client.portal.call(lambda: payment_reconciler.reconcile(db.database, datetime(2020, 1, 1)))
+
+    assert report["diff"] == [{
+        "booking_id": booking_id, "source": "refund:re_1",
+        "from": {"payment_status": "paid"}, "to": {"payment_status": "refunded"}
+    }]
+    after = stored(client, booking_id)
+    assert (after["payment_status"], after["status"]) == ("refunded", "completed")
@@ -0,0 +1,97 @@
+"""Appointment times stored as UTC starts_at/ends_at, and the legacy backfill."""
+from argparse import Namespace
+from datetime import datetime
+import pytest
+from backend.database import db
+from backend.tools import backfill_booking_times
+from .conftest import booking_body
+
+@pytest.fixture
+def legacy_booking(client, register, therapist, monkeypatch):
+    """Create a booking, then store it the way it was before starts_at existed."""
+    therapist_id, _, _ = therapist
+    _, headers, _ = register()
+    monkeypatch.setattr(backfill_booking_times, "create_client", lambda: db.client)
+
+    def make(day: str = "2030-01-02", at: str = "10:00:00") -> str:
+        booking_id = client.post("/api/bookings/", json=booking_body(therapist_id, day=day, at=at), headers=headers).json()["id"]
+        client.portal.call(db.database.bookings.update_one, {"id": booking_id}, {
+            "$set": {"appointment_date": datetime.fromisoformat(day), "appointment_time": at},
+            "$unset": {"starts_at": "", "ends_at": "", "timezone": ""}
+        })
+        return booking_id
+    make.headers = headers
+    return make
+
+def backfill(client, timezone: str = "UTC", keep_legacy_fields: bool = False, dry_run: bool = False) -> int:
+    args = Namespace(batch_size=2, timezone=timezone, keep_legacy_fields=keep_legacy_fields, dry_run=dry_run)
+    return client.portal.call(backfill_booking_times.run, args)
+
+def stored(client, booking_id: str) -> dict:
+    return client.portal.call(db.database.bookings.find_one, {"id": booking_id})
+
+def test_new_bookings_store_utc_start_and_end(client, register, therapist):
+    therapist_id, _, _ = therapist
+    _, headers, _ = register()
+
+    response = client.post("/api/bookings/", json=booking_body(therapist_id, duration=90), headers=headers)
+
+    document = stored(client, response.json()["id"])
+    assert (document["starts_at"], document["ends_at"]) == (datetime(2030, 1, 2, 10, 0), datetime(2030, 1, 2, 11, 30))
+    assert document["timezone"] == "UTC"
+    assert "appointment_date" not in document
+    assert (response.json()["appointment_date"], response.json()["appointment_time"]) == ("2030-01-02", "10:00:00")
+
+def test_backfill_converts_local_times_in_the_given_zone(client, legacy_booking):
+    winter = legacy_booking()
+    summer = legacy_booking(day="2030-07-01")
+
+    assert backfill(client, "America/New_York") == 0
+
+    # EST is UTC-5, EDT UTC-4
+    assert stored(client, winter)["starts_at"] == datetime(2030, 1, 2, 15, 0)
+    assert stored(client, summer)["starts_at"] == datetime(2030, 7, 1, 14, 0)
+    document = stored(client, winter)
+    assert document["ends_at"] == datetime(2030, 1, 2, 16, 0)
+    assert document["timezone"] == "America/New_York"
+    assert "appointment_date" not in document and "appointment_time" not in document
+
+    # Read back in the booking's own zone
+    response = client.get(f"/api/bookings/{winter}", headers=legacy_booking.headers)
+    assert (response.json()["appointment_date"], response.json()["appointment_time"]) == ("2030-01-02", "10:00:00")
+
+def test_unconverted_bookings_still_read_from_legacy_fields(client, legacy_booking):
+    booking_id = legacy_booking(at="14:30:00")
+
+    response = client.get(f"/api/bookings/{booking_id}", headers=legacy_booking.headers)
+
+    assert response.status_code == 200, response.text
+    assert (response.json()["appointment_date"], response.json()["appointment_time"]) == ("2030-01-02", "14:30:00")
+
+def test_backfill_is_rerunnable_and_dry_run_writes_nothing(client, legacy_booking, capsys):
+    ids = [legacy_booking(at=at) for at in ("09:00:00", "12:00:00", "15:00:00")]
+
+    backfill(client, "Africa/Johannesburg", dry_run=True)
+    assert all("starts_at" not in stored(client, booking_id) for booking_id in ids)
+
+    backfill(client, "Africa/Johannesburg", keep_legacy_fields=True)
+    first = {booking_id: stored(client, booking_id)["starts_at"] for booking_id in ids}
+    backfill(client, "UTC")
+
+    # SAST is UTC+2; the UTC rerun found nothing left to convert
+    assert first == {
+        ids[0]: datetime(2030, 1, 2, 7, 0), ids[1]: datetime(2030, 1, 2, 10, 0), ids[2]: datetime(2030, 1, 2, 13, 0)
+    }
+    assert {booking_id: stored(client, booking_id)["starts_at"] for booking_id in ids} == first
+    assert stored(client, ids[0])["appointment_time"] == "09:00:00"
+    output = capsys.readouterr().out
+    assert '"converted": 3' in output and '"bookings": 0' in output
+
+def test_backfill_reports_bookings_it_cannot_convert(client, legacy_booking):
+    good = legacy_booking()
+    broken = legacy_booking(at="12:00:00")
+    client.portal.call(db.database.bookings.update_one, {"id": broken}, {"$unset": {"appointment_time": ""}})
+
+    assert backfill(client) == 1
+    assert stored(client, good)["starts_at"] == datetime(2030, 1, 2, 10, 0)
+    assert "starts_at" not in stored(client, broken)
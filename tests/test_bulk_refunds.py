@@ -0,0 +1,92 @@
+"""Admin bulk refunds: per-booking results and status handling."""
+import pytest
+from backend.database import db
+from backend.routers import payment_router
+from .conftest import booking_body
+
+@pytest.fixture
+def paid_bookings(client, register, therapist):
+    """Create paid bookings at the given times: returns their ids."""
+    therapist_id, _, _ = therapist
+    _, headers, _ = register()
+
+    def make(*times: str, **fields) -> list:
+        ids = []
+        for at in times:
+            response = client.post("/api/bookings/", json=booking_body(therapist_id, at=at), headers=headers)
+            assert response.status_code == 200, response.text
+            booking_id = response.json()["id"]
+            client.portal.call(db.database.bookings.update_one, {"id": booking_id}, {"$set": {
+                "status": "confirmed", "payment_status": "paid", "stripe_payment_intent_id": f"pi_{booking_id}", **fields
+            }})
+            ids.append(booking_id)
+        return ids
+    make.therapist_id = therapist_id
+    return make
+
+def bulk_refund(client, admin, **body):
+    return client.post("/api/payments/refunds/bulk", json={"reason": "therapist unavailable", **body}, headers=admin)
+
+def stored(client, booking_id: str) -> dict:
+    return client.portal.call(db.database.bookings.find_one, {"id": booking_id})
+
+def held_slots(client, booking_id: str) -> int:
+    return client.portal.call(db.database.slot_reservations.count_documents, {"booking_id": booking_id})
+
+def test_results_are_reported_per_booking(client, admin, paid_bookings, stripe_api):
+    refunded, unpaid, declined = paid_bookings("09:00:00", "11:00:00", "13:00:00")
+    client.portal.call(db.database.bookings.update_one, {"id": unpaid}, {"$set": {"payment_status": "pending"}})
+    stripe_api.refunds.declined.add(f"pi_{declined}")
+
+    response = bulk_refund(client, admin, booking_ids=[refunded, unpaid, declined, "missing"])
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert (body["refunded"], body["skipped"], body["failed"]) == (1, 2, 1)
+    results = {result["booking_id"]: result for result in body["results"]}
+    assert (results[refunded]["status"], results[refunded]["amount"]) == ("refunded", 80.0)
+    assert (results[unpaid]["status"], results[unpaid]["detail"]) == ("skipped", "Booking is not paid")
+    assert (results["missing"]["status"], results["missing"]["detail"]) == ("skipped", "Booking not found")
+    assert results[declined]["status"] == "failed"
+    assert "already been refunded" in results[declined]["detail"]
+
+    after = stored(client, refunded)
+    assert (after["payment_status"], after["status"]) == ("refunded", "cancelled")
+    assert held_slots(client, refunded) == 0
+    # Bookings that were not refunded keep their payment and slots
+    assert stored(client, declined)["payment_status"] == "paid"
+    assert held_slots(client, declined) == held_slots(client, unpaid) == 6
+
+def test_completed_booking_is_only_marked_refunded(client, admin, paid_bookings, stripe_api):
+    [completed] = paid_bookings("09:00:00", status="completed")
+
+    response = bulk_refund(client, admin, booking_ids=[completed])
+
+    assert response.json()["refunded"] == 1
+    after = stored(client, completed)
+    assert (after["payment_status"], after["status"]) == ("refunded", "completed")
+
+def test_therapist_day_is_refunded_by_date(client, admin, paid_bookings, stripe_api):
+    ids = paid_bookings("09:00:00", "15:00:00")
+
+    response = bulk_refund(client, admin, therapist_id=paid_bookings.therapist_id, date_from="2030-01-02")
+
+    assert response.json()["refunded"] == 2
+    assert {stored(client, booking_id)["status"] for booking_id in ids} == {"cancelled"}
+    assert len(stripe_api.refunds.refunds) == 2
+
+def test_too_many_bookings_are_rejected_before_refunding(client, admin, paid_bookings, stripe_api, monkeypatch):
+    monkeypatch.setattr(payment_router, "BULK_REFUND_MAX_BOOKINGS", 2)
+    ids = paid_bookings("09:00:00", "11:00:00", "13:00:00")
+
+    response = bulk_refund(client, admin, booking_ids=ids)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "At most 2 bookings can be refunded at once"
+    assert stripe_api.refunds.refunds == {}
+    assert {stored(client, booking_id)["payment_status"] for booking_id in ids} == {"paid"}
+
+def test_bulk_refund_is_admin_only(client, register, paid_bookings, stripe_api):
+    _, headers, _ = register()
+
+    assert bulk_refund(client, headers, booking_ids=paid_bookings("09:00:00")).status_code == 403
@@ -0,0 +1,80 @@
+"""Therapist calendars: read-only availability and rebuilds from bookings."""
+from datetime import date, datetime
+from backend.database import db
+from backend.services.calendars import calendar_service
+from .conftest import booking_body
+
+# 2030-01-02 is a Wednesday
+DAY = "2030-01-02"
+
+def available_times(client, therapist_id: str, day: str = DAY) -> list:
+    response = client.get("/api/therapists/availability/search", params={"date": day})
+    assert response.status_code == 200, response.text
+    for match in response.json()["matches"]:
+        if match["therapist"]["id"] == therapist_id:
+            return match["available"][0]["times"]
+    return []
+
+def calendar_count(client) -> int:
+    return client.portal.call(db.database.therapist_calendars.count_documents, {})
+
+def test_search_does_not_write_calendars(client, make_therapist):
+    for _ in range(3):
+        make_therapist()
+
+    response = client.get("/api/therapists/availability/search", params={"date": DAY, "days": 14})
+
+    assert response.status_code == 200
+    assert response.json()["searched"] >= 3
+    assert calendar_count(client) == 0
+
+def test_working_hours_change_is_seen_on_next_read(client, therapist):
+    therapist_id, _, headers = therapist
+    assert available_times(client, therapist_id)[0] == "09:00"
+
+    response = client.put("/api/therapists/me/working-hours", json={
+        "weekly": {"wednesday": [{"start": "13:00", "end": "17:00"}]},
+        "exceptions": {"2030-01-09": []}
+    }, headers=headers)
+
+    assert response.status_code == 200, response.text
+    assert available_times(client, therapist_id) == ["13:00", "14:00", "15:00", "16:00"]
+    assert available_times(client, therapist_id, "2030-01-09") == []
+    assert calendar_count(client) == 0
+
+def test_rebuild_uses_bookings_not_reservations(client, register, therapist):
+    therapist_id, _, _ = therapist
+    _, headers, _ = register()
+    client.post("/api/bookings/", json=booking_body(therapist_id), headers=headers)
+    cancelled = client.post("/api/bookings/", json=booking_body(therapist_id, at="15:00:00"), headers=headers).json()
+    assert client.put(f"/api/bookings/{cancelled['id']}/cancel?reason=plans", headers=headers).status_code == 200
+    live = client.portal.call(db.database.therapist_calendars.find_one, {"therapist_id": therapist_id})["busy"]
+    # Calendars drifted and reservations were never backfilled
+    client.portal.call(db.database.slot_reservations.delete_many, {})
+    client.portal.call(db.database.therapist_calendars.delete_many, {})
+    assert "10:00" in available_times(client, therapist_id)
+
+    result = client.portal.call(lambda: calendar_service.rebuild(db.database, date(2030, 1, 1), [therapist_id]))
+
+    assert (result["bookings"], result["calendars_written"]) == (1, 1)
+    assert client.portal.call(db.database.therapist_calendars.find_one, {"therapist_id": therapist_id})["busy"] == live
+    times = available_times(client, therapist_id)
+    assert {"09:00", "10:00", "11:00"}.isdisjoint(times)
+    assert "15:00" in times
+
+def test_rebuild_keeps_slots_of_bookings_past_midnight(client, register, therapist):
+    therapist_id, _, headers = therapist
+    client.put("/api/therapists/me/working-hours", json={"weekly": {
+        "wednesday": [{"start": "09:00", "end": "24:00"}], "thursday": [{"start": "00:00", "end": "12:00"}]
+    }}, headers=headers)
+    _, client_headers, _ = register()
+    booking = client.post("/api/bookings/", json=booking_body(therapist_id), headers=client_headers).json()
+    # Stored before working hours were enforced: 23:00-00:30 on Wednesday
+    client.portal.call(db.database.bookings.update_one, {"id": booking["id"]}, {"$set": {
+        "starts_at": datetime(2030, 1, 2, 23, 0), "ends_at": datetime(2030, 1, 3, 0, 30), "duration_minutes": 90
+    }})
+
+    client.portal.call(lambda: calendar_service.rebuild(db.database, date(2030, 1, 3), [therapist_id]))
+
+    # The session plus its travel buffer holds Thursday until 01:00
+    assert available_times(client, therapist_id, "2030-01-03")[0] == "01:00"
@@ -0,0 +1,41 @@
+"""Mongo commands are attributed to the route whose request issued them."""
+from backend.database import db
+from backend.monitoring import command_metrics
+
+def db_metrics(client, admin) -> dict:
+    response = client.get("/api/admin/metrics/db", headers=admin)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_commands_are_counted_per_route(client, admin, monkeypatch):
+    client.get("/api/admin/metrics/db", params={"reset": True}, headers=admin)
+    # Every command counts as slow, so each one is also listed with its route
+    monkeypatch.setattr(command_metrics, "slow_ms", 0)
+
+    for _ in range(3):
+        assert client.get("/api/services/missing").status_code == 404
+    client.get("/api/services/")
+
+    routes = db_metrics(client, admin)["routes"]
+
+    # One find per lookup (find_one is a find command)
+    lookup = routes["service_router.get_service"]
+    assert (lookup["requests"], lookup["commands"], lookup["max_commands"]) == (3, 3, 1)
+    assert lookup["slow_commands"] == 3
+    assert (routes["service_router.get_services"]["requests"], routes["service_router.get_services"]["commands"]) == (1, 1)
+
+def test_slow_commands_name_route_and_collection(client, admin, monkeypatch):
+    monkeypatch.setattr(command_metrics, "slow_ms", 0)
+    client.get("/api/admin/metrics/db", params={"reset": True}, headers=admin)
+
+    client.get("/api/services/missing")
+
+    slow = [command for command in db_metrics(client, admin)["slow_commands"] if command["route"] == "service_router.get_service"]
+    assert [(command["command"], command["collection"]) for command in slow] == [("find", "services")]
+
+def test_commands_outside_requests_count_as_background(client):
+    before = command_metrics.snapshot()["background"]["commands"]
+
+    client.portal.call(db.database.services.find_one, {"id": "missing"})
+
+    assert command_metrics.snapshot()["background"]["commands"] == before + 1
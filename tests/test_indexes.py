@@ -0,0 +1,39 @@
+"""Index specs: drift is reported by diff_indexes and repaired by sync_indexes."""
+from backend.database import db
+from backend.indexes import INDEX_SPECS, diff_indexes, sync_indexes
+
+IN_SYNC = {"missing": [], "extra": [], "changed": []}
+
+def diff(client) -> dict:
+    return client.portal.call(diff_indexes, db.database)
+
+def drift(client):
+    services = db.database.services
+    client.portal.call(services.drop_index, "category_1")
+    client.portal.call(lambda: services.create_index([("name", 1)]))
+    # Same name and keys, but no longer unique
+    client.portal.call(services.drop_index, "id_1")
+    client.portal.call(lambda: services.create_index([("id", 1)]))
+
+def test_startup_creates_every_specified_index(client):
+    assert diff(client) == {name: IN_SYNC for name in INDEX_SPECS}
+
+def test_drift_is_reported_and_synced_away(client):
+    drift(client)
+
+    assert diff(client)["services"] == {"missing": ["category_1"], "extra": ["name_1"], "changed": ["id_1"]}
+    assert diff(client)["users"] == IN_SYNC
+
+    applied = client.portal.call(lambda: sync_indexes(db.database, drop_extra=True, drop_changed=True))
+
+    assert applied["services"]["missing"] == ["category_1"]
+    assert diff(client) == {name: IN_SYNC for name in INDEX_SPECS}
+    info = client.portal.call(db.database.services.index_information)
+    assert info["id_1"]["unique"] is True
+
+def test_sync_only_drops_when_asked(client):
+    drift(client)
+
+    client.portal.call(sync_indexes, db.database)
+
+    assert diff(client)["services"] == {"missing": [], "extra": ["name_1"], "changed": ["id_1"]}
@@ -0,0 +1,87 @@
+"""Booking lists enrich a page with a fixed number of batched queries."""
+import asyncio
+import gc
+import pytest
+from backend import server
+from backend.database import db
+from backend.loaders import Loaders, get_loaders
+from backend.monitoring import command_metrics
+from .conftest import booking_document
+
+@pytest.fixture
+def loaders(client):
+    """Loaders handed to each request, in request order."""
+    created = []
+
+    def capture() -> Loaders:
+        created.append(Loaders(db.database))
+        return created[-1]
+
+    server.app.dependency_overrides[get_loaders] = capture
+    yield created
+    server.app.dependency_overrides.pop(get_loaders, None)
+
+def store_legacy(client, make_therapist, client_id: str, count: int):
+    """Store count bookings without snapshots, each with its own therapist."""
+    documents = []
+    for index in range(count):
+        therapist_id, _, _ = make_therapist()
+        documents.append(booking_document(client_id, therapist_id, at=f"{9 + index % 8:02d}:00:00"))
+    client.portal.call(db.database.bookings.insert_many, documents)
+
+def round_trips(route: str) -> int:
+    return command_metrics.snapshot()["routes"][route]["max_commands"]
+
+@pytest.mark.parametrize("count", [2, 8])
+def test_my_bookings_page_uses_fixed_queries(client, register, make_therapist, loaders, count):
+    client_id, headers, _ = register()
+    store_legacy(client, make_therapist, client_id, count)
+    command_metrics.reset()
+
+    response = client.get(f"/api/bookings/my-bookings?limit={count}", headers=headers)
+
+    assert response.status_code == 200, response.text
+    assert len(response.json()) == count
+    assert all(booking["therapist_name"] == "Test Therapist" for booking in response.json())
+    # therapists, their users, services and the client: one query each
+    assert loaders[-1].queries == 4
+    assert loaders[-1].users.queries == 2
+    # Auth lookup, the page itself, and the four loader queries
+    assert round_trips("booking_router.get_my_bookings") <= 6
+
+@pytest.mark.parametrize("count", [2, 8])
+def test_admin_bookings_page_uses_fixed_queries(client, register, make_therapist, admin, loaders, count):
+    client_id, _, _ = register()
+    store_legacy(client, make_therapist, client_id, count)
+    command_metrics.reset()
+
+    response = client.get(f"/api/admin/bookings?limit={count}", headers=admin)
+
+    assert response.status_code == 200, response.text
+    bookings = response.json()
+    assert len(bookings) == count
+    assert all(booking["client_name"] == "Test Client" for booking in bookings)
+    assert all(booking["therapist_name"] == "Test Therapist" for booking in bookings)
+    # Client emails and snapshot clients share one users query
+    assert loaders[-1].queries == 4
+    assert round_trips("admin_router.get_all_bookings") <= 6
+
+def test_in_flight_fetches_are_held_until_done(client, register):
+    user_id, _, _ = register()
+
+    async def load():
+        loader = Loaders(db.database).users
+        pending = loader.load_many([user_id, "missing"])
+        lookup = asyncio.ensure_future(pending)
+        # Two ticks to dispatch, then the fetch task is running
+        for _ in range(3):
+            await asyncio.sleep(0)
+        held = len(loader.tasks)
+        gc.collect()
+        return held, await lookup, loader.tasks, loader.queries
+
+    held, users, remaining, queries = client.portal.call(load)
+
+    assert held == 1
+    assert list(users) == [user_id]
+    assert (remaining, queries) == (set(), 1)
@@ -0,0 +1,95 @@
+"""Notification outbox: leases, retries with backoff and dead-lettering."""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from backend.database import db
+from backend.services.outbox import notification_outbox
+
+KIND = "email.booking_confirmation"
+
+@pytest.fixture
+def outbox(client, monkeypatch):
+    """The outbox with its workers stopped, so the test drives every claim."""
+    client.portal.call(notification_outbox.stop)
+    monkeypatch.setattr(notification_outbox, "max_attempts", 3)
+    monkeypatch.setitem(notification_outbox.providers, "email", SimpleNamespace(configured=True))
+    return notification_outbox
+
+def use_sender(monkeypatch, sender):
+    monkeypatch.setitem(notification_outbox.handlers, KIND, ("email", sender))
+
+def enqueue(client) -> str:
+    message = notification_outbox.message(KIND, reference_id="booking-1", to_email="client@example.com")
+    client.portal.call(notification_outbox.enqueue, db.database, [message])
+    return message["id"]
+
+def stored(client, message_id: str) -> dict:
+    return client.portal.call(db.database.outbox.find_one, {"id": message_id})
+
+def deliver_next(client):
+    message = client.portal.call(notification_outbox._claim, db.database)
+    assert message is not None
+    client.portal.call(notification_outbox._deliver, db.database, message)
+
+def make_due(client, message_id: str):
+    # Stand in for waiting out the backoff
+    client.portal.call(db.database.outbox.update_one, {"id": message_id}, {"$set": {"next_attempt_at": datetime.utcnow()}})
+
+def test_failing_sender_is_retried_then_dead_lettered(client, outbox, monkeypatch):
+    async def failing(**payload):
+        raise ConnectionError("provider down")
+    use_sender(monkeypatch, failing)
+    message_id = enqueue(client)
+
+    deliver_next(client)
+    first = stored(client, message_id)
+    assert (first["status"], first["attempts"], first["last_error"]) == ("pending", 1, "provider down")
+    # 5s base backoff with +/-20% jitter
+    assert timedelta(seconds=3) < first["next_attempt_at"] - datetime.utcnow() < timedelta(seconds=7)
+    assert client.portal.call(notification_outbox._claim, db.database) is None
+
+    make_due(client, message_id)
+    deliver_next(client)
+    second = stored(client, message_id)
+    assert second["attempts"] == 2
+    assert second["next_attempt_at"] - datetime.utcnow() > timedelta(seconds=7)
+
+    make_due(client, message_id)
+    deliver_next(client)
+    assert stored(client, message_id)["status"] == "dead"
+
+    async def working(**payload):
+        return True
+    use_sender(monkeypatch, working)
+    assert client.portal.call(notification_outbox.retry, db.database, message_id)
+    deliver_next(client)
+    sent = stored(client, message_id)
+    assert (sent["status"], sent["attempts"], sent["last_error"]) == ("sent", 1, None)
+
+def test_expired_lease_is_reclaimed(client, outbox):
+    message_id = enqueue(client)
+
+    claimed = client.portal.call(notification_outbox._claim, db.database)
+
+    assert (claimed["id"], claimed["status"]) == (message_id, "processing")
+    # Leased: no other worker may take it
+    assert client.portal.call(notification_outbox._claim, db.database) is None
+
+    # The claiming worker died and its lease ran out
+    client.portal.call(db.database.outbox.update_one, {"id": message_id}, {
+        "$set": {"locked_until": datetime.utcnow() - timedelta(seconds=1)}
+    })
+    reclaimed = client.portal.call(notification_outbox._claim, db.database)
+
+    assert (reclaimed["id"], reclaimed["attempts"]) == (message_id, 2)
+    assert reclaimed["locked_until"] > datetime.utcnow()
+
+def test_unconfigured_provider_is_skipped_without_retries(client, outbox, monkeypatch):
+    monkeypatch.setitem(notification_outbox.providers, "email", SimpleNamespace(configured=False))
+    message_id = enqueue(client)
+
+    deliver_next(client)
+
+    skipped = stored(client, message_id)
+    assert (skipped["status"], skipped["last_error"]) == ("skipped", "email not configured")
+    assert client.portal.call(notification_outbox._claim, db.database) is None
@@ -0,0 +1,120 @@
+"""Stripe events applied live and replayed, in and out of order."""
+from datetime import datetime
+import pytest
+from backend.database import db
+from backend.services.payment_events import payment_event_processor
+from .conftest import booking_body
+
+T0 = datetime(2030, 1, 1, 12, 0, 0).timestamp()
+
+@pytest.fixture
+def booking(client, register, therapist):
+    therapist_id, _, _ = therapist
+    _, headers, _ = register()
+    response = client.post("/api/bookings/", json=booking_body(therapist_id), headers=headers)
+    assert response.status_code == 200, response.text
+    return {**response.json(), "headers": headers}
+
+def stripe_event(number: int, event_type: str, booking_id: str, created: float, **fields) -> dict:
+    kind = "charge" if event_type.startswith("charge.") else "payment_intent"
+    return {
+        "id": f"evt_{booking_id}_{number}",
+        "type": event_type,
+        "created": int(created),
+        "data": {"object": {"id": f"{kind}_{booking_id}", "object": kind, "metadata": {"booking_id": booking_id}, **fields}}
+    }
+
+def apply(client, event: dict) -> dict:
+    """Apply an event the way a worker does; returns its log entry."""
+    document = payment_event_processor.document(event)
+    client.portal.call(payment_event_processor.apply, db.database, document)
+    return document
+
+def log_applied(client, *documents):
+    # Logged as already applied, so the running workers leave them to replay
+    client.portal.call(db.database.payment_events.insert_many, [{**document, "status": "applied"} for document in documents])
+
+def replay(client, booking_id: str) -> dict:
+    return client.portal.call(lambda: payment_event_processor.replay(db.database, booking_ids=[booking_id]))
+
+def stored(client, booking_id: str) -> dict:
+    return client.portal.call(db.database.bookings.find_one, {"id": booking_id})
+
+def held_slots(client, booking_id: str) -> int:
+    return client.portal.call(db.database.slot_reservations.count_documents, {"booking_id": booking_id})
+
+def test_refund_cancels_the_booking_and_frees_its_slots(client, booking):
+    apply(client, stripe_event(1, "payment_intent.succeeded", booking["id"], T0))
+    assert stored(client, booking["id"])["status"] == "confirmed"
+
+    apply(client, stripe_event(2, "charge.refunded", booking["id"], T0 + 60, refunded=True))
+
+    refunded = stored(client, booking["id"])
+    assert (refunded["payment_status"], refunded["status"]) == ("refunded", "cancelled")
+    assert held_slots(client, booking["id"]) == 0
+
+def test_replay_after_refund_does_not_revive_the_booking(client, booking):
+    succeeded = apply(client, stripe_event(1, "payment_intent.succeeded", booking["id"], T0))
+    refunded = apply(client, stripe_event(2, "charge.refunded", booking["id"], T0, refunded=True))
+    log_applied(client, succeeded, refunded)
+
+    # Same-second events: replay may pick either as the newest
+    replay(client, booking["id"])
+    apply(client, stripe_event(1, "payment_intent.succeeded", booking["id"], T0))
+
+    after = stored(client, booking["id"])
+    assert (after["payment_status"], after["status"]) == ("refunded", "cancelled")
+    assert held_slots(client, booking["id"]) == 0
+
+def test_replayed_refund_frees_slots_of_a_paid_booking(client, booking):
+    succeeded = apply(client, stripe_event(1, "payment_intent.succeeded", booking["id"], T0))
+    # The refund was logged but never applied (e.g. a worker crashed)
+    refunded = payment_event_processor.document(stripe_event(2, "charge.refunded", booking["id"], T0 + 60, refunded=True))
+    log_applied(client, succeeded, refunded)
+
+    counts = replay(client, booking["id"])
+    replay(client, booking["id"])
+
+    assert counts["bookings"] == 1
+    after = stored(client, booking["id"])
+    assert (after["payment_status"], after["status"]) == ("refunded", "cancelled")
+    assert held_slots(client, booking["id"]) == 0
+
+def test_late_failure_does_not_undo_a_payment(client, booking):
+    apply(client, stripe_event(2, "payment_intent.succeeded", booking["id"], T0 + 60))
+    apply(client, stripe_event(1, "payment_intent.payment_failed", booking["id"], T0))
+    apply(client, stripe_event(3, "payment_intent.payment_failed", booking["id"], T0 + 60))
+
+    after = stored(client, booking["id"])
+    assert (after["payment_status"], after["status"]) == ("paid", "confirmed")
+
+def test_failure_then_success_confirms(client, booking):
+    apply(client, stripe_event(1, "payment_intent.payment_failed", booking["id"], T0))
+    assert stored(client, booking["id"])["payment_status"] == "failed"
+
+    apply(client, stripe_event(2, "payment_intent.succeeded", booking["id"], T0 + 60))
+
+    after = stored(client, booking["id"])
+    assert (after["payment_status"], after["status"]) == ("paid", "confirmed")
+
+def test_payment_on_a_cancelled_booking_keeps_it_cancelled(client, booking):
+    response = client.put(f"/api/bookings/{booking['id']}/cancel?reason=plans", headers=booking["headers"])
+    assert response.status_code == 200, response.text
+
+    apply(client, stripe_event(1, "payment_intent.succeeded", booking["id"], T0))
+
+    after = stored(client, booking["id"])
+    assert (after["payment_status"], after["status"]) == ("paid", "cancelled")
+
+def test_partial_refund_is_not_handled(client, booking):
+    apply(client, stripe_event(1, "payment_intent.succeeded", booking["id"], T0))
+    partial = payment_event_processor.document(stripe_event(2, "charge.refunded", booking["id"], T0 + 60, refunded=False))
+    client.portal.call(db.database.payment_events.insert_one, partial)
+    slots = held_slots(client, booking["id"])
+
+    replay(client, booking["id"])
+
+    assert partial["status"] == "ignored"
+    after = stored(client, booking["id"])
+    assert (after["payment_status"], after["status"]) == ("paid", "confirmed")
+    assert held_slots(client, booking["id"]) == slots > 0
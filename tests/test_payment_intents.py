@@ -0,0 +1,30 @@
+"""Checkout reuses a booking's open intent and replaces canceled ones."""
+from backend.services.payment_service import payment_service
+from .conftest import booking_body
+
+def checkout(client, headers, booking_id: str) -> dict:
+    response = client.post("/api/payments/create-payment-intent", json={"booking_id": booking_id, "amount": 80.0}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_canceled_intent_is_replaced_by_a_new_one(client, register, therapist, stripe_api):
+    therapist_id, _, _ = therapist
+    _, headers, _ = register()
+    booking_id = client.post("/api/bookings/", json=booking_body(therapist_id), headers=headers).json()["id"]
+
+    first = checkout(client, headers, booking_id)
+    assert checkout(client, headers, booking_id)["payment_intent_id"] == first["payment_intent_id"]
+
+    # Same amount and currency as before: only the superseded intent differs
+    stripe_api.payment_intents.intents[first["payment_intent_id"]].status = "canceled"
+    payment_service.intent_cache.clear()
+    second = checkout(client, headers, booking_id)
+
+    assert second["payment_intent_id"] != first["payment_intent_id"]
+    assert stripe_api.payment_intents.intents[second["payment_intent_id"]].status == "requires_payment_method"
+
+    stripe_api.payment_intents.intents[second["payment_intent_id"]].status = "canceled"
+    payment_service.intent_cache.clear()
+    third = checkout(client, headers, booking_id)
+
+    assert third["payment_intent_id"] not in (first["payment_intent_id"], second["payment_intent_id"])
@@ -0,0 +1,39 @@
+"""Cached principals and therapist profiles are evicted when accounts change."""
+from backend.auth import therapist_profile_cache
+from backend.database import db
+
+def me(client, headers):
+    return client.get("/api/auth/me", headers=headers)
+
+def test_deactivated_user_is_rejected_on_the_next_request(client, register, admin):
+    user_id, headers, _ = register()
+    assert me(client, headers).status_code == 200
+
+    assert client.put(f"/api/admin/users/{user_id}/deactivate", headers=admin).status_code == 200
+    rejected = me(client, headers)
+
+    assert rejected.status_code == 403
+    assert rejected.json()["detail"] == "Inactive user"
+
+    assert client.put(f"/api/admin/users/{user_id}/activate", headers=admin).status_code == 200
+    assert me(client, headers).status_code == 200
+
+def test_profile_update_is_seen_with_the_same_token(client, register):
+    _, headers, _ = register()
+    assert me(client, headers).json()["full_name"] == "Test Client"
+
+    assert client.put("/api/auth/me", json={"full_name": "Renamed Client"}, headers=headers).status_code == 200
+
+    assert me(client, headers).json()["full_name"] == "Renamed Client"
+
+def test_therapist_status_change_evicts_the_cached_profile(client, therapist, admin):
+    therapist_id, user_id, headers = therapist
+    assert client.get("/api/bookings/therapist-bookings", headers=headers).status_code == 200
+    assert therapist_profile_cache.get(user_id) is not None
+
+    response = client.put(f"/api/admin/therapists/{therapist_id}/status", params={"new_status": "suspended"}, headers=admin)
+
+    assert response.status_code == 200, response.text
+    assert therapist_profile_cache.get(user_id) is None
+    stored = client.portal.call(db.database.therapists.find_one, {"id": therapist_id})
+    assert stored["status"] == "suspended"
@@ -0,0 +1,78 @@
+"""Reviews keep therapist rating totals with running $inc counters."""
+import asyncio
+import httpx
+from backend import server
+from backend.database import db
+from backend.services.ratings import rating_aggregator
+from .conftest import booking_body
+
+def completed_bookings(client, register, therapist_id: str, count: int) -> list:
+    """(booking id, client headers) of completed bookings, one client each."""
+    bookings = []
+    for index in range(count):
+        _, headers, _ = register()
+        # Two hours apart, so travel buffers never overlap
+        body = booking_body(therapist_id, day=f"2030-01-{2 + index // 4:02d}", at=f"{9 + 2 * (index % 4):02d}:00:00")
+        response = client.post("/api/bookings/", json=body, headers=headers)
+        assert response.status_code == 200, response.text
+        bookings.append((response.json()["id"], headers))
+    client.portal.call(db.database.bookings.update_many, {"therapist_id": therapist_id}, {"$set": {"status": "completed"}})
+    return bookings
+
+def review_body(booking_id: str, rating: int) -> dict:
+    return {"booking_id": booking_id, "client_id": "ignored", "therapist_id": "ignored", "rating": rating}
+
+def therapist_doc(client, therapist_id: str) -> dict:
+    return client.portal.call(db.database.therapists.find_one, {"id": therapist_id})
+
+def test_review_is_stored_against_the_booked_therapist(client, register, therapist):
+    therapist_id, _, _ = therapist
+    [(booking_id, headers)] = completed_bookings(client, register, therapist_id, 1)
+
+    response = client.post(f"/api/bookings/{booking_id}/review", json=review_body(booking_id, 4), headers=headers)
+    duplicate = client.post(f"/api/bookings/{booking_id}/review", json=review_body(booking_id, 5), headers=headers)
+
+    assert response.status_code == 200, response.text
+    assert response.json()["therapist_id"] == therapist_id
+    assert response.json()["is_verified"] is True
+    assert duplicate.status_code == 400
+    stored = therapist_doc(client, therapist_id)
+    assert (stored["rating"], stored["reviews_count"], stored["rating_sum"]) == (4.0, 1, 4)
+
+def test_concurrent_reviews_are_all_counted(client, register, therapist):
+    therapist_id, _, _ = therapist
+    bookings = completed_bookings(client, register, therapist_id, 12)
+    ratings = [5, 4, 3, 5, 5, 2, 4, 5, 1, 5, 4, 3]
+
+    async def post_reviews():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(*(
+                http.post(f"/api/bookings/{booking_id}/review", json=review_body(booking_id, rating), headers=headers)
+                for (booking_id, headers), rating in zip(bookings, ratings)
+            ))
+
+    responses = client.portal.call(post_reviews)
+
+    assert [response.status_code for response in responses] == [200] * len(ratings)
+    stored = therapist_doc(client, therapist_id)
+    assert stored["reviews_count"] == len(ratings)
+    assert stored["rating_sum"] == sum(ratings)
+    assert stored["rating"] == round(sum(ratings) / len(ratings), 1)
+    assert sum(stored["rating_histogram"].values()) == len(ratings)
+
+def test_legacy_counters_keep_their_average_until_rebuilt(client, register, therapist):
+    therapist_id, _, _ = therapist
+    [(booking_id, headers)] = completed_bookings(client, register, therapist_id, 1)
+    # Counted before running totals existed: no rating_sum or histogram
+    client.portal.call(db.database.therapists.update_one, {"id": therapist_id}, {"$set": {"rating": 4.5, "reviews_count": 2}})
+
+    response = client.post(f"/api/bookings/{booking_id}/review", json=review_body(booking_id, 1), headers=headers)
+
+    assert response.status_code == 200, response.text
+    assert therapist_doc(client, therapist_id)["rating"] == 4.5
+
+    client.portal.call(rating_aggregator.rebuild, db.database, [therapist_id])
+
+    stored = therapist_doc(client, therapist_id)
+    assert (stored["rating"], stored["reviews_count"], stored["rating_sum"]) == (1.0, 1, 1)
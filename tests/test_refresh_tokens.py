@@ -0,0 +1,41 @@
+"""Refresh token rotation, the reuse grace window and expiry purges."""
+from datetime import datetime, timedelta
+from backend.auth import hash_refresh_token
+from backend.services.token_store import InMemoryRefreshTokenStore, refresh_token_store
+
+def refresh(client, token):
+    return client.post("/api/auth/refresh", json={"refresh_token": token})
+
+def test_rotation_issues_a_new_token(client, register):
+    _, _, login = register()
+    response = refresh(client, login["refresh_token"])
+    assert response.status_code == 200
+    assert response.json()["refresh_token"] != login["refresh_token"]
+    assert refresh(client, response.json()["refresh_token"]).status_code == 200
+
+def test_concurrent_refresh_within_grace_gets_the_same_successor(client, register):
+    # Two tabs sharing the cookie both present the same token
+    _, _, login = register()
+    first = refresh(client, login["refresh_token"])
+    second = refresh(client, login["refresh_token"])
+    assert first.status_code == second.status_code == 200
+    assert first.json()["refresh_token"] == second.json()["refresh_token"]
+    assert refresh(client, first.json()["refresh_token"]).status_code == 200
+
+def test_reuse_after_grace_revokes_the_family(client, register):
+    _, _, login = register()
+    successor = refresh(client, login["refresh_token"]).json()["refresh_token"]
+
+    record = refresh_token_store.tokens[hash_refresh_token(login["refresh_token"])]
+    record["used_at"] -= timedelta(minutes=5)
+
+    assert refresh(client, login["refresh_token"]).status_code == 401
+    assert refresh(client, successor).status_code == 401
+
+def test_memory_store_purges_expired_records():
+    store = InMemoryRefreshTokenStore()
+    now = datetime.utcnow()
+    for token_hash, expires_at in (("old", now - timedelta(seconds=1)), ("live", now + timedelta(days=1))):
+        store.tokens[token_hash] = {"id": token_hash, "expires_at": expires_at}
+    assert store.purge_expired(now) == 1
+    assert list(store.tokens) == ["live"]
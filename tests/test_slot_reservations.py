@@ -0,0 +1,76 @@
+"""Slot reservations: one winner per slot and the backfill."""
+import asyncio
+from argparse import Namespace
+import httpx
+from backend import server
+from backend.database import db
+from backend.tools import backfill_slot_reservations
+from .conftest import booking_body
+
+REQUESTS = 200
+
+def reservations(client, booking_id: str) -> list:
+    return client.portal.call(lambda: db.database.slot_reservations.find({"booking_id": booking_id}).to_list(None))
+
+def test_simultaneous_requests_for_one_slot_book_it_once(client, register, therapist, monkeypatch):
+    therapist_id, _, _ = therapist
+    users = [register() for _ in range(4)]
+    # Jittered latency interleaves the requests' reads and writes
+    monkeypatch.setattr(db.client, "latency_ms", 1)
+    monkeypatch.setattr(db.client, "jitter_ms", 3)
+
+    async def fire():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(*(
+                http.post("/api/bookings/", json=booking_body(therapist_id), headers=users[index % len(users)][1])
+                for index in range(REQUESTS)
+            ))
+
+    responses = client.portal.call(fire)
+
+    statuses = [response.status_code for response in responses]
+    assert statuses.count(200) == 1, statuses
+    assert statuses.count(400) == REQUESTS - 1
+    assert all(response.json()["detail"] == "Time slot already booked" for response in responses if response.status_code == 400)
+    booking_id = next(response.json()["id"] for response in responses if response.status_code == 200)
+    assert client.portal.call(db.database.bookings.count_documents, {"therapist_id": therapist_id}) == 1
+    # 60 minutes plus the 30 minute travel buffer in 15 minute slots
+    assert len(reservations(client, booking_id)) == 6
+
+def test_overlapping_booking_within_travel_buffer_is_rejected(client, register, therapist):
+    therapist_id, _, _ = therapist
+    _, headers, _ = register()
+    assert client.post("/api/bookings/", json=booking_body(therapist_id), headers=headers).status_code == 200
+
+    too_close = client.post("/api/bookings/", json=booking_body(therapist_id, at="11:15:00"), headers=headers)
+    after_buffer = client.post("/api/bookings/", json=booking_body(therapist_id, at="11:30:00"), headers=headers)
+
+    assert too_close.status_code == 400
+    assert after_buffer.status_code == 200, after_buffer.text
+
+def test_backfill_reserves_legacy_bookings_and_reports_conflicts(client, register, therapist, monkeypatch, capsys):
+    therapist_id, _, _ = therapist
+    _, headers, _ = register()
+    ids = [
+        client.post("/api/bookings/", json=booking_body(therapist_id, at=at), headers=headers).json()["id"]
+        for at in ("10:00:00", "13:00:00")
+    ]
+    # Bookings stored before reservations existed hold no slots; one of them
+    # was also double-booked by hand
+    client.portal.call(db.database.slot_reservations.delete_many, {})
+    duplicate = {**client.portal.call(db.database.bookings.find_one, {"id": ids[1]}, {"_id": 0}), "id": "double-booked"}
+    client.portal.call(db.database.bookings.insert_one, duplicate)
+    monkeypatch.setattr(backfill_slot_reservations, "create_client", lambda: db.client)
+    args = Namespace(batch_size=2, include_past=False, dry_run=False)
+
+    first = client.portal.call(backfill_slot_reservations.run, args)
+    rerun = client.portal.call(backfill_slot_reservations.run, args)
+
+    assert first == 1 and rerun == 1
+    assert len(reservations(client, ids[0])) == 6
+    held = reservations(client, ids[1]) + reservations(client, "double-booked")
+    assert len(held) == 6
+    output = capsys.readouterr().out
+    assert '"conflicts": 6' in output
+    assert '"already_reserved": 12' in output
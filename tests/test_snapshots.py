@@ -0,0 +1,44 @@
+"""Booking snapshots follow renames, and the sweep repairs drifted names."""
+from backend.database import db
+from backend.services.snapshot_reconciler import snapshot_reconciler
+from .conftest import booking_document
+
+def snapshot_of(client, booking_id: str) -> dict:
+    return client.portal.call(db.database.bookings.find_one, {"id": booking_id})["snapshot"]
+
+def book(client, register, therapist):
+    therapist_id, _, _ = therapist
+    user_id, headers, _ = register()
+    booking = booking_document(user_id, therapist_id, snapshot={
+        "client_name": "Test Client", "therapist_name": "Test Therapist",
+        "service_name": "Swedish Massage", "service_category": "Relaxation"
+    })
+    client.portal.call(db.database.bookings.insert_one, booking)
+    return user_id, headers, booking["id"]
+
+def test_rename_is_applied_by_the_worker(client, register, therapist):
+    _, headers, booking_id = book(client, register, therapist)
+
+    response = client.put("/api/auth/me", json={"full_name": "Renamed Client"}, headers=headers)
+    assert response.status_code == 200, response.text
+    client.portal.call(snapshot_reconciler.queue.join)
+
+    assert snapshot_of(client, booking_id)["client_name"] == "Renamed Client"
+
+def test_sweep_repairs_names_changed_behind_the_api(client, register, therapist):
+    client_id, _, booking_id = book(client, register, therapist)
+    _, therapist_user_id, _ = therapist
+    database = db.database
+    client.portal.call(database.users.update_one, {"id": client_id}, {"$set": {"full_name": "New Client"}})
+    client.portal.call(database.users.update_one, {"id": therapist_user_id}, {"$set": {"full_name": "New Therapist"}})
+    client.portal.call(database.services.update_one, {"id": "swedish-massage"}, {"$set": {"name": "New Service"}})
+    client.portal.call(database.bookings.update_one, {"id": booking_id}, {"$set": {"snapshot.client_name": ""}})
+
+    updated = client.portal.call(snapshot_reconciler.sweep, database)
+
+    snapshot = snapshot_of(client, booking_id)
+    assert updated >= 1
+    assert snapshot["client_name"] == "New Client"
+    assert snapshot["therapist_name"] == "New Therapist"
+    assert snapshot["service_name"] == "New Service"
+    assert client.portal.call(snapshot_reconciler.sweep, database) == 0